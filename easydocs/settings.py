@@ -12,6 +12,7 @@ https://docs.djangoproject.com/en/5.2/ref/settings/
 
 from pathlib import Path
 import os
+import tempfile
 from decouple import config
 import dj_database_url
 
@@ -38,12 +39,13 @@ INSTALLED_APPS = [
     'django.contrib.messages',
     'django.contrib.staticfiles',
     'rest_framework',
+    'rest_framework.authtoken',
     'users',
     'files',
 ]
 
 MIDDLEWARE = [
-    'whitenoise.middleware.WhiteNoiseMiddleware',
+    'easydocs.middleware.WhiteNoiseMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'django.contrib.sessions.middleware.SessionMiddleware',
     'django.middleware.common.CommonMiddleware',
@@ -127,13 +129,91 @@ MEDIA_ROOT = BASE_DIR / 'media'
 
 DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 
+# REST API (files/api.py): session auth for the browser, tokens for integrations
+REST_FRAMEWORK = {
+    'DEFAULT_AUTHENTICATION_CLASSES': [
+        'rest_framework.authentication.SessionAuthentication',
+        'rest_framework.authentication.TokenAuthentication',
+    ],
+    'DEFAULT_PERMISSION_CLASSES': ['rest_framework.permissions.IsAuthenticated'],
+    'DEFAULT_PAGINATION_CLASS': 'files.pagination.CreatedCursorPagination',
+    'PAGE_SIZE': config('API_PAGE_SIZE', default=50, cast=int),
+}
+API_MAX_PAGE_SIZE = config('API_MAX_PAGE_SIZE', default=500, cast=int)
+# Maximum number of ranked results returned by file search (API and PDF generator page)
+FILES_SEARCH_LIMIT = config('FILES_SEARCH_LIMIT', default=50, cast=int)
+
 # Security Settings for Production
 if not DEBUG:
     SECURE_SSL_REDIRECT = True
     SESSION_COOKIE_SECURE = True
     CSRF_COOKIE_SECURE = True
 
+# File storage backend: files.supabase_storage.SupabaseStorageService,
+# files.storage.LocalStorageService or files.storage.MemoryStorageService
+FILES_STORAGE_BACKEND = config('FILES_STORAGE_BACKEND', default='files.supabase_storage.SupabaseStorageService')
+FILES_STORAGE_ROOT = config('FILES_STORAGE_ROOT', default=str(MEDIA_ROOT / 'storage'))
+# Files larger than this are uploaded in chunks of this size (Supabase resumable uploads require 6MB)
+FILES_UPLOAD_CHUNK_SIZE = config('FILES_UPLOAD_CHUNK_SIZE', default=6 * 1024 * 1024, cast=int)
+FILES_DOWNLOAD_CHUNK_SIZE = config('FILES_DOWNLOAD_CHUNK_SIZE', default=64 * 1024, cast=int)
+# Uploads are hashed (SHA-256) while the request body is read, so duplicate content is stored once
+FILE_UPLOAD_HANDLERS = [
+    'files.uploads.HashingUploadHandler',
+    'django.core.files.uploadhandler.MemoryFileUploadHandler',
+    'django.core.files.uploadhandler.TemporaryFileUploadHandler',
+]
+# Blobs with no references are collected after this many seconds (see the collect_blobs command)
+BLOB_GC_GRACE = config('BLOB_GC_GRACE', default=3600, cast=int)
+# Folder deletes remove storage objects in batches; trees with more files than the threshold are deleted in the background
+FILES_DELETE_BATCH_SIZE = config('FILES_DELETE_BATCH_SIZE', default=1000, cast=int)
+FILES_DELETE_ASYNC_THRESHOLD = config('FILES_DELETE_ASYNC_THRESHOLD', default=200, cast=int)
+# Progress is stored in the database (FolderDeletion); deletes with no update for this many seconds count as failed
+FILES_DELETE_TIMEOUT = config('FILES_DELETE_TIMEOUT', default=1800, cast=int)
+# Serve downloads, uploads, signed URLs and folder deletes with async views (enable when running easydocs.asgi)
+FILES_ASYNC_VIEWS = config('FILES_ASYNC_VIEWS', default=False, cast=bool)
+
 # Supabase Storage Configuration
 SUPABASE_URL = config('SUPABASE_URL', default='')
 SUPABASE_KEY = config('SUPABASE_KEY', default='')
 SUPABASE_BUCKET = config('SUPABASE_BUCKET', default='documents')
+# Signed URLs are cached in memory and, optionally, in a Django cache alias from CACHES
+SUPABASE_SIGNED_URL_CACHE = config('SUPABASE_SIGNED_URL_CACHE', default='')
+SUPABASE_SIGNED_URL_CACHE_SIZE = config('SUPABASE_SIGNED_URL_CACHE_SIZE', default=1024, cast=int)
+SUPABASE_SIGNED_URL_MARGIN = config('SUPABASE_SIGNED_URL_MARGIN', default=60, cast=int)
+# Shared HTTP pool for storage traffic: timeouts in seconds, exponential backoff for idempotent calls
+# and a circuit breaker that fails fast after STORAGE_CIRCUIT_FAILURES consecutive errors
+STORAGE_HTTP_POOL_SIZE = config('STORAGE_HTTP_POOL_SIZE', default=20, cast=int)
+STORAGE_HTTP_CONNECT_TIMEOUT = config('STORAGE_HTTP_CONNECT_TIMEOUT', default=5, cast=float)
+STORAGE_HTTP_TIMEOUT = config('STORAGE_HTTP_TIMEOUT', default=15, cast=float)
+STORAGE_HTTP_READ_TIMEOUT = config('STORAGE_HTTP_READ_TIMEOUT', default=30, cast=float)
+STORAGE_HTTP_UPLOAD_TIMEOUT = config('STORAGE_HTTP_UPLOAD_TIMEOUT', default=120, cast=float)
+STORAGE_HTTP_RETRIES = config('STORAGE_HTTP_RETRIES', default=3, cast=int)
+STORAGE_HTTP_BACKOFF = config('STORAGE_HTTP_BACKOFF', default=0.5, cast=float)
+STORAGE_CIRCUIT_FAILURES = config('STORAGE_CIRCUIT_FAILURES', default=5, cast=int)
+STORAGE_CIRCUIT_RESET_TIMEOUT = config('STORAGE_CIRCUIT_RESET_TIMEOUT', default=30, cast=float)
+
+# PDF generation
+PDF_TEMPLATE_CACHE_SIZE = config('PDF_TEMPLATE_CACHE_SIZE', default=128, cast=int)
+# Parsed WeasyPrint stylesheets kept by each render worker
+PDF_STYLESHEET_CACHE_SIZE = config('PDF_STYLESHEET_CACHE_SIZE', default=64, cast=int)
+PDF_RENDER_WORKERS = config('PDF_RENDER_WORKERS', default=2, cast=int)
+# Render jobs still 'running' after this many seconds are considered abandoned and may be claimed again
+PDF_RENDER_TIMEOUT = config('PDF_RENDER_TIMEOUT', default=600, cast=int)
+PDF_BATCH_CHUNK_SIZE = config('PDF_BATCH_CHUNK_SIZE', default=25, cast=int)
+PDF_UPLOAD_CONCURRENCY = config('PDF_UPLOAD_CONCURRENCY', default=8, cast=int)
+# Rendered PDFs reused for identical template/data/branding (0 disables the cache)
+PDF_RENDER_CACHE_SIZE = config('PDF_RENDER_CACHE_SIZE', default=1000, cast=int)
+PDF_RENDER_CACHE_TTL = config('PDF_RENDER_CACHE_TTL', default=7 * 24 * 3600, cast=int)
+# Text extraction of uploaded PDF/txt/docx files into BlobTextPage (searchable). Uploads are queued on
+# TEXT_EXTRACTION_WORKERS background threads (0 leaves everything to the extract_text command)
+TEXT_EXTRACTION_WORKERS = config('TEXT_EXTRACTION_WORKERS', default=1, cast=int)
+# Characters per stored page for formats without pages (txt, docx), pages per INSERT and total per document
+TEXT_EXTRACTION_PAGE_CHARS = config('TEXT_EXTRACTION_PAGE_CHARS', default=20000, cast=int)
+TEXT_EXTRACTION_BATCH_SIZE = config('TEXT_EXTRACTION_BATCH_SIZE', default=50, cast=int)
+TEXT_EXTRACTION_MAX_CHARS = config('TEXT_EXTRACTION_MAX_CHARS', default=5_000_000, cast=int)
+# Extractions still 'pending' after this many seconds are considered interrupted and may be retried
+TEXT_EXTRACTION_TIMEOUT = config('TEXT_EXTRACTION_TIMEOUT', default=1800, cast=int)
+# Local cache of the header/footer/watermark images used while rendering
+BRANDING_CACHE_DIR = config('BRANDING_CACHE_DIR', default=str(Path(tempfile.gettempdir()) / 'easydocs' / 'branding'))
+BRANDING_CACHE_TTL = config('BRANDING_CACHE_TTL', default=3600, cast=int)
+BRANDING_CACHE_MAX_BYTES = config('BRANDING_CACHE_MAX_BYTES', default=100 * 1024 * 1024, cast=int)
@@ -0,0 +1,171 @@
+from django.conf import settings
+from django.core.exceptions import FieldDoesNotExist, ValidationError
+from django.db.models import Prefetch
+from django.urls import reverse
+from rest_framework import mixins, serializers, status, viewsets
+from rest_framework.decorators import action
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from .assets import invalidate_branding_file
+from .batch import normalize_row
+from .blobs import collect_released_blobs, delete_file_rows
+from .folders import count_subtree_files, delete_folder_tree, get_delete_progress
+from .jobs import enqueue_folder_delete, submit_render
+from .models import DocumentFolder, FileCreated, PDFTemplate
+from .serializers import (
+    DocumentFolderSerializer, FileCreatedSerializer, FileSearchResultSerializer, GenerationSerializer,
+    PDFTemplateSerializer, get_requested_fields,
+)
+from .search import get_search_terms, search_files
+
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def optimize_queryset(queryset, serializer, sparse=False):
+    # select_related/prefetch_related para os campos relacionados do serializer; com ?fields=, só as colunas pedidas
+    model = queryset.model
+    columns = {model._meta.pk.name, 'created_at'}
+    related = set()
+    prefetch = []
+    for field in serializer.fields.values():
+        if isinstance(field, serializers.HyperlinkedIdentityField):
+            continue
+        if field.source == '*':
+            return queryset
+        if field.source in queryset.query.annotations:
+            continue
+        parts = field.source.split('.')
+        try:
+            model_field = model._meta.get_field(parts[0])
+        except FieldDoesNotExist:
+            return queryset
+        if model_field.one_to_many or model_field.many_to_many:
+            related_model = model_field.related_model
+            prefetch.append(Prefetch(parts[0], queryset=related_model.objects.only(
+                related_model._meta.pk.name, model_field.field.attname,
+            )))
+            continue
+        columns.add(parts[0])
+        if len(parts) > 1:
+            related.add(parts[0])
+            columns.add('__'.join(parts))
+    queryset = queryset.select_related(*related).prefetch_related(*prefetch)
+    if sparse:
+        queryset = queryset.only(*columns)
+    return queryset
+
+
+class OwnedViewSetMixin:
+    filter_fields = {}
+
+    def get_queryset(self):
+        queryset = self.queryset.filter(user=self.request.user)
+        for param, lookup in self.filter_fields.items():
+            value = self.request.query_params.get(param)
+            if value in (None, ''):
+                continue
+            try:
+                queryset = queryset.filter(**{lookup: None if value == 'null' else value})
+            except (ValueError, ValidationError):
+                raise serializers.ValidationError({param: f"Valor inválido: {value}"})
+        queryset = self.annotate_queryset(queryset)
+        if self.request.method not in SAFE_METHODS:
+            return queryset
+        return optimize_queryset(
+            queryset,
+            self.get_serializer(),
+            sparse=get_requested_fields(self.request) is not None,
+        )
+
+    def annotate_queryset(self, queryset):
+        return queryset
+
+    def perform_create(self, serializer):
+        serializer.save(user=self.request.user)
+
+
+class PDFTemplateViewSet(OwnedViewSetMixin, viewsets.ModelViewSet):
+    queryset = PDFTemplate.objects.all()
+    serializer_class = PDFTemplateSerializer
+    filter_fields = {'template_type': 'template_type'}
+
+    @action(detail=True, methods=['post'])
+    def generate(self, request, pk=None):
+        template_obj = self.get_object()
+        generation = GenerationSerializer(data=request.data, context={'request': request, 'template': template_obj})
+        generation.is_valid(raise_exception=True)
+        data = normalize_row(generation.validated_data['data'], template_obj.get_field_schema())
+        file_obj = submit_render(request.user, template_obj, generation.validated_data['folder'], data)
+        logger.info(f"API generation requested: template {template_obj.id} - file {file_obj.id}")
+        return Response(
+            {
+                'job_id': file_obj.id,
+                'status': file_obj.status,
+                'file_name': file_obj.file_name,
+                'status_url': request.build_absolute_uri(reverse('files:api-file-detail', args=[file_obj.id])),
+            },
+            status=status.HTTP_202_ACCEPTED,
+        )
+
+
+class FileCreatedViewSet(
+    OwnedViewSetMixin,
+    mixins.ListModelMixin,
+    mixins.RetrieveModelMixin,
+    mixins.DestroyModelMixin,
+    viewsets.GenericViewSet,
+):
+    queryset = FileCreated.objects.all()
+    serializer_class = FileCreatedSerializer
+    filter_fields = {'folder': 'folder_id', 'template': 'template_id', 'status': 'status'}
+
+    def get_serializer_class(self):
+        if self.action == 'search':
+            return FileSearchResultSerializer
+        return super().get_serializer_class()
+
+    def annotate_queryset(self, queryset):
+        if self.action == 'search':
+            return search_files(queryset, self.request.query_params.get('q', ''))
+        return queryset
+
+    @action(detail=False, methods=['get'])
+    def search(self, request):
+        # Resultados ordenados por relevância, sem cursor: só os FILES_SEARCH_LIMIT primeiros (ou ?limit=)
+        query = request.query_params.get('q', '')
+        if not get_search_terms(query):
+            raise serializers.ValidationError({'q': 'Informe o texto da busca.'})
+        try:
+            limit = min(int(request.query_params.get('limit', settings.FILES_SEARCH_LIMIT)), settings.API_MAX_PAGE_SIZE)
+        except ValueError:
+            raise serializers.ValidationError({'limit': 'Valor inválido.'})
+        results = self.get_queryset()[:max(limit, 1)]
+        return Response({'query': query, 'results': self.get_serializer(results, many=True).data})
+
+    def perform_destroy(self, instance):
+        invalidate_branding_file(instance)
+        collect_released_blobs(delete_file_rows(FileCreated.objects.filter(id=instance.id)))
+
+
+class DocumentFolderViewSet(OwnedViewSetMixin, viewsets.ModelViewSet):
+    queryset = DocumentFolder.objects.all()
+    serializer_class = DocumentFolderSerializer
+    filter_fields = {'parent': 'parent_folder_id'}
+
+    def perform_update(self, serializer):
+        try:
+            serializer.save()
+        except ValueError as e:
+            raise serializers.ValidationError({'parent_folder': str(e)})
+
+    def destroy(self, request, *args, **kwargs):
+        # Mesma regra da view HTML: árvores grandes são apagadas em segundo plano
+        folder = self.get_object()
+        if count_subtree_files(folder) <= settings.FILES_DELETE_ASYNC_THRESHOLD:
+            delete_folder_tree(folder.id)
+            return Response(status=status.HTTP_204_NO_CONTENT)
+        enqueue_folder_delete(folder.id)
+        return Response(get_delete_progress(folder.id), status=status.HTTP_202_ACCEPTED)
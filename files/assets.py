@@ -0,0 +1,270 @@
+from django.conf import settings
+
+from .cache import LRUCache
+from .models import FileCreated
+from .storage import storage
+
+import functools
+import hashlib
+import logging
+import mimetypes
+import os
+import re
+import tempfile
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+
+class BrandingUnavailable(Exception):
+    pass
+
+BRANDING_SCHEME = 'branding://'
+CURRENT_USER = 'self'
+BRANDING_FILES = {
+    'header_image_url': 'header.png',
+    'footer_image_url': 'footer.png',
+    'watermark_url': 'watermark.png',
+}
+BRANDING_NAMES = frozenset(BRANDING_FILES.values())
+OWNER_RE = re.compile(r'^[\w-]+$')
+
+
+def check_branding_name(user_id, name):
+    # Só as imagens de branding conhecidas: nada de outros arquivos do usuário nem caminhos com "../"
+    if name not in BRANDING_NAMES or not OWNER_RE.match(str(user_id)):
+        raise ValueError(f"Arquivo de branding inválido: {user_id}/{name}")
+
+
+def _branding_files(user_id):
+    # As imagens ficam na pasta raiz com o id do usuário; o conteúdo pode estar num blob compartilhado
+    return FileCreated.objects.filter(
+        user_id=user_id,
+        folder__folder_name=str(user_id),
+        folder__parent_folder=None,
+    )
+
+
+def resolve_branding_key(user_id, name):
+    check_branding_name(user_id, name)
+    storage_key = _branding_files(user_id).filter(file_name=name).values_list('file_path', flat=True).first()
+    return storage_key or f"{user_id}/{name}"
+
+
+def get_branding_fingerprint(user_id):
+    # Identifica a versão atual de cada imagem sem baixá-la: hash do blob, ou caminho + data para arquivos antigos.
+    # Imagens sem linha no banco usam o ETag do storage; None quando ele não pôde ser consultado
+    versions = {}
+    rows = _branding_files(user_id).filter(file_name__in=BRANDING_FILES.values()).values_list(
+        'file_name', 'blob__sha256', 'file_path', 'updated_at',
+    ).order_by('created_at')
+    for name, digest, file_path, updated_at in rows:
+        versions[name] = digest or f"{file_path}@{updated_at.isoformat()}"
+    for name in BRANDING_FILES.values():
+        if name not in versions:
+            try:
+                versions[name] = branding_assets.version(user_id, name, f"{user_id}/{name}")
+            except Exception as e:
+                logger.warning(f"Branding version unavailable: {user_id}/{name} - {str(e)}")
+                return None
+    return versions
+
+
+class BrandingAssetCache:
+    def __init__(self, directory, ttl, max_bytes, memory_items=64):
+        self.directory = str(directory)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.memory = LRUCache(maxsize=memory_items)
+        self._lock = threading.Lock()
+
+    def _ref_path(self, user_id, name):
+        check_branding_name(user_id, name)
+        return os.path.join(self.directory, 'refs', str(user_id), name)
+
+    def _missing_path(self, user_id, name):
+        # Marca "não existe no storage" ao lado da ref: vale para todos os processos e some na invalidação
+        return f"{self._ref_path(user_id, name)}.missing"
+
+    def _version_path(self, user_id, name):
+        return f"{self._ref_path(user_id, name)}.etag"
+
+    def _is_missing(self, user_id, name):
+        missing_path = self._missing_path(user_id, name)
+        try:
+            if time.time() - os.path.getmtime(missing_path) < self.ttl:
+                return True
+            os.remove(missing_path)
+        except OSError:
+            pass
+        return False
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except OSError:
+            pass
+
+    def _blob_path(self, digest):
+        return os.path.join(self.directory, 'blobs', digest)
+
+    def _write_atomic(self, path, data):
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path))
+        with os.fdopen(fd, 'wb') as tmp:
+            tmp.write(data)
+        os.replace(tmp_path, path)
+
+    def _read_ref(self, user_id, name):
+        ref_path = self._ref_path(user_id, name)
+        try:
+            if time.time() - os.path.getmtime(ref_path) > self.ttl:
+                return None
+            with open(ref_path) as ref:
+                return ref.read().strip()
+        except OSError:
+            return None
+
+    def _read_blob(self, digest):
+        data = self.memory.get(digest)
+        if data is not None:
+            return data
+        try:
+            with open(self._blob_path(digest), 'rb') as blob:
+                data = blob.read()
+        except OSError:
+            return None
+        os.utime(self._blob_path(digest))
+        self.memory.set(digest, data)
+        return data
+
+    def get(self, user_id, name):
+        digest = self._read_ref(user_id, name)
+        if digest:
+            data = self._read_blob(digest)
+            if data is not None:
+                return data
+
+        if self._is_missing(user_id, name):
+            raise FileNotFoundError(f"{user_id}/{name}")
+
+        logger.debug(f"Branding cache miss: {user_id}/{name}")
+        try:
+            data = storage.download_file(resolve_branding_key(user_id, name))
+        except FileNotFoundError:
+            # Só a ausência confirmada é marcada: timeouts e 5xx não podem sumir com o branding por ttl
+            self._write_atomic(self._missing_path(user_id, name), b'')
+            raise
+        self.put(user_id, name, data)
+        return data
+
+    def put(self, user_id, name, data):
+        digest = hashlib.sha256(data).hexdigest()
+        if not os.path.exists(self._blob_path(digest)):
+            self._write_atomic(self._blob_path(digest), data)
+        self._write_atomic(self._ref_path(user_id, name), digest.encode())
+        self.memory.set(digest, data)
+        self._remove(self._missing_path(user_id, name))
+        self.evict()
+        return digest
+
+    def digest(self, user_id, name):
+        return self._read_ref(user_id, name)
+
+    def version(self, user_id, name, storage_key=None):
+        # ETag do objeto no storage ('' se não existe), guardado por ttl ao lado da ref: não depende
+        # de a imagem estar no cache local, então a mesma imagem tem sempre a mesma versão
+        version_path = self._version_path(user_id, name)
+        try:
+            if time.time() - os.path.getmtime(version_path) < self.ttl:
+                with open(version_path) as version:
+                    return version.read()
+        except OSError:
+            pass
+        etag = storage.get_etag(storage_key or resolve_branding_key(user_id, name)) or ''
+        self._write_atomic(version_path, etag.encode())
+        return etag
+
+    def invalidate(self, user_id, name=None):
+        names = [name] if name else list(BRANDING_FILES.values())
+        for item in names:
+            self._remove(self._ref_path(user_id, item))
+            self._remove(self._missing_path(user_id, item))
+            self._remove(self._version_path(user_id, item))
+
+    def evict(self):
+        blobs_dir = os.path.join(self.directory, 'blobs')
+        with self._lock:
+            try:
+                entries = [entry for entry in os.scandir(blobs_dir) if entry.is_file()]
+            except OSError:
+                return
+            total = sum(entry.stat().st_size for entry in entries)
+            if total <= self.max_bytes:
+                return
+            for entry in sorted(entries, key=lambda entry: entry.stat().st_mtime):
+                if total <= self.max_bytes:
+                    break
+                total -= entry.stat().st_size
+                self.memory.pop(entry.name)
+                try:
+                    os.remove(entry.path)
+                except OSError:
+                    pass
+
+
+branding_assets = BrandingAssetCache(
+    settings.BRANDING_CACHE_DIR,
+    ttl=settings.BRANDING_CACHE_TTL,
+    max_bytes=settings.BRANDING_CACHE_MAX_BYTES,
+)
+
+
+def get_branding_urls():
+    # Sempre "self": o url_fetcher de cada renderização resolve o usuário dono do PDF
+    return {field: f"{BRANDING_SCHEME}{CURRENT_USER}/{name}" for field, name in BRANDING_FILES.items()}
+
+
+def invalidate_branding_path(file_path):
+    user_id, _, name = file_path.partition('/')
+    if name in BRANDING_NAMES and OWNER_RE.match(user_id):
+        branding_assets.invalidate(user_id, name)
+        logger.info(f"Branding cache invalidated: {file_path}")
+
+
+def invalidate_branding_file(file_obj):
+    # Antes de apagar a linha: só arquivos da pasta de branding do usuário invalidam o cache
+    if file_obj.file_name in BRANDING_NAMES and _branding_files(file_obj.user_id).filter(id=file_obj.id).exists():
+        invalidate_branding_path(f"{file_obj.user_id}/{file_obj.file_name}")
+
+
+def branding_url_fetcher(url, *args, user_id=None, errors=None, **kwargs):
+    from weasyprint import default_url_fetcher
+
+    if not url.startswith(BRANDING_SCHEME):
+        return default_url_fetcher(url, *args, **kwargs)
+    owner, _, name = url[len(BRANDING_SCHEME):].partition('/')
+    # Um template só acessa o branding do próprio usuário da renderização
+    if owner != CURRENT_USER or name not in BRANDING_NAMES:
+        raise ValueError(f"URL de branding não permitida: {url}")
+    mime_type, _ = mimetypes.guess_type(name)
+    try:
+        data = branding_assets.get(str(user_id), name)
+    except FileNotFoundError:
+        raise
+    except Exception as e:
+        # O WeasyPrint só registra falhas do url_fetcher e segue sem a imagem: a renderização confere esta lista
+        if errors is not None:
+            errors.append(e)
+        raise
+    return {
+        'string': data,
+        'mime_type': mime_type or 'application/octet-stream',
+        'redirected_url': url,
+    }
+
+
+def get_branding_fetcher(user_id, errors=None):
+    # A folha de estilo compartilhada aponta para branding://self/...: cada renderização resolve o seu usuário
+    return functools.partial(branding_url_fetcher, user_id=user_id, errors=errors)
@@ -0,0 +1,157 @@
+from asgiref.sync import sync_to_async
+from django.http import (
+    HttpResponseNotFound, HttpResponseForbidden, HttpResponseNotModified, HttpResponse,
+    JsonResponse, StreamingHttpResponse,
+)
+from django.core import signing
+from django.contrib.auth.decorators import login_required
+from django.shortcuts import render, redirect, aget_object_or_404
+from django.conf import settings
+from django.utils.http import content_disposition_header
+
+from .models import FileCreated, DocumentFolder
+from .forms import FileCreatedForm
+from .storage import storage, unsign_local_path
+from .assets import invalidate_branding_path
+from .blobs import astore_blob
+from .uploads import get_upload_digest
+from .jobs import enqueue_folder_delete, enqueue_text_extraction
+from .folders import adelete_folder_tree, count_subtree_files, get_delete_progress, get_folder_path
+from .views import get_download_info, set_upload_metadata
+
+import logging
+import mimetypes
+
+logger = logging.getLogger(__name__)
+
+# Versões assíncronas das views que esperam pelo storage (ativadas com FILES_ASYNC_VIEWS sob ASGI).
+# Acesso ao banco e renderização de templates continuam síncronos, via sync_to_async.
+arender = sync_to_async(render)
+
+
+@login_required
+async def download_file(request, file_id):
+    user = await request.auser()
+    try:
+        file_obj = await FileCreated.objects.aget(id=file_id, user=user)
+    except FileCreated.DoesNotExist:
+        logger.error(f"File not found in database: {file_id}")
+        return HttpResponseNotFound("Arquivo não encontrado no banco de dados")
+    if not file_obj.file_path:
+        logger.error(f"File path not found for file_id: {file_id}")
+        return HttpResponseNotFound("Arquivo não encontrado no Supabase")
+    content_type, original_name, viewable = get_download_info(file_obj)
+    try:
+        if viewable:
+            return redirect(await storage.aget_signed_url(file_obj.file_path, expires_in=300, filename=original_name))
+        stream = await storage.adownload_stream(
+            file_obj.file_path,
+            chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE,
+            request_headers=request.headers,
+        )
+    except Exception as e:
+        logger.error(f"Failed to download file: {str(e)}")
+        return HttpResponseNotFound("Erro ao baixar arquivo do Supabase")
+    response_file = await stream_response(stream, content_type)
+    response_file['Content-Disposition'] = f'attachment; filename="{original_name}"'
+    logger.info(f"File downloaded successfully: {original_name}")
+    return response_file
+
+
+@login_required
+async def file_status_view(request, file_id):
+    user = await request.auser()
+    file_obj = await aget_object_or_404(
+        FileCreated.objects.only('id', 'user_id', 'status', 'file_path'),
+        id=file_id,
+        user=user,
+    )
+    data = {'id': file_obj.id, 'status': file_obj.status}
+    if file_obj.status == 'completed':
+        data['url'] = await storage.aget_signed_url(file_obj.file_path, expires_in=600)
+    return JsonResponse(data)
+
+
+async def stream_response(stream, content_type):
+    if stream.status == 304:
+        await stream.aclose()
+        response = HttpResponseNotModified()
+    else:
+        response = StreamingHttpResponse(stream, status=stream.status, content_type=content_type)
+    for name, value in stream.headers.items():
+        response[name] = value
+    return response
+
+
+async def local_storage_file(request, token):
+    try:
+        file_path, name, attachment = unsign_local_path(token)
+        stream = await storage.adownload_stream(
+            file_path,
+            chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE,
+            request_headers=request.headers,
+        )
+    except signing.BadSignature:
+        return HttpResponseForbidden("Link inválido ou expirado")
+    except Exception:
+        return HttpResponseNotFound("Arquivo não encontrado")
+    content_type, _ = mimetypes.guess_type(name or file_path)
+    response = await stream_response(stream, content_type or 'application/octet-stream')
+    if name:
+        response['Content-Disposition'] = content_disposition_header(attachment, name)
+    return response
+
+
+@login_required
+async def upload_file_view(request):
+    if request.method != 'POST':
+        form = await sync_to_async(FileCreatedForm)(request=request)
+        return await arender(request, 'upload_file.html', {'form': form})
+
+    def validate():
+        form = FileCreatedForm(request.POST, request.FILES, request=request)
+        return form, form.is_valid()
+
+    form, is_valid = await sync_to_async(validate)()
+    if not is_valid:
+        return HttpResponse(f"Erro: {form.errors}")
+    instance = form.save(commit=False)
+    instance.user = await request.auser()
+    set_upload_metadata(instance, form.cleaned_data['file'])
+
+    uploaded = form.cleaned_data['file']
+    try:
+        blob = await astore_blob(
+            uploaded,
+            digest=get_upload_digest(request, 'file'),
+            size=uploaded.size,
+            content_type=mimetypes.guess_type(uploaded.name)[0],
+        )
+    except Exception as e:
+        return HttpResponse(f"Erro no upload: {str(e)}")
+    instance.blob = blob
+    instance.file_path = blob.storage_key
+    folder_path = await sync_to_async(get_folder_path)(instance.folder)
+    await sync_to_async(invalidate_branding_path, thread_sensitive=False)(f"{folder_path}/{uploaded.name}")
+
+    instance.is_generated = False
+    await instance.asave()
+    enqueue_text_extraction(blob)
+    return redirect('files:file_management')
+
+
+@login_required
+async def delete_folder_view(request, folder_id):
+    user = await request.auser()
+    folder = await aget_object_or_404(DocumentFolder, id=folder_id, user=user)
+    progress = await sync_to_async(get_delete_progress)(folder.id)
+    if progress and progress['status'] in ('pending', 'running'):
+        return await arender(request, 'delete_folder.html', {'folder': folder, 'progress': progress})
+
+    if await sync_to_async(count_subtree_files)(folder) <= settings.FILES_DELETE_ASYNC_THRESHOLD:
+        await adelete_folder_tree(folder.id)
+        return redirect('files:file_management')
+
+    await sync_to_async(enqueue_folder_delete)(folder.id)
+    progress = await sync_to_async(get_delete_progress)(folder.id)
+    return await arender(request, 'delete_folder.html', {'folder': folder, 'progress': progress})
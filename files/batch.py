@@ -0,0 +1,96 @@
+from .models import FileCreated
+from .placeholders import list_field_names
+from .rendering import build_pdf_file_name
+
+import csv
+import io
+import json
+import os
+
+
+class BatchInputError(Exception):
+    pass
+
+
+def load_rows(stream, file_name):
+    ext = os.path.splitext(file_name)[1].lower()
+    text = stream.read()
+    if isinstance(text, bytes):
+        try:
+            text = text.decode('utf-8-sig')
+        except UnicodeDecodeError:
+            raise BatchInputError('O arquivo deve estar codificado em UTF-8.')
+    if ext == '.json':
+        try:
+            rows = json.loads(text)
+        except json.JSONDecodeError as e:
+            raise BatchInputError(f"JSON inválido: {str(e)}")
+        if not isinstance(rows, list) or not all(isinstance(row, dict) for row in rows):
+            raise BatchInputError('O JSON deve ser uma lista de objetos.')
+        return rows
+    if ext == '.csv':
+        return list(csv.DictReader(io.StringIO(text)))
+    raise BatchInputError(f"Formato não suportado: {ext or file_name}")
+
+
+def is_scalar(value):
+    return isinstance(value, (str, int, float)) and not isinstance(value, bool)
+
+
+def normalize_list(name, value):
+    # Texto vira uma linha por item; um número isolado vira uma lista de um item
+    if isinstance(value, str):
+        return [line.strip() for line in value.splitlines() if line.strip()]
+    if is_scalar(value):
+        return [str(value)]
+    if isinstance(value, list) and all(is_scalar(item) for item in value):
+        return [str(item) for item in value]
+    raise BatchInputError(f"Valor inválido para {name}: use texto ou lista de textos")
+
+
+def normalize_row(row, schema):
+    list_fields = list_field_names(schema)
+    data = {}
+    for field in schema['fields']:
+        value = row.get(field['name'], '')
+        if value is None:
+            value = ''
+        if field['name'] in list_fields:
+            value = normalize_list(field['name'], value)
+        else:
+            value = str(value)
+        data[field['name']] = value
+    return data
+
+
+def create_batch_files(user, template_obj, folder, rows):
+    schema = template_obj.get_field_schema()
+    used_names = set()
+    files = []
+    for index, row in enumerate(rows, start=1):
+        try:
+            data = normalize_row(row, schema)
+        except BatchInputError as e:
+            raise BatchInputError(f"Linha {index}: {str(e)}")
+        file_name = build_pdf_file_name(data, template_obj)
+        if file_name in used_names:
+            base, ext = os.path.splitext(file_name)
+            file_name = f"{base}_{index}{ext}"
+        used_names.add(file_name)
+        files.append(FileCreated(
+            user=user,
+            template=template_obj,
+            file_name=file_name,
+            file_path=f"{folder.folder_name}/{file_name}",
+            status='pending',
+            file_size=0,
+            data_used=data,
+            is_generated=True,
+            folder=folder,
+        ))
+    return FileCreated.objects.bulk_create(files)
+
+
+def chunked(items, size):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
@@ -0,0 +1,162 @@
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import io
+import json
+import multiprocessing
+import statistics
+import time
+
+
+class StandInStorageHandler(BaseHTTPRequestHandler):
+    # Imita os endpoints do Supabase Storage usados no download: assinatura e leitura do objeto
+    protocol_version = 'HTTP/1.1'
+    disable_nagle_algorithm = True
+    latency = 0.05
+    payload = b''
+
+    def do_POST(self):
+        self.rfile.read(int(self.headers.get('Content-Length') or 0))
+        time.sleep(self.latency)
+        object_path = self.path.split('/object/sign/', 1)[1]
+        self._send(200, json.dumps({'signedURL': f"/object/sign/{object_path}?token=bench"}).encode(),
+                   'application/json')
+
+    def do_GET(self):
+        time.sleep(self.latency)
+        self._send(200, self.payload, 'application/octet-stream', {'ETag': '"bench"', 'Accept-Ranges': 'bytes'})
+
+    def _send(self, status, body, content_type, headers=None):
+        self.send_response(status)
+        self.send_header('Content-Type', content_type)
+        self.send_header('Content-Length', str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args):
+        pass
+
+
+class StandInStorageServer(ThreadingHTTPServer):
+    # Fila de conexões grande: com o padrão (5) o próprio servidor simulado vira o gargalo
+    request_queue_size = 1024
+    daemon_threads = True
+
+
+def serve_stand_in(latency, size, port_queue):
+    handler = type('Handler', (StandInStorageHandler,), {'latency': latency, 'payload': b'x' * size})
+    server = StandInStorageServer(('127.0.0.1', 0), handler)
+    port_queue.put(server.server_port)
+    server.serve_forever()
+
+
+def start_stand_in(latency, size):
+    # Processo separado: o storage simulado não disputa o GIL com o servidor medido
+    context = multiprocessing.get_context('spawn')
+    port_queue = context.Queue()
+    process = context.Process(target=serve_stand_in, args=(latency, size, port_queue), daemon=True)
+    process.start()
+    return process, port_queue.get(timeout=30)
+
+
+def summarize(name, latencies, errors, elapsed):
+    latencies = sorted(latencies)
+    return {
+        'deployment': name,
+        'requests': len(latencies) + errors,
+        'errors': errors,
+        'requests_per_second': round(len(latencies) / elapsed, 2) if elapsed else 0,
+        'p50_ms': round(statistics.median(latencies) * 1000, 2) if latencies else None,
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))] * 1000, 2) if latencies else None,
+    }
+
+
+def placeholder_image(size=(600, 80)):
+    # Imagem de branding fictícia: o benchmark de renderização não depende do storage
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    Image.new('RGB', size, 'white').save(buffer, 'PNG')
+    return buffer.getvalue()
+
+
+def sample_context(schema):
+    return {
+        field['name']: ['Item de exemplo 1', 'Item de exemplo 2'] if field['is_list'] else f"Exemplo {field['label']}"
+        for field in schema['fields']
+    }
+
+
+def time_calls(func, iterations):
+    latencies = []
+    for _ in range(iterations):
+        started = time.perf_counter()
+        func()
+        latencies.append(time.perf_counter() - started)
+    return latencies
+
+
+def summarize_renders(name, latencies):
+    latencies = sorted(latencies)
+    return {
+        'mode': name,
+        'renders': len(latencies),
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 2),
+        'p50_ms': round(statistics.median(latencies) * 1000, 2),
+        'max_ms': round(latencies[-1] * 1000, 2),
+    }
+
+
+def reset_storage():
+    # Import tardio: este módulo também é carregado pelo processo do storage simulado, sem Django configurado
+    from django.utils.functional import empty
+    from . import storage as storage_module
+
+    storage_module._default_storage = None
+    storage_module.storage._wrapped = empty
+
+
+def reload_urls():
+    # files.urls escolhe entre views e async_views na importação (FILES_ASYNC_VIEWS)
+    import importlib
+    from django.conf import settings
+    from django.urls import clear_url_caches
+
+    clear_url_caches()
+    importlib.reload(importlib.import_module('files.urls'))
+    importlib.reload(importlib.import_module(settings.ROOT_URLCONF))
+
+
+def measure(name, func, iterations, warmup=1, **params):
+    for _ in range(warmup):
+        func()
+    latencies = sorted(time_calls(func, iterations))
+    return {
+        'name': name,
+        'params': params,
+        'iterations': iterations,
+        'mean_ms': round(statistics.fmean(latencies) * 1000, 3),
+        'median_ms': round(statistics.median(latencies) * 1000, 3),
+        'min_ms': round(latencies[0] * 1000, 3),
+        'max_ms': round(latencies[-1] * 1000, 3),
+    }
+
+
+def compare_results(baseline, current, threshold):
+    # Regressão: mediana mais lenta que a do baseline em mais de threshold por cento
+    previous = {result['name']: result for result in baseline['results'] if 'median_ms' in result}
+    regressions = []
+    for result in current['results']:
+        before = previous.get(result['name'])
+        if before is None or 'median_ms' not in result or not before['median_ms']:
+            continue
+        change = (result['median_ms'] - before['median_ms']) / before['median_ms'] * 100
+        if change > threshold:
+            regressions.append({
+                'name': result['name'],
+                'baseline_ms': before['median_ms'],
+                'current_ms': result['median_ms'],
+                'change_pct': round(change, 1),
+            })
+    return regressions
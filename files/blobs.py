@@ -0,0 +1,138 @@
+from asgiref.sync import sync_to_async
+from collections import Counter, defaultdict
+from datetime import timedelta
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, OuterRef, Subquery, Value
+from django.db.models.functions import Coalesce, Greatest
+from django.utils import timezone
+
+from .models import FileCreated, StoredBlob
+from .storage import get_file_size, read_chunks, storage
+
+import hashlib
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def blob_key(digest):
+    return f"blobs/{digest[:2]}/{digest}"
+
+
+def hash_file(file):
+    hasher = hashlib.sha256()
+    size = 0
+    for chunk in read_chunks(file):
+        hasher.update(chunk)
+        size += len(chunk)
+    file.seek(0)
+    return hasher.hexdigest(), size
+
+
+def _reference_existing(digest):
+    return StoredBlob.objects.filter(sha256=digest).update(ref_count=F('ref_count') + 1, updated_at=timezone.now())
+
+
+def _register_blob(digest, size, content_type):
+    try:
+        with transaction.atomic():
+            return StoredBlob.objects.create(
+                sha256=digest, storage_key=blob_key(digest), size=size, content_type=content_type or '', ref_count=1,
+            )
+    except IntegrityError:
+        # Outro upload do mesmo conteúdo registrou o blob primeiro
+        _reference_existing(digest)
+        return StoredBlob.objects.get(sha256=digest)
+
+
+def store_blob(file, digest=None, size=None, content_type=None):
+    # Conteúdo já armazenado só ganha uma referência; bytes novos são enviados uma única vez
+    if digest is None:
+        digest, size = hash_file(file)
+    elif size is None:
+        size = get_file_size(file)
+    if _reference_existing(digest):
+        logger.info(f"Blob reused: {digest}")
+        return StoredBlob.objects.get(sha256=digest)
+    storage.upload_file(file, blob_key(digest), content_type=content_type, upsert=True)
+    return _register_blob(digest, size, content_type)
+
+
+async def astore_blob(file, digest=None, size=None, content_type=None):
+    if digest is None:
+        digest, size = await sync_to_async(hash_file, thread_sensitive=False)(file)
+    elif size is None:
+        size = get_file_size(file)
+    if await sync_to_async(_reference_existing)(digest):
+        logger.info(f"Blob reused: {digest}")
+        return await StoredBlob.objects.aget(sha256=digest)
+    await storage.aupload_file(file, blob_key(digest), content_type=content_type, upsert=True)
+    return await sync_to_async(_register_blob)(digest, size, content_type)
+
+
+def release_blobs(blob_ids):
+    ids_by_amount = defaultdict(list)
+    for blob_id, amount in Counter(blob_id for blob_id in blob_ids if blob_id).items():
+        ids_by_amount[amount].append(blob_id)
+    now = timezone.now()
+    for amount, ids in ids_by_amount.items():
+        StoredBlob.objects.filter(id__in=ids).update(
+            ref_count=Greatest(F('ref_count') - amount, Value(0)), updated_at=now,
+        )
+
+
+def delete_file_rows(files):
+    with transaction.atomic():
+        blob_ids = list(files.exclude(blob=None).values_list('blob_id', flat=True))
+        files.delete()
+        release_blobs(blob_ids)
+    return blob_ids
+
+
+def collect_orphan_blobs(blob_ids=None, grace=0, batch_size=None):
+    # As linhas saem numa transação curta e os objetos são removidos depois do commit, sem travas
+    # durante as chamadas ao storage. Uma falha no storage deixa só bytes sem referência, nunca uma linha sem objeto
+    batch_size = batch_size or settings.FILES_DELETE_BATCH_SIZE
+    orphans = StoredBlob.objects.filter(ref_count=0, updated_at__lte=timezone.now() - timedelta(seconds=grace))
+    if blob_ids is not None:
+        orphans = orphans.filter(id__in=list(blob_ids))
+    collected = 0
+    while True:
+        with transaction.atomic():
+            locked = orphans.select_for_update(skip_locked=True)
+            batch = list(locked.values_list('id', 'sha256', 'storage_key')[:batch_size])
+            if not batch:
+                break
+            StoredBlob.objects.filter(id__in=[blob_id for blob_id, _, _ in batch]).delete()
+            objects = {digest: storage_key for _, digest, storage_key in batch}
+            transaction.on_commit(lambda objects=objects: delete_blob_objects(objects))
+        collected += len(batch)
+    if collected:
+        logger.info(f"Orphan blobs collected: {collected}")
+    return collected
+
+
+def delete_blob_objects(objects):
+    # objects: {sha256: storage_key}. Um upload do mesmo conteúdo pode ter registrado o blob de novo
+    # depois do commit: esse objeto fica
+    registered = set(StoredBlob.objects.filter(sha256__in=list(objects)).values_list('sha256', flat=True))
+    storage.delete_files([storage_key for digest, storage_key in objects.items() if digest not in registered])
+
+
+def collect_released_blobs(blob_ids):
+    if not blob_ids:
+        return 0
+    try:
+        return collect_orphan_blobs(blob_ids=blob_ids)
+    except Exception as e:
+        logger.error(f"Blob GC failed, will retry later: {str(e)}")
+        return 0
+
+
+def reconcile_blob_refs(grace=0):
+    # Recalcula ref_count a partir dos FileCreated (ex.: arquivos apagados em cascata junto com o usuário)
+    references = FileCreated.objects.filter(blob=OuterRef('pk')).values('blob').annotate(total=Count('id')).values('total')
+    return StoredBlob.objects.filter(updated_at__lte=timezone.now() - timedelta(seconds=grace)).update(
+        ref_count=Coalesce(Subquery(references), Value(0)),
+    )
@@ -0,0 +1,212 @@
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+from pypdf import PdfReader
+from xml.etree.ElementTree import iterparse
+
+from .models import BlobText, BlobTextPage, StoredBlob
+from .storage import storage
+
+import codecs
+import itertools
+import logging
+import tempfile
+import zipfile
+
+logger = logging.getLogger(__name__)
+
+DOCX_CONTENT_TYPE = 'application/vnd.openxmlformats-officedocument.wordprocessingml.document'
+WORD_NS = '{http://schemas.openxmlformats.org/wordprocessingml/2006/main}'
+
+
+class UnsupportedContent(Exception):
+    pass
+
+
+def spool_blob(blob):
+    # PDF e docx precisam de seek: o download vai para um arquivo temporário, em disco acima de FILES_UPLOAD_CHUNK_SIZE
+    spooled = tempfile.SpooledTemporaryFile(max_size=settings.FILES_UPLOAD_CHUNK_SIZE)
+    stream = storage.download_stream(blob.storage_key, chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE)
+    try:
+        for chunk in stream:
+            spooled.write(chunk)
+    except Exception:
+        spooled.close()
+        raise
+    finally:
+        stream.close()
+    spooled.seek(0)
+    return spooled
+
+
+def split_text(parts, page_chars):
+    # Junta os trechos em páginas de até page_chars caracteres, quebrando de preferência num espaço ou fim de linha
+    buffer = ''
+    for part in parts:
+        buffer += part
+        while len(buffer) >= page_chars:
+            cut = max(buffer.rfind('\n', 0, page_chars), buffer.rfind(' ', 0, page_chars))
+            cut = cut + 1 if cut > 0 else page_chars
+            yield buffer[:cut]
+            buffer = buffer[cut:]
+    if buffer:
+        yield buffer
+
+
+def iter_pdf_pages(blob, page_chars):
+    with spool_blob(blob) as spooled:
+        reader = PdfReader(spooled)
+        for page in reader.pages:
+            yield page.extract_text() or ''
+
+
+def decode_chunks(chunks):
+    # Decodificação incremental: um caractere UTF-8 pode ficar dividido entre dois blocos
+    decoder = codecs.getincrementaldecoder('utf-8')(errors='replace')
+    for chunk in chunks:
+        yield decoder.decode(chunk)
+    yield decoder.decode(b'', final=True)
+
+
+def iter_text_pages(blob, page_chars):
+    # Direto do download, sem arquivo temporário: nada além da página atual fica na memória
+    stream = storage.download_stream(blob.storage_key, chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE)
+    try:
+        yield from split_text(decode_chunks(stream), page_chars)
+    finally:
+        stream.close()
+
+
+def iter_docx_paragraphs(document):
+    # iterparse + clear(): o XML do documento é lido parágrafo a parágrafo
+    text = []
+    for _, element in iterparse(document, events=('end',)):
+        if element.tag == f"{WORD_NS}t":
+            text.append(element.text or '')
+        elif element.tag == f"{WORD_NS}tab":
+            text.append('\t')
+        elif element.tag in (f"{WORD_NS}br", f"{WORD_NS}cr"):
+            text.append('\n')
+        elif element.tag == f"{WORD_NS}p":
+            yield ''.join(text) + '\n'
+            text = []
+            element.clear()
+
+
+def iter_docx_pages(blob, page_chars):
+    with spool_blob(blob) as spooled:
+        try:
+            archive = zipfile.ZipFile(spooled)
+            document = archive.open('word/document.xml')
+        except (zipfile.BadZipFile, KeyError):
+            raise UnsupportedContent('Arquivo docx inválido')
+        with archive, document:
+            yield from split_text(iter_docx_paragraphs(document), page_chars)
+
+
+EXTRACTORS = {
+    'application/pdf': iter_pdf_pages,
+    'text/plain': iter_text_pages,
+    DOCX_CONTENT_TYPE: iter_docx_pages,
+}
+
+
+def get_extractor(content_type):
+    return EXTRACTORS.get((content_type or '').split(';')[0].strip().lower())
+
+
+def get_retry_condition(retry_failed=False, prefix=''):
+    # Extrações 'pending' paradas há TEXT_EXTRACTION_TIMEOUT (processo interrompido) e, se pedido, as que falharam
+    stale = timezone.now() - timedelta(seconds=settings.TEXT_EXTRACTION_TIMEOUT)
+    condition = Q(**{f"{prefix}status": 'pending', f"{prefix}updated_at__lte": stale})
+    if retry_failed:
+        condition |= Q(**{f"{prefix}status": 'failed'})
+    return condition
+
+
+def pending_text_blobs(retry_failed=False):
+    # Blobs de arquivos enviados, de tipos suportados, ainda sem texto
+    return StoredBlob.objects.filter(
+        Q(text__isnull=True) | get_retry_condition(retry_failed, prefix='text__'),
+        content_type__in=list(EXTRACTORS),
+        ref_count__gt=0,
+        files__is_generated=False,
+    ).order_by('id').values_list('id', flat=True).distinct()
+
+
+def claim_blob(blob_id, retry_failed=False):
+    # Só um processo extrai cada blob: quem cria a linha 'pending' (ou retoma uma parada) fica com o trabalho
+    text, created = BlobText.objects.get_or_create(blob_id=blob_id)
+    if created:
+        return text
+    claimed = BlobText.objects.filter(get_retry_condition(retry_failed), blob_id=blob_id).update(
+        status='pending', error='', updated_at=timezone.now(),
+    )
+    if not claimed:
+        return None
+    text.refresh_from_db()
+    return text
+
+
+def extract_blob_text(blob_id, retry_failed=False):
+    text = claim_blob(blob_id, retry_failed=retry_failed)
+    if text is None:
+        return None
+    blob = StoredBlob.objects.get(id=blob_id)
+    extractor = get_extractor(blob.content_type)
+    BlobTextPage.objects.filter(blob_id=blob_id).delete()
+    text.page_count = text.char_count = 0
+    text.truncated = False
+    if extractor is None:
+        text.status = 'unsupported'
+        text.save()
+        return text.status
+
+    # Páginas gravadas em lotes: o texto do documento inteiro nunca fica na memória
+    page_chars = settings.TEXT_EXTRACTION_PAGE_CHARS
+    pages = extractor(blob, page_chars)
+    try:
+        numbered = enumerate(pages, start=1)
+        while batch := list(itertools.islice(numbered, settings.TEXT_EXTRACTION_BATCH_SIZE)):
+            rows = []
+            for number, content in batch:
+                content = content.replace('\x00', '')
+                remaining = settings.TEXT_EXTRACTION_MAX_CHARS - text.char_count
+                if len(content) > remaining:
+                    content = content[:remaining]
+                    text.truncated = True
+                text.char_count += len(content)
+                text.page_count = number
+                rows.append(BlobTextPage(blob_id=blob_id, number=number, content=content))
+                if text.truncated:
+                    break
+            BlobTextPage.objects.bulk_create(rows)
+            BlobText.objects.filter(blob_id=blob_id).update(updated_at=timezone.now())
+            if text.truncated:
+                break
+        text.status = 'completed'
+    except UnsupportedContent as e:
+        text.status = 'unsupported'
+        text.error = str(e)
+    except Exception as e:
+        logger.error(f"Text extraction failed: blob {blob_id} - {str(e)}", exc_info=True)
+        text.status = 'failed'
+        text.error = str(e)[:1000]
+    finally:
+        pages.close()
+    if text.status != 'completed':
+        BlobTextPage.objects.filter(blob_id=blob_id).delete()
+        text.page_count = text.char_count = 0
+    text.save()
+    logger.info(f"Text extracted: blob {blob_id} - {text.status}, {text.page_count} pages, {text.char_count} chars")
+    return text.status
+
+
+def run_extraction_batch(blob_ids, retry_failed=False):
+    close_old_connections()
+    try:
+        return [extract_blob_text(blob_id, retry_failed=retry_failed) for blob_id in blob_ids]
+    finally:
+        close_old_connections()
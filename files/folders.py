@@ -0,0 +1,146 @@
+from asgiref.sync import sync_to_async
+from collections import defaultdict
+from django.conf import settings
+from django.db import transaction
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import DocumentFolder, FileCreated, FolderDeletion
+from .assets import BRANDING_NAMES, invalidate_branding_path
+from .batch import chunked
+from .blobs import collect_released_blobs, delete_file_rows
+from .storage import storage
+
+import asyncio
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def build_folder_tree(user):
+    folders = list(DocumentFolder.objects.filter(user=user).only('id', 'folder_name', 'parent_folder_id'))
+    files_by_folder = defaultdict(list)
+    files = FileCreated.objects.filter(user=user, folder__isnull=False).only('id', 'file_name', 'folder_id')
+    for file in files:
+        files_by_folder[file.folder_id].append(file)
+
+    nodes = {
+        folder.id: {'folder': folder, 'files': files_by_folder[folder.id], 'children': []}
+        for folder in folders
+    }
+    roots = []
+    for folder in folders:
+        parent = nodes.get(folder.parent_folder_id)
+        if parent:
+            parent['children'].append(nodes[folder.id])
+        else:
+            roots.append(nodes[folder.id])
+    return roots
+
+
+def get_folder_path(folder):
+    if folder is None:
+        return ''
+    return folder.get_full_path()
+
+
+def get_delete_progress(folder_id, user=None):
+    # No banco, não no cache local: todos os workers web veem o mesmo progresso
+    deletions = FolderDeletion.objects.filter(folder_id=folder_id)
+    if user is not None:
+        deletions = deletions.filter(user=user)
+    deletion = deletions.only('status', 'deleted', 'total', 'updated_at').first()
+    if deletion is None:
+        return None
+    status = deletion.status
+    # Processo interrompido no meio da exclusão: libera uma nova tentativa
+    stale = timezone.now() - timedelta(seconds=settings.FILES_DELETE_TIMEOUT)
+    if status in ('pending', 'running') and deletion.updated_at < stale:
+        status = 'failed'
+    return {'status': status, 'deleted': deletion.deleted, 'total': deletion.total}
+
+
+def set_delete_progress(folder_id, status, deleted=0, total=0):
+    progress = {'status': status, 'deleted': deleted, 'total': total}
+    if not FolderDeletion.objects.filter(folder_id=folder_id).update(**progress, updated_at=timezone.now()):
+        user_id = DocumentFolder.objects.filter(id=folder_id).values_list('user_id', flat=True).first()
+        if user_id is not None:
+            FolderDeletion.objects.update_or_create(folder_id=folder_id, defaults={**progress, 'user_id': user_id})
+    return progress
+
+
+def count_subtree_files(folder):
+    return FileCreated.objects.filter(folder__path__startswith=folder.path).count()
+
+
+def collect_subtree(folder_id):
+    try:
+        folder = DocumentFolder.objects.get(id=folder_id)
+    except DocumentFolder.DoesNotExist:
+        return None
+    folder_ids = list(folder.get_descendants(include_self=True).values_list('id', flat=True))
+    # Arquivos com blob são liberados pela contagem de referências; só os antigos são apagados pelo caminho.
+    # O total conta todos os arquivos, como count_subtree_files
+    legacy_files = FileCreated.objects.filter(folder_id__in=folder_ids, blob=None)
+    file_paths = [file_path for file_path in legacy_files.values_list('file_path', flat=True) if file_path]
+    return folder_ids, file_paths, get_folder_path(folder) + '/', count_subtree_files(folder)
+
+
+def delete_subtree_rows(folder_ids, prefix):
+    with transaction.atomic():
+        blob_ids = delete_file_rows(FileCreated.objects.filter(folder_id__in=folder_ids))
+        DocumentFolder.objects.filter(id__in=folder_ids).delete()
+    collect_released_blobs(blob_ids)
+    # Pasta raiz de branding ("<user_id>/"): as imagens apagadas saem do cache; outros prefixos são ignorados
+    for name in BRANDING_NAMES:
+        invalidate_branding_path(f"{prefix}{name}")
+
+
+def delete_folder_tree(folder_id, track_progress=False):
+    # Só a exclusão em segundo plano grava o progresso; a feita na própria requisição não é acompanhada por ninguém
+    def report(status, deleted=0, total=0):
+        if track_progress:
+            return set_delete_progress(folder_id, status, deleted, total)
+        return {'status': status, 'deleted': deleted, 'total': total}
+
+    subtree = collect_subtree(folder_id)
+    if subtree is None:
+        return report('completed')
+    folder_ids, file_paths, prefix, total = subtree
+    report('running', 0, total)
+
+    # Remove do storage em lotes (uma chamada por lote) antes de apagar as linhas do banco
+    deleted = 0
+    for batch in chunked(file_paths, settings.FILES_DELETE_BATCH_SIZE):
+        try:
+            storage.delete_files(batch)
+        except Exception as e:
+            logger.error(f"Erro ao apagar do storage: {len(batch)} arquivos - {str(e)}")
+        deleted += len(batch)
+        report('running', deleted, total)
+    storage.delete_folder_from_storage(prefix)
+
+    delete_subtree_rows(folder_ids, prefix)
+    logger.info(f"Folder tree deleted: {folder_id} - {len(folder_ids)} pastas, {total} arquivos")
+    return report('completed', total, total)
+
+
+async def adelete_folder_tree(folder_id):
+    subtree = await sync_to_async(collect_subtree)(folder_id)
+    if subtree is None:
+        return {'status': 'completed', 'deleted': 0, 'total': 0}
+    folder_ids, file_paths, prefix, total = subtree
+
+    async def delete_batch(batch):
+        try:
+            await storage.adelete_files(batch)
+        except Exception as e:
+            logger.error(f"Erro ao apagar do storage: {len(batch)} arquivos - {str(e)}")
+
+    # Os lotes são enviados em paralelo pelo cliente assíncrono
+    await asyncio.gather(*(delete_batch(batch) for batch in chunked(file_paths, settings.FILES_DELETE_BATCH_SIZE)))
+    await sync_to_async(storage.delete_folder_from_storage, thread_sensitive=False)(prefix)
+
+    await sync_to_async(delete_subtree_rows)(folder_ids, prefix)
+    logger.info(f"Folder tree deleted: {folder_id} - {len(folder_ids)} pastas, {total} arquivos")
+    return {'status': 'completed', 'deleted': total, 'total': total}
@@ -1,6 +1,10 @@
 from django import forms
+from django.conf import settings
 from django.core.exceptions import ValidationError
 from .models import FileCreated, PDFTemplate, DocumentFolder
+from .cache import LRUCache
+
+template_form_classes = LRUCache(maxsize=getattr(settings, 'PDF_TEMPLATE_CACHE_SIZE', 128))
 
 class FileCreatedForm(forms.ModelForm):
     
@@ -83,4 +87,31 @@ class PDFTemplateForm(forms.ModelForm):
                 'rows': 8,
                 'placeholder': 'CSS customizado (opcional)'
             }),
-        }
\ No newline at end of file
+        }
+
+def build_template_form_class(field_schema):
+    form_fields = {}
+    for field in field_schema['fields']:
+        if field['is_list']:
+            form_fields[field['name']] = forms.CharField(
+                label=field['label'],
+                required=False,
+                widget=forms.Textarea(attrs={'rows': 4, 'placeholder': 'Digite um item por line'})
+            )
+        else:
+            form_fields[field['name']] = forms.CharField(
+                label=field['label'],
+                required=False
+            )
+    return type('DynamicTemplateForm', (forms.Form,), form_fields)
+
+def get_template_form_class(template_obj):
+    key = (template_obj.pk, template_obj.updated_at)
+    form_class = template_form_classes.get(key)
+    if form_class is None:
+        form_class = build_template_form_class(template_obj.get_field_schema())
+        template_form_classes.set(key, form_class)
+    return form_class
+
+def invalidate_template_form_class(template_id):
+    return template_form_classes.discard_where(lambda key: key[0] == template_id)
@@ -0,0 +1,227 @@
+from django.conf import settings
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+import asyncio
+import httpx
+import requests
+import logging
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+IDEMPOTENT_METHODS = frozenset(['GET', 'HEAD', 'PUT', 'DELETE', 'OPTIONS'])
+RETRY_STATUSES = (429, 500, 502, 503, 504)
+
+
+class CircuitOpenError(Exception):
+    pass
+
+
+class CircuitBreaker:
+    # closed: chamadas normais; open: falha imediata; half-open: uma chamada de teste após reset_timeout
+    def __init__(self, name, failure_threshold, reset_timeout):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.failures = 0
+        self.opened_at = None
+        self._trial = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        if self.opened_at is None:
+            return 'closed'
+        if time.monotonic() - self.opened_at >= self.reset_timeout:
+            return 'half-open'
+        return 'open'
+
+    def before_call(self):
+        with self._lock:
+            state = self.state
+            if state == 'open' or (state == 'half-open' and self._trial):
+                raise CircuitOpenError(f"Storage indisponível ({self.name}): circuito aberto")
+            if state == 'half-open':
+                self._trial = True
+
+    def record_success(self):
+        with self._lock:
+            if self.opened_at is not None:
+                logger.info(f"Circuit closed: {self.name}")
+            self.failures = 0
+            self.opened_at = None
+            self._trial = False
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            self._trial = False
+            if self.opened_at is not None or self.failures >= self.failure_threshold:
+                if self.opened_at is None:
+                    logger.warning(f"Circuit opened: {self.name} after {self.failures} failures")
+                self.opened_at = time.monotonic()
+
+
+def is_transient_error(exc):
+    # Falhas de rede, timeouts e respostas 5xx/429 (também quando embrulhadas por outra exceção)
+    while exc is not None:
+        if isinstance(exc, (requests.ConnectionError, requests.Timeout, httpx.TransportError)):
+            return True
+        status = getattr(exc, 'status', None)
+        if status is None:
+            status = getattr(getattr(exc, 'response', None), 'status_code', None)
+        try:
+            if status is not None and int(status) in RETRY_STATUSES:
+                return True
+        except (TypeError, ValueError):
+            pass
+        exc = exc.__cause__ or exc.__context__
+    return False
+
+
+def backoff_delay(attempt):
+    return settings.STORAGE_HTTP_BACKOFF * (2 ** (attempt - 1))
+
+
+def call_with_retry(breaker, operation, func, *args, idempotent=True, **kwargs):
+    attempts = settings.STORAGE_HTTP_RETRIES + 1 if idempotent else 1
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = func(*args, **kwargs)
+        except Exception as e:
+            if not is_transient_error(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Storage {operation} failed (attempt {attempt}), retrying in {delay:.1f}s: {str(e)}")
+            time.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+async def acall_with_retry(breaker, operation, func, *args, idempotent=True, **kwargs):
+    attempts = settings.STORAGE_HTTP_RETRIES + 1 if idempotent else 1
+    for attempt in range(1, attempts + 1):
+        breaker.before_call()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception as e:
+            if not is_transient_error(e):
+                breaker.record_success()
+                raise
+            breaker.record_failure()
+            if attempt == attempts:
+                raise
+            delay = backoff_delay(attempt)
+            logger.warning(f"Storage {operation} failed (attempt {attempt}), retrying in {delay:.1f}s: {str(e)}")
+            await asyncio.sleep(delay)
+        else:
+            breaker.record_success()
+            return result
+
+
+def get_timeout(operation):
+    read = {
+        'upload': settings.STORAGE_HTTP_UPLOAD_TIMEOUT,
+        'download': settings.STORAGE_HTTP_READ_TIMEOUT,
+    }.get(operation, settings.STORAGE_HTTP_TIMEOUT)
+    return settings.STORAGE_HTTP_CONNECT_TIMEOUT, read
+
+
+def create_session():
+    # Pool de conexões keep-alive compartilhado entre threads; só métodos idempotentes são repetidos
+    retry = Retry(
+        total=settings.STORAGE_HTTP_RETRIES,
+        connect=settings.STORAGE_HTTP_RETRIES,
+        read=settings.STORAGE_HTTP_RETRIES,
+        status=settings.STORAGE_HTTP_RETRIES,
+        backoff_factor=settings.STORAGE_HTTP_BACKOFF,
+        status_forcelist=RETRY_STATUSES,
+        allowed_methods=IDEMPOTENT_METHODS,
+        respect_retry_after_header=True,
+        raise_on_status=False,
+    )
+    adapter = HTTPAdapter(
+        pool_connections=settings.STORAGE_HTTP_POOL_SIZE,
+        pool_maxsize=settings.STORAGE_HTTP_POOL_SIZE,
+        max_retries=retry,
+    )
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    return session
+
+
+def _httpx_options(transport_class):
+    limits = httpx.Limits(
+        max_connections=settings.STORAGE_HTTP_POOL_SIZE,
+        max_keepalive_connections=settings.STORAGE_HTTP_POOL_SIZE,
+    )
+    return {
+        'timeout': httpx.Timeout(
+            settings.STORAGE_HTTP_TIMEOUT,
+            connect=settings.STORAGE_HTTP_CONNECT_TIMEOUT,
+            write=settings.STORAGE_HTTP_UPLOAD_TIMEOUT,
+        ),
+        'limits': limits,
+        # Sem retries no transporte: as chamadas já passam por call_with_retry, que também alimenta o circuit breaker
+        'transport': transport_class(limits=limits),
+        'follow_redirects': True,
+    }
+
+
+def create_httpx_client():
+    # Cliente usado pelo SDK do Supabase: mesmo tamanho de pool e timeouts por fase
+    return httpx.Client(**_httpx_options(httpx.HTTPTransport))
+
+
+def create_async_httpx_client():
+    # Um cliente por event loop: as views assíncronas compartilham o pool dentro do worker ASGI
+    return httpx.AsyncClient(**_httpx_options(httpx.AsyncHTTPTransport))
+
+
+def get_httpx_timeout(operation):
+    connect, read = get_timeout(operation)
+    return httpx.Timeout(read, connect=connect)
+
+
+class StorageHttpClient:
+    def __init__(self, name='storage'):
+        self.session = create_session()
+        self.breaker = CircuitBreaker(
+            name,
+            failure_threshold=settings.STORAGE_CIRCUIT_FAILURES,
+            reset_timeout=settings.STORAGE_CIRCUIT_RESET_TIMEOUT,
+        )
+
+    def request(self, method, url, operation, **kwargs):
+        kwargs.setdefault('timeout', get_timeout(operation))
+        self.breaker.before_call()
+        try:
+            response = self.session.request(method, url, **kwargs)
+        except requests.RequestException:
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        return response
+
+    def get(self, url, operation='download', **kwargs):
+        return self.request('GET', url, operation, **kwargs)
+
+    def head(self, url, operation='metadata', **kwargs):
+        return self.request('HEAD', url, operation, **kwargs)
+
+    def post(self, url, operation='metadata', **kwargs):
+        return self.request('POST', url, operation, **kwargs)
+
+    def patch(self, url, operation='upload', **kwargs):
+        return self.request('PATCH', url, operation, **kwargs)
@@ -0,0 +1,264 @@
+from concurrent.futures import ProcessPoolExecutor, ThreadPoolExecutor
+from django.conf import settings
+from django.db import close_old_connections, transaction
+from django.db.models import Q
+from django.utils import timezone
+from datetime import timedelta
+
+from .models import FileCreated
+from .batch import chunked
+from .blobs import store_blob
+from .extraction import extract_blob_text, get_extractor
+from .folders import delete_folder_tree, set_delete_progress
+from .rendering import build_pdf_file_name, render_pdf
+from .workers import init_extraction_worker, init_render_worker
+from .render_cache import apply_cached_render, find_cached_render, get_file_render_key, remember_render
+
+import multiprocessing
+import threading
+import logging
+import tempfile
+
+logger = logging.getLogger(__name__)
+
+_executor = None
+_executor_lock = threading.Lock()
+_delete_executor = None
+_extraction_executor = None
+
+
+def create_render_pool(workers):
+    # spawn: os processos filhos não podem herdar as conexões abertas do banco
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_render_worker,
+    )
+
+
+def get_executor():
+    global _executor
+    if _executor is None:
+        with _executor_lock:
+            if _executor is None:
+                _executor = create_render_pool(settings.PDF_RENDER_WORKERS)
+                logger.info(f"PDF render pool started - workers: {settings.PDF_RENDER_WORKERS}")
+    return _executor
+
+
+def _render(file_obj):
+    # Arquivo temporário em disco acima de FILES_UPLOAD_CHUNK_SIZE: o PDF não fica inteiro na memória
+    pdf_file = tempfile.SpooledTemporaryFile(max_size=settings.FILES_UPLOAD_CHUNK_SIZE)
+    try:
+        render_pdf(file_obj.template, file_obj.data_used, file_obj.user_id, target=pdf_file)
+    except Exception as e:
+        pdf_file.close()
+        logger.error(f"Render job failed: {file_obj.id} - {str(e)}", exc_info=True)
+        file_obj.status = 'failed'
+        return None
+    return pdf_file
+
+
+def _upload(file_obj, pdf_file):
+    try:
+        blob = store_blob(pdf_file, content_type='application/pdf')
+        file_obj.blob = blob
+        file_obj.file_path = blob.storage_key
+        file_obj.file_size = blob.size
+        file_obj.status = 'completed'
+    except Exception as e:
+        logger.error(f"Render upload failed: {file_obj.id} - {str(e)}", exc_info=True)
+        file_obj.status = 'failed'
+    finally:
+        pdf_file.close()
+    return file_obj
+
+
+def _remember_renders(rendered):
+    # Só depois de gravar os arquivos: o cache aponta para blobs já referenciados
+    for key, file_obj in rendered.items():
+        if key is not None and file_obj.status == 'completed' and file_obj.blob_id:
+            remember_render(key, file_obj.blob)
+
+
+def claim_render_jobs(file_ids):
+    # pending -> running numa UPDATE condicional por arquivo: só quem muda a linha renderiza. Linhas 'running'
+    # paradas há PDF_RENDER_TIMEOUT (processo interrompido) podem ser retomadas
+    stale = timezone.now() - timedelta(seconds=settings.PDF_RENDER_TIMEOUT)
+    claimable = FileCreated.objects.filter(Q(status='pending') | Q(status='running', updated_at__lte=stale))
+    return [
+        file_id for file_id in file_ids
+        if claimable.filter(id=file_id).update(status='running', updated_at=timezone.now())
+    ]
+
+
+def run_render_job(file_id):
+    close_old_connections()
+    if not claim_render_jobs([file_id]):
+        logger.warning(f"Render job skipped, file not pending or already claimed: {file_id}")
+        return None
+    file_obj = FileCreated.objects.select_related('template').get(id=file_id)
+
+    rendered = {}
+    key = get_file_render_key(file_obj)
+    if key is None or not apply_cached_render(file_obj, key):
+        rendered[key] = file_obj
+        pdf_file = _render(file_obj)
+        if pdf_file is not None:
+            _upload(file_obj, pdf_file)
+    file_obj.save(update_fields=['status', 'file_size', 'file_path', 'blob', 'updated_at'])
+    _remember_renders(rendered)
+    close_old_connections()
+    return file_obj.status
+
+
+def run_render_batch(file_ids):
+    close_old_connections()
+    claimed = claim_render_jobs(file_ids)
+    files = list(FileCreated.objects.select_related('template').filter(id__in=claimed)) if claimed else []
+    if not files:
+        return []
+
+    # Renderização sequencial no processo (WeasyPrint não é thread-safe); uploads em paralelo
+    rendered = {}
+    with ThreadPoolExecutor(max_workers=settings.PDF_UPLOAD_CONCURRENCY) as uploads:
+        for file_obj in files:
+            key = get_file_render_key(file_obj)
+            if key is not None and apply_cached_render(file_obj, key):
+                continue
+            rendered[key] = file_obj
+            pdf_file = _render(file_obj)
+            if pdf_file is not None:
+                uploads.submit(_upload, file_obj, pdf_file)
+
+    now = timezone.now()
+    for file_obj in files:
+        file_obj.updated_at = now
+    FileCreated.objects.bulk_update(files, ['status', 'file_size', 'file_path', 'blob', 'updated_at'])
+    _remember_renders(rendered)
+    close_old_connections()
+    return [file_obj.status for file_obj in files]
+
+
+def _log_job_result(file_id):
+    def callback(future):
+        exc = future.exception()
+        if exc is not None:
+            logger.error(f"Render worker crashed: {file_id} - {str(exc)}")
+            file_ids = file_id if isinstance(file_id, list) else [file_id]
+            FileCreated.objects.filter(id__in=file_ids, status__in=['pending', 'running']).update(status='failed')
+    return callback
+
+
+def enqueue_render(file_id):
+    if settings.PDF_RENDER_WORKERS <= 0:
+        return run_render_job(file_id)
+    future = get_executor().submit(run_render_job, file_id)
+    future.add_done_callback(_log_job_result(file_id))
+    return future
+
+
+def submit_render(user, template_obj, folder, data):
+    # Mesmos dados, template e branding: reaproveita o PDF já gerado sem renderizar de novo
+    file_name = build_pdf_file_name(data, template_obj)
+    blob = find_cached_render(template_obj, data, user.id)
+    file_obj = FileCreated.objects.create(
+        user=user,
+        template=template_obj,
+        file_name=file_name,
+        file_path=blob.storage_key if blob else f"{folder.folder_name}/{file_name}",
+        status='completed' if blob else 'pending',
+        file_size=blob.size if blob else 0,
+        data_used=data,
+        is_generated=True,
+        folder=folder,
+        blob=blob,
+    )
+    if blob is None:
+        transaction.on_commit(lambda: enqueue_render(file_obj.id))
+    return file_obj
+
+
+def enqueue_render_batch(file_ids, chunk_size=None):
+    chunk_size = chunk_size or settings.PDF_BATCH_CHUNK_SIZE
+    futures = []
+    for chunk in chunked(list(file_ids), chunk_size):
+        if settings.PDF_RENDER_WORKERS <= 0:
+            run_render_batch(chunk)
+            continue
+        future = get_executor().submit(run_render_batch, chunk)
+        future.add_done_callback(_log_job_result(chunk))
+        futures.append(future)
+    return futures
+
+
+def pending_render_jobs(min_age=0):
+    # Pendentes há mais de min_age segundos e os 'running' abandonados; a posse é decidida em claim_render_jobs
+    now = timezone.now()
+    return FileCreated.objects.filter(
+        Q(status='pending', updated_at__lte=now - timedelta(seconds=min_age))
+        | Q(status='running', updated_at__lte=now - timedelta(seconds=settings.PDF_RENDER_TIMEOUT)),
+        is_generated=True,
+    ).values_list('id', flat=True)
+
+
+def get_delete_executor():
+    # Exclusões são limitadas por I/O (storage e banco): threads bastam
+    global _delete_executor
+    if _delete_executor is None:
+        with _executor_lock:
+            if _delete_executor is None:
+                _delete_executor = ThreadPoolExecutor(max_workers=2, thread_name_prefix='folder-delete')
+    return _delete_executor
+
+
+def run_folder_delete(folder_id):
+    close_old_connections()
+    try:
+        return delete_folder_tree(folder_id, track_progress=True)
+    except Exception as e:
+        logger.error(f"Folder delete failed: {folder_id} - {str(e)}", exc_info=True)
+        return set_delete_progress(folder_id, 'failed')
+    finally:
+        close_old_connections()
+
+
+def enqueue_folder_delete(folder_id):
+    set_delete_progress(folder_id, 'pending')
+    return get_delete_executor().submit(run_folder_delete, folder_id)
+
+
+def create_extraction_pool(workers):
+    return ProcessPoolExecutor(
+        max_workers=workers,
+        mp_context=multiprocessing.get_context('spawn'),
+        initializer=init_extraction_worker,
+    )
+
+
+def get_extraction_executor():
+    # Poucas threads no processo web, fora da requisição; o backlog é processado pelo comando extract_text
+    global _extraction_executor
+    if _extraction_executor is None:
+        with _executor_lock:
+            if _extraction_executor is None:
+                _extraction_executor = ThreadPoolExecutor(
+                    max_workers=settings.TEXT_EXTRACTION_WORKERS, thread_name_prefix='text-extraction',
+                )
+    return _extraction_executor
+
+
+def run_text_extraction(blob_id):
+    close_old_connections()
+    try:
+        return extract_blob_text(blob_id)
+    except Exception as e:
+        logger.error(f"Text extraction crashed: blob {blob_id} - {str(e)}", exc_info=True)
+    finally:
+        close_old_connections()
+
+
+def enqueue_text_extraction(blob):
+    if settings.TEXT_EXTRACTION_WORKERS <= 0 or get_extractor(blob.content_type) is None:
+        return None
+    return get_extraction_executor().submit(run_text_extraction, blob.id)
@@ -0,0 +1,177 @@
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand
+from django.core.signals import request_finished, request_started
+from django.db import DEFAULT_DB_ALIAS, close_old_connections, connections, transaction
+from django.test import Client, override_settings
+
+from files.benchmarks import reload_urls, reset_storage, start_stand_in, summarize
+from files.models import FileCreated
+
+import asyncio
+import io
+import json
+import sys
+import time
+
+BUCKET = 'bench'
+FILE_PATH = 'bench/relatorio.docx'
+
+
+@contextmanager
+def shared_connection():
+    # As requisições rodam em outras threads; com a conexão principal elas enxergam o usuário criado na
+    # transação que é desfeita no final (o mesmo que o LiveServerTestCase faz com o servidor de teste)
+    connection = connections[DEFAULT_DB_ALIAS]
+
+    def use_connection(**kwargs):
+        connections[DEFAULT_DB_ALIAS] = connection
+
+    connection.inc_thread_sharing()
+    request_started.disconnect(close_old_connections)
+    request_finished.disconnect(close_old_connections)
+    request_started.connect(use_connection)
+    try:
+        yield
+    finally:
+        request_started.disconnect(use_connection)
+        request_started.connect(close_old_connections)
+        request_finished.connect(close_old_connections)
+        connection.dec_thread_sharing()
+
+
+def run_wsgi(path, cookie, total, threads):
+    from django.core.wsgi import get_wsgi_application
+    application = get_wsgi_application()
+
+    def request():
+        environ = {
+            'REQUEST_METHOD': 'GET', 'PATH_INFO': path, 'QUERY_STRING': '', 'SCRIPT_NAME': '',
+            'SERVER_NAME': 'localhost', 'SERVER_PORT': '80', 'SERVER_PROTOCOL': 'HTTP/1.1',
+            'HTTP_HOST': 'localhost', 'HTTP_COOKIE': cookie,
+            'wsgi.input': io.BytesIO(), 'wsgi.errors': sys.stderr, 'wsgi.url_scheme': 'http',
+            'wsgi.version': (1, 0), 'wsgi.multithread': True, 'wsgi.multiprocess': False, 'wsgi.run_once': False,
+        }
+        status = []
+        started = time.perf_counter()
+        result = application(environ, lambda code, headers, exc_info=None: status.append(code))
+        try:
+            for _ in result:
+                pass
+        finally:
+            result.close()
+        return time.perf_counter() - started, status[0].startswith('200')
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=threads) as executor:
+        results = list(executor.map(lambda _: request(), range(total)))
+    elapsed = time.perf_counter() - started
+    return [latency for latency, ok in results if ok], sum(1 for _, ok in results if not ok), elapsed
+
+
+def run_asgi(path, cookie, total, concurrency):
+    from django.core.asgi import get_asgi_application
+    application = get_asgi_application()
+
+    async def request(semaphore):
+        scope = {
+            'type': 'http', 'asgi': {'version': '3.0'}, 'http_version': '1.1', 'method': 'GET', 'scheme': 'http',
+            'path': path, 'raw_path': path.encode(), 'query_string': b'', 'root_path': '',
+            'headers': [(b'host', b'localhost'), (b'cookie', cookie.encode())],
+            'client': ('127.0.0.1', 0), 'server': ('localhost', 80),
+        }
+        sent_body = False
+        status = []
+
+        async def receive():
+            nonlocal sent_body
+            if not sent_body:
+                sent_body = True
+                return {'type': 'http.request', 'body': b'', 'more_body': False}
+            await asyncio.Event().wait()
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                status.append(message['status'])
+
+        async with semaphore:
+            started = time.perf_counter()
+            await application(scope, receive, send)
+            return time.perf_counter() - started, status[0] == 200
+
+    async def main():
+        semaphore = asyncio.Semaphore(concurrency)
+        return await asyncio.gather(*(request(semaphore) for _ in range(total)))
+
+    started = time.perf_counter()
+    results = asyncio.run(main())
+    elapsed = time.perf_counter() - started
+    return [latency for latency, ok in results if ok], sum(1 for _, ok in results if not ok), elapsed
+
+
+class Command(BaseCommand):
+    help = 'Compara requisições/s e latência p99 de downloads entre WSGI e ASGI com um storage local simulado.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--requests', type=int, default=500)
+        parser.add_argument('--concurrency', type=int, default=100, help='Requisições simultâneas no ASGI')
+        parser.add_argument('--wsgi-threads', type=int, default=8, help='Threads do worker WSGI (gunicorn --threads)')
+        parser.add_argument('--latency', type=float, default=50, help='Latência simulada do storage em ms')
+        parser.add_argument('--size', type=int, default=256 * 1024, help='Tamanho do arquivo baixado em bytes')
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+
+    def handle(self, *args, **options):
+        server, port = start_stand_in(options['latency'] / 1000, options['size'])
+        try:
+            # Tudo roda numa transação desfeita no final: o banco não guarda o usuário, o arquivo nem a sessão
+            with transaction.atomic(), shared_connection():
+                results = self.run_deployments(port, options)
+                transaction.set_rollback(True)
+        finally:
+            server.terminate()
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['deployment'].upper()}: {result['requests_per_second']:.2f} req/s, "
+                f"p50 {result['p50_ms']}ms, p99 {result['p99_ms']}ms, {result['errors']} erros"
+            )
+
+    def run_deployments(self, port, options):
+        user = get_user_model().objects.create(email=f"benchmark-{time.time_ns()}@easydocs.local")
+        file_obj = FileCreated.objects.create(
+            user=user, file_name='relatorio.docx', file_path=FILE_PATH, file_size=options['size'],
+        )
+        client = Client()
+        client.force_login(user)
+        cookie = f"{settings.SESSION_COOKIE_NAME}={client.cookies[settings.SESSION_COOKIE_NAME].value}"
+        path = f"/files/download/{file_obj.id}/"
+
+        results = []
+        try:
+            for name, async_views, runner, workers in [
+                ('wsgi', False, run_wsgi, options['wsgi_threads']),
+                ('asgi', True, run_asgi, options['concurrency']),
+            ]:
+                with override_settings(
+                    FILES_STORAGE_BACKEND='files.supabase_storage.SupabaseStorageService',
+                    SUPABASE_URL=f"http://127.0.0.1:{port}",
+                    SUPABASE_KEY='benchmark',
+                    SUPABASE_BUCKET=BUCKET,
+                    SUPABASE_SIGNED_URL_CACHE='',
+                    FILES_ASYNC_VIEWS=async_views,
+                    ALLOWED_HOSTS=['localhost'],
+                    SECURE_SSL_REDIRECT=False,
+                ):
+                    reset_storage()
+                    reload_urls()
+                    latencies, errors, elapsed = runner(path, cookie, options['requests'], workers)
+                results.append(summarize(name, latencies, errors, elapsed))
+        finally:
+            reset_storage()
+            reload_urls()
+        return results
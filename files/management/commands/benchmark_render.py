@@ -0,0 +1,87 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from django.template import Context, Template
+from django.utils import timezone
+
+from files.assets import BRANDING_FILES, branding_assets, get_branding_fetcher, get_branding_urls
+from files.benchmarks import placeholder_image, sample_context, summarize_renders, time_calls
+from files.models import PDFTemplate
+from files.placeholders import build_field_schema
+from files.rendering import HTML_DESIGN, SHARED_CSS, PDFRenderer
+
+import io
+import json
+import os
+
+BENCHMARK_USER = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = 'Mede o tempo por PDF renderizando um template com e sem o PDFRenderer pré-aquecido.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--template', default=os.path.join(settings.BASE_DIR, 'models', 'proposal.html'))
+        parser.add_argument('--css', help='Arquivo CSS usado como css_content do template')
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--json', action='store_true', help='Imprime o resultado em JSON')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['template'], encoding='utf-8') as template_file:
+                html_content = template_file.read()
+            css_content = ''
+            if options['css']:
+                with open(options['css'], encoding='utf-8') as css_file:
+                    css_content = css_file.read()
+        except OSError as e:
+            raise CommandError(str(e))
+
+        from weasyprint import HTML
+        from weasyprint.text.fonts import FontConfiguration
+
+        for name in BRANDING_FILES.values():
+            branding_assets.put(BENCHMARK_USER, name, placeholder_image())
+        context = sample_context(build_field_schema(html_content))
+        context.update(get_branding_urls())
+        base_url = os.path.join(settings.BASE_DIR, 'static')
+
+        # Antes: todo o CSS embutido no HTML e fontes registradas a cada PDF
+        cold_template = Template(f"<style>{SHARED_CSS}{css_content}</style>" + HTML_DESIGN + html_content)
+
+        def render_cold():
+            HTML(
+                string=cold_template.render(Context(context)),
+                base_url=base_url,
+                url_fetcher=get_branding_fetcher(BENCHMARK_USER),
+            ).write_pdf(io.BytesIO(), font_config=FontConfiguration())
+
+        warm_template = Template(HTML_DESIGN + html_content)
+        renderer = PDFRenderer(base_url=base_url)
+        template_obj = PDFTemplate(pk=0, css_content=css_content, updated_at=timezone.now())
+
+        def render_warm():
+            stylesheet = renderer.get_template_stylesheet(template_obj)
+            renderer.render(
+                warm_template.render(Context(context)),
+                BENCHMARK_USER,
+                target=io.BytesIO(),
+                stylesheets=[stylesheet] if stylesheet else [],
+            )
+
+        render_warm()
+        results = [
+            summarize_renders('cold', time_calls(render_cold, options['iterations'])),
+            summarize_renders('warm', time_calls(render_warm, options['iterations'])),
+        ]
+        branding_assets.invalidate(BENCHMARK_USER)
+
+        if options['json']:
+            self.stdout.write(json.dumps(results, indent=2))
+            return
+        for result in results:
+            self.stdout.write(
+                f"{result['mode'].upper()}: {result['mean_ms']}ms/PDF em média, "
+                f"p50 {result['p50_ms']}ms, máx {result['max_ms']}ms ({result['renders']} PDFs)"
+            )
+        speedup = results[0]['mean_ms'] / results[1]['mean_ms'] if results[1]['mean_ms'] else 0
+        self.stdout.write(f"Ganho: {speedup:.2f}x")
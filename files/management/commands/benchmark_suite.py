@@ -0,0 +1,249 @@
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.template import Context, Template
+from django.test import RequestFactory, override_settings
+
+from files.assets import BRANDING_FILES, branding_assets, get_branding_urls
+from files.benchmarks import compare_results, measure, placeholder_image, reset_storage, sample_context
+from files.blobs import store_blob
+from files.models import DocumentFolder, FileCreated, PDFTemplate
+from files.placeholders import build_field_schema, extract_html_all_fields
+from files.rendering import HTML_DESIGN, get_cache_stats, get_compiled_template
+from files.views import file_management_view, fill_template_view
+
+import django
+import io
+import itertools
+import json
+import os
+import platform
+import tempfile
+import time
+
+BENCHMARK_USER = 'benchmark'
+
+
+class Command(BaseCommand):
+    help = (
+        'Executa os benchmarks de geração de PDF (extração de campos, templates, WeasyPrint, upload e árvore '
+        'de pastas) sem acesso à rede e emite JSON para comparação entre commits.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument('--iterations', type=int, default=5)
+        parser.add_argument('--template', default=os.path.join(settings.BASE_DIR, 'models', 'proposal.html'))
+        parser.add_argument('--list-lengths', default='1,10,100', help='Itens nas listas do template renderizado')
+        parser.add_argument('--upload-sizes', default='65536,1048576,8388608', help='Tamanhos de upload em bytes')
+        parser.add_argument('--tree-sizes', default='10,1000,100000', help='Quantidade de arquivos na árvore')
+        parser.add_argument('--only', help='Executa apenas os benchmarks cujo nome começa com este prefixo')
+        parser.add_argument('--label', default='', help='Identificação gravada no resultado (ex.: hash do commit)')
+        parser.add_argument('--output', help='Grava o resultado em JSON neste arquivo')
+        parser.add_argument('--baseline', help='Resultado anterior em JSON para detectar regressões')
+        parser.add_argument('--threshold', type=float, default=10, help='Regressão máxima aceita, em %%')
+
+    def handle(self, *args, **options):
+        try:
+            with open(options['template'], encoding='utf-8') as template_file:
+                self.html_content = template_file.read()
+            baseline = None
+            if options['baseline']:
+                with open(options['baseline'], encoding='utf-8') as baseline_file:
+                    baseline = json.load(baseline_file)
+        except (OSError, ValueError) as e:
+            raise CommandError(str(e))
+
+        self.iterations = options['iterations']
+        self.only = options['only']
+        self.results = []
+        suites = [
+            ('fields', self.bench_field_extraction, {}),
+            ('template', self.bench_template, {}),
+            ('render', self.bench_pdf_render, {'lengths': parse_sizes(options['list_lengths'])}),
+            ('upload', self.bench_upload, {'sizes': parse_sizes(options['upload_sizes'])}),
+            ('view', self.bench_fill_template, {}),
+            ('tree', self.bench_folder_tree, {'sizes': parse_sizes(options['tree_sizes'])}),
+        ]
+        # Tudo roda numa transação desfeita no final: o banco não guarda usuários, arquivos nem blobs de teste
+        with transaction.atomic():
+            self.user = get_user_model().objects.create(email=f"benchmark-{time.time_ns()}@easydocs.local")
+            for prefix, suite, kwargs in suites:
+                if self.selected(prefix):
+                    suite(**kwargs)
+            transaction.set_rollback(True)
+
+        report = {
+            'label': options['label'],
+            'created_at': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+            'environment': {
+                'python': platform.python_version(),
+                'django': django.get_version(),
+                'platform': platform.platform(),
+                'cpus': os.cpu_count(),
+            },
+            'results': self.results,
+            'caches': get_cache_stats(),
+        }
+        output = json.dumps(report, indent=2, ensure_ascii=False)
+        if options['output']:
+            with open(options['output'], 'w', encoding='utf-8') as output_file:
+                output_file.write(output)
+        else:
+            self.stdout.write(output)
+
+        if baseline is not None:
+            regressions = compare_results(baseline, report, options['threshold'])
+            for regression in regressions:
+                self.stderr.write(
+                    f"REGRESSÃO {regression['name']}: {regression['baseline_ms']}ms -> "
+                    f"{regression['current_ms']}ms (+{regression['change_pct']}%)"
+                )
+            if regressions:
+                raise CommandError(f"{len(regressions)} benchmark(s) acima do limite de {options['threshold']}%")
+            self.stderr.write(f"Nenhuma regressão acima de {options['threshold']}%")
+
+    def selected(self, name):
+        return not self.only or name.startswith(self.only) or self.only.startswith(name)
+
+    def run(self, name, func, iterations=None, **params):
+        if not self.selected(name):
+            return
+        self.results.append(measure(name, func, iterations or self.iterations, **params))
+
+    def skip(self, name, reason):
+        if self.selected(name):
+            self.results.append({'name': name, 'skipped': reason})
+
+    def bench_field_extraction(self):
+        # Template grande: a proposta repetida e centenas de campos extras
+        fields = ''.join(f"<p>{{{{ campo_extra_{i} }}}}</p>{{% for item in lista_{i} %}}{{{{ item }}}}{{% endfor %}}" for i in range(500))
+        large_html = self.html_content * 20 + fields
+        self.run('fields.extract_all', lambda: extract_html_all_fields(large_html), bytes=len(large_html))
+        self.run('fields.build_schema', lambda: build_field_schema(large_html), bytes=len(large_html))
+
+    def bench_template(self):
+        source = HTML_DESIGN + self.html_content
+        context = self.context(10)
+        compiled = Template(source)
+        self.run('template.compile', lambda: Template(source))
+        self.run('template.render', lambda: compiled.render(Context(context)), list_length=10)
+        # Caminho do render_pdf: o template compilado vem do cache por versão (ver 'caches' no relatório)
+        template_obj = PDFTemplate.objects.create(
+            user=self.user, template_name='proposta', html_content=self.html_content,
+        )
+        self.run('template.compiled_cache', lambda: get_compiled_template(template_obj))
+
+    def bench_pdf_render(self, lengths):
+        try:
+            from files.rendering import PDFRenderer
+            renderer = PDFRenderer(base_url=os.path.join(settings.BASE_DIR, 'static'))
+        except (ImportError, OSError) as e:
+            for length in lengths:
+                self.skip(f"render.pdf[items={length}]", f"WeasyPrint indisponível: {str(e)}")
+            return
+        for name in BRANDING_FILES.values():
+            branding_assets.put(BENCHMARK_USER, name, placeholder_image())
+        compiled = Template(HTML_DESIGN + self.html_content)
+        try:
+            for length in lengths:
+                context = self.context(length)
+                self.run(
+                    f"render.pdf[items={length}]",
+                    lambda: renderer.render(compiled.render(Context(context)), BENCHMARK_USER, target=io.BytesIO()),
+                    list_length=length,
+                )
+        finally:
+            branding_assets.invalidate(BENCHMARK_USER)
+
+    def bench_upload(self, sizes):
+        # Storage local num diretório temporário: mede hash + gravação do blob, sem rede
+        with tempfile.TemporaryDirectory() as root, override_settings(
+            FILES_STORAGE_BACKEND='files.storage.LocalStorageService',
+            FILES_STORAGE_ROOT=root,
+        ):
+            reset_storage()
+            try:
+                counter = itertools.count()
+                for size in sizes:
+                    payload = os.urandom(size)
+
+                    def upload():
+                        # Conteúdo diferente a cada chamada: a deduplicação não pode pular o envio
+                        content = next(counter).to_bytes(8, 'big') + payload[8:]
+                        store_blob(io.BytesIO(content), content_type='application/pdf')
+
+                    self.run(f"upload.blob[bytes={size}]", upload, bytes=size)
+            finally:
+                reset_storage()
+
+    def bench_fill_template(self):
+        template_obj = PDFTemplate.objects.create(
+            user=self.user, template_name='proposta', html_content=self.html_content,
+        )
+        folder = DocumentFolder.objects.create(user=self.user, folder_name='benchmark')
+        data = {'folder_id': folder.id, 'action': 'generate'}
+        for field in template_obj.get_field_schema()['fields']:
+            data[field['name']] = 'Item 1\nItem 2' if field['is_list'] else f"Exemplo {field['label']}"
+        factory = RequestFactory()
+
+        def submit():
+            request = factory.post(f"/files/templates/{template_obj.id}/fill/", data)
+            request.user = self.user
+            fill_template_view(request, template_obj.id)
+
+        # A renderização fica de fora (on_commit não dispara dentro da transação); mede validação e gravação
+        self.run('view.fill_template.submit', submit)
+
+    def bench_folder_tree(self, sizes):
+        factory = RequestFactory()
+        for size in sizes:
+            if not self.selected(f"tree.file_management[files={size}]"):
+                continue
+            user = get_user_model().objects.create(email=f"tree-{size}-{time.time_ns()}@easydocs.local")
+            self.create_tree(user, size)
+            request = factory.get('/files/')
+            request.user = user
+            iterations = self.iterations if size < 100000 else max(1, self.iterations // 2)
+            self.run(
+                f"tree.file_management[files={size}]",
+                lambda: file_management_view(request).content,
+                iterations=iterations,
+                files=size,
+            )
+
+    def create_tree(self, user, size, folder_count=20):
+        # Metade das pastas na raiz e metade como subpastas, com os arquivos distribuídos igualmente
+        roots = [DocumentFolder.objects.create(user=user, folder_name=f"raiz-{i}") for i in range(folder_count // 2)]
+        folders = roots + [
+            DocumentFolder.objects.create(user=user, folder_name=f"sub-{i}", parent_folder=roots[i % len(roots)])
+            for i in range(folder_count - len(roots))
+        ]
+        FileCreated.objects.bulk_create(
+            (
+                FileCreated(
+                    user=user,
+                    file_name=f"documento-{i}.pdf",
+                    file_path=f"bench/documento-{i}.pdf",
+                    file_size=1024,
+                    folder=folders[i % len(folders)],
+                )
+                for i in range(size)
+            ),
+            batch_size=5000,
+        )
+
+    def context(self, list_length):
+        context = sample_context(build_field_schema(self.html_content))
+        for name, value in context.items():
+            if isinstance(value, list):
+                context[name] = [f"Item de exemplo {i + 1}" for i in range(list_length)]
+        context.update(get_branding_urls())
+        return context
+
+
+def parse_sizes(value):
+    try:
+        return [int(size) for size in value.split(',') if size.strip()]
+    except ValueError:
+        raise CommandError(f"Lista de tamanhos inválida: {value}")
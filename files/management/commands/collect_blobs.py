@@ -0,0 +1,22 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from files.blobs import collect_orphan_blobs, reconcile_blob_refs
+
+
+class Command(BaseCommand):
+    help = 'Remove do storage os blobs sem referências (em lotes) e, opcionalmente, recalcula as contagens.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--grace', type=int, default=settings.BLOB_GC_GRACE,
+                            help='Segundos sem referências antes de remover um blob')
+        parser.add_argument('--batch-size', type=int, default=settings.FILES_DELETE_BATCH_SIZE)
+        parser.add_argument('--reconcile', action='store_true',
+                            help='Recalcula ref_count a partir dos arquivos antes da coleta')
+
+    def handle(self, *args, **options):
+        if options['reconcile']:
+            updated = reconcile_blob_refs(grace=options['grace'])
+            self.stdout.write(f"{updated} blobs recontados")
+        collected = collect_orphan_blobs(grace=options['grace'], batch_size=options['batch_size'])
+        self.stdout.write(f"{collected} blobs removidos")
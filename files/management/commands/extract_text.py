@@ -0,0 +1,41 @@
+from django.core.management.base import BaseCommand
+
+from files.batch import chunked
+from files.jobs import create_extraction_pool
+from files.extraction import pending_text_blobs, run_extraction_batch
+
+from collections import Counter
+from functools import partial
+
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Extrai o texto dos arquivos enviados (PDF, txt, docx) ainda não indexados, em lotes paralelos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--batch-size', type=int, default=20, help='Blobs por tarefa enviada a cada processo')
+        parser.add_argument('--limit', type=int, help='Processa no máximo N blobs por rodada')
+        parser.add_argument('--retry-failed', action='store_true', help='Tenta de novo as extrações que falharam')
+        parser.add_argument('--loop', action='store_true', help='Continua verificando novos arquivos.')
+        parser.add_argument('--interval', type=float, default=30.0)
+
+    def handle(self, *args, **options):
+        extract = partial(run_extraction_batch, retry_failed=options['retry_failed'])
+        with create_extraction_pool(options['workers']) as executor:
+            while True:
+                blob_ids = pending_text_blobs(options['retry_failed'])
+                blob_ids = list(blob_ids[:options['limit']] if options['limit'] else blob_ids)
+                if blob_ids:
+                    started = time.perf_counter()
+                    statuses = Counter()
+                    for results in executor.map(extract, chunked(blob_ids, options['batch_size'])):
+                        statuses.update(status for status in results if status is not None)
+                    summary = ', '.join(f"{count} {status}" for status, count in sorted(statuses.items()))
+                    elapsed = time.perf_counter() - started
+                    self.stdout.write(f"{len(blob_ids)} arquivos em {elapsed:.1f}s: {summary or 'nenhum extraído'}")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
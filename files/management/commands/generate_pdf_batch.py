@@ -0,0 +1,51 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+
+from files.batch import BatchInputError, chunked, create_batch_files, load_rows
+from files.jobs import create_render_pool, run_render_batch
+from files.models import DocumentFolder, PDFTemplate
+
+import os
+import time
+
+
+class Command(BaseCommand):
+    help = 'Gera PDFs em lote a partir de um arquivo CSV ou JSON com os valores dos campos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('template_id', type=int)
+        parser.add_argument('input', help='Arquivo .csv ou .json (lista de objetos)')
+        parser.add_argument('--folder', type=int, required=True, help='ID da pasta de destino')
+        parser.add_argument('--workers', type=int, default=os.cpu_count() or 1)
+        parser.add_argument('--chunk-size', type=int, default=settings.PDF_BATCH_CHUNK_SIZE)
+
+    def handle(self, *args, **options):
+        try:
+            template_obj = PDFTemplate.objects.get(id=options['template_id'])
+            folder = DocumentFolder.objects.get(id=options['folder'], user=template_obj.user)
+        except (PDFTemplate.DoesNotExist, DocumentFolder.DoesNotExist) as e:
+            raise CommandError(str(e))
+
+        try:
+            with open(options['input'], 'rb') as stream:
+                rows = load_rows(stream, options['input'])
+        except (OSError, BatchInputError) as e:
+            raise CommandError(str(e))
+
+        started = time.perf_counter()
+        try:
+            files = create_batch_files(template_obj.user, template_obj, folder, rows)
+        except BatchInputError as e:
+            raise CommandError(str(e))
+        chunks = list(chunked([file_obj.id for file_obj in files], options['chunk_size']))
+        with create_render_pool(options['workers']) as executor:
+            statuses = [status for chunk in executor.map(run_render_batch, chunks) for status in chunk]
+        elapsed = time.perf_counter() - started
+
+        completed = statuses.count('completed')
+        self.stdout.write(
+            f"{completed}/{len(files)} PDFs gerados em {elapsed:.2f}s "
+            f"({completed / elapsed if elapsed else 0:.2f} docs/s, {options['workers']} workers)"
+        )
+        if completed < len(files):
+            self.stderr.write(f"{len(files) - completed} PDFs falharam")
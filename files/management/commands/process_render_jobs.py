@@ -0,0 +1,31 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+
+from files.jobs import create_render_pool, pending_render_jobs, run_render_job
+
+import time
+
+
+class Command(BaseCommand):
+    help = 'Processa os PDFs pendentes (status=pending) usando um pool local de processos.'
+
+    def add_arguments(self, parser):
+        parser.add_argument('--workers', type=int, default=max(settings.PDF_RENDER_WORKERS, 1))
+        parser.add_argument('--loop', action='store_true', help='Continua verificando novos jobs.')
+        parser.add_argument('--interval', type=float, default=2.0)
+        parser.add_argument(
+            '--min-age', type=int, default=60,
+            help='Ignora jobs mais recentes que N segundos (ainda no pool do servidor web).'
+        )
+
+    def handle(self, *args, **options):
+        with create_render_pool(options['workers']) as executor:
+            while True:
+                file_ids = list(pending_render_jobs(options['min_age']))
+                if file_ids:
+                    results = list(executor.map(run_render_job, file_ids))
+                    completed = results.count('completed')
+                    self.stdout.write(f"{completed}/{len(file_ids)} PDFs gerados")
+                if not options['loop']:
+                    break
+                time.sleep(options['interval'])
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:31
+
+from django.db import migrations, models
+
+from files.placeholders import build_field_schema
+
+
+def populate_field_schema(apps, schema_editor):
+    PDFTemplate = apps.get_model('files', 'PDFTemplate')
+    for template in PDFTemplate.objects.only('id', 'html_content').iterator():
+        template.field_schema = build_field_schema(template.html_content)
+        template.save(update_fields=['field_schema'])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='pdftemplate',
+            name='field_schema',
+            field=models.JSONField(blank=True, default=dict, editable=False),
+        ),
+        migrations.RunPython(populate_field_schema, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,51 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:41
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+def populate_folder_paths(apps, schema_editor):
+    DocumentFolder = apps.get_model('files', 'DocumentFolder')
+    folders = list(DocumentFolder.objects.only('id', 'parent_folder_id'))
+    children = {}
+    for folder in folders:
+        children.setdefault(folder.parent_folder_id, []).append(folder)
+    known_ids = {folder.id for folder in folders}
+    pending = [
+        (folder, '/', 0) for folder in folders
+        if folder.parent_folder_id is None or folder.parent_folder_id not in known_ids
+    ]
+    updated = []
+    while pending:
+        folder, parent_path, depth = pending.pop()
+        folder.path = f"{parent_path}{folder.id}/"
+        folder.depth = depth
+        updated.append(folder)
+        pending.extend((child, folder.path, depth + 1) for child in children.get(folder.id, []))
+    DocumentFolder.objects.bulk_update(updated, ['path', 'depth'], batch_size=500)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0002_pdftemplate_field_schema'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='documentfolder',
+            name='depth',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='documentfolder',
+            name='path',
+            field=models.CharField(blank=True, default='', editable=False, max_length=500),
+        ),
+        migrations.AddIndex(
+            model_name='documentfolder',
+            index=models.Index(fields=['path'], name='files_folder_path_idx', opclasses=['varchar_pattern_ops']),
+        ),
+        migrations.RunPython(populate_folder_paths, migrations.RunPython.noop),
+    ]
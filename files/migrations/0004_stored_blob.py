@@ -0,0 +1,37 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:56
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0003_documentfolder_materialized_path'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='StoredBlob',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('sha256', models.CharField(max_length=64, unique=True)),
+                ('storage_key', models.CharField(max_length=500)),
+                ('size', models.BigIntegerField()),
+                ('content_type', models.CharField(blank=True, default='', max_length=255)),
+                ('ref_count', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Blob',
+                'verbose_name_plural': 'Blobs',
+                'indexes': [models.Index(fields=['ref_count', 'updated_at'], name='files_blob_orphan_idx')],
+            },
+        ),
+        migrations.AddField(
+            model_name='filecreated',
+            name='blob',
+            field=models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.SET_NULL, related_name='files', to='files.storedblob'),
+        ),
+    ]
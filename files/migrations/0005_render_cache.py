@@ -0,0 +1,29 @@
+# Generated by Django 5.2.8 on 2026-10-18 03:59
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0004_stored_blob'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='RenderCacheEntry',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('last_used_at', models.DateTimeField(auto_now=True)),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='render_cache_entries', to='files.storedblob')),
+            ],
+            options={
+                'verbose_name': 'Cache de Renderização',
+                'verbose_name_plural': 'Cache de Renderizações',
+                'indexes': [models.Index(fields=['last_used_at'], name='files_render_cache_lru_idx')],
+            },
+        ),
+    ]
@@ -0,0 +1,19 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:09
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0005_render_cache'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(fields=['user', 'is_generated', 'created_at', 'id'], name='files_file_generated_idx'),
+        ),
+    ]
@@ -0,0 +1,47 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:10
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0006_filecreated_generated_index'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='documentfolder',
+            index=models.Index(fields=['user', 'parent_folder'], name='files_folder_parent_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='documentfolder',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='files_folder_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='files_file_created_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(fields=['user', 'folder'], name='files_file_folder_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(fields=['folder', 'file_name'], name='files_file_folder_name_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(condition=models.Q(('status', 'pending')), fields=['updated_at'], name='files_file_pending_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdftemplate',
+            index=models.Index(condition=models.Q(('is_active', True)), fields=['user', 'created_at'], name='files_template_active_idx'),
+        ),
+        migrations.AddIndex(
+            model_name='pdftemplate',
+            index=models.Index(fields=['user', 'created_at', 'id'], name='files_template_created_idx'),
+        ),
+    ]
@@ -0,0 +1,41 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:13
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import files.search
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0007_composite_indexes'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        files.search.AddPostgresIndex(
+            model_name='filecreated',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.CombinedSearchVector(
+                    django.contrib.postgres.search.CombinedSearchVector(
+                        django.contrib.postgres.search.SearchVector(
+                            models.Func(
+                                models.F('file_name'), models.Value('_-.'), models.Value('   '),
+                                function='translate', output_field=models.TextField(),
+                            ),
+                            config='portuguese', weight='A',
+                        ),
+                        '||',
+                        django.contrib.postgres.search.SearchVector('description', config='portuguese', weight='B'),
+                        django.contrib.postgres.search.SearchConfig('portuguese'),
+                    ),
+                    '||',
+                    files.search.JSONStringsVector('data_used', 'portuguese', 'C'),
+                    django.contrib.postgres.search.SearchConfig('portuguese'),
+                ),
+                name='files_file_search_idx',
+            ),
+        ),
+    ]
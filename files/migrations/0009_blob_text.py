@@ -0,0 +1,56 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:18
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+import django.db.models.deletion
+import files.search
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0008_filecreated_search_index'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BlobText',
+            fields=[
+                ('blob', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='text', serialize=False, to='files.storedblob')),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('completed', 'Concluído'), ('failed', 'Falha'), ('unsupported', 'Não suportado')], default='pending', max_length=20)),
+                ('page_count', models.PositiveIntegerField(default=0)),
+                ('char_count', models.PositiveIntegerField(default=0)),
+                ('truncated', models.BooleanField(default=False)),
+                ('error', models.TextField(blank=True, default='')),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+            ],
+            options={
+                'verbose_name': 'Texto Extraído',
+                'verbose_name_plural': 'Textos Extraídos',
+            },
+        ),
+        migrations.CreateModel(
+            name='BlobTextPage',
+            fields=[
+                ('id', models.BigAutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('number', models.PositiveIntegerField()),
+                ('content', models.TextField()),
+                ('blob', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='text_pages', to='files.storedblob')),
+            ],
+            options={
+                'verbose_name': 'Página de Texto',
+                'verbose_name_plural': 'Páginas de Texto',
+                'ordering': ['blob', 'number'],
+                'unique_together': {('blob', 'number')},
+            },
+        ),
+        files.search.AddPostgresIndex(
+            model_name='blobtextpage',
+            index=django.contrib.postgres.indexes.GinIndex(
+                django.contrib.postgres.search.SearchVector('content', config='portuguese'),
+                name='files_text_page_search_idx',
+            ),
+        ),
+    ]
@@ -0,0 +1,28 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:27
+
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0009_blob_text'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.RemoveIndex(
+            model_name='filecreated',
+            name='files_file_pending_idx',
+        ),
+        migrations.AlterField(
+            model_name='filecreated',
+            name='status',
+            field=models.CharField(choices=[('pending', 'Pendente'), ('running', 'Processando'), ('completed', 'Concluído'), ('failed', 'Falha')], default='completed', max_length=20),
+        ),
+        migrations.AddIndex(
+            model_name='filecreated',
+            index=models.Index(condition=models.Q(('status__in', ['pending', 'running'])), fields=['updated_at'], name='files_file_pending_idx'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.8 on 2026-10-18 04:28
+
+import django.db.models.deletion
+from django.conf import settings
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('files', '0010_filecreated_running_status'),
+        migrations.swappable_dependency(settings.AUTH_USER_MODEL),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='FolderDeletion',
+            fields=[
+                ('folder_id', models.BigIntegerField(primary_key=True, serialize=False)),
+                ('status', models.CharField(choices=[('pending', 'Pendente'), ('running', 'Excluindo'), ('completed', 'Concluído'), ('failed', 'Falha')], default='pending', max_length=20)),
+                ('deleted', models.PositiveIntegerField(default=0)),
+                ('total', models.PositiveIntegerField(default=0)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('updated_at', models.DateTimeField(auto_now=True)),
+                ('user', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='folder_deletions', to=settings.AUTH_USER_MODEL)),
+            ],
+            options={
+                'verbose_name': 'Exclusão de Pasta',
+                'verbose_name_plural': 'Exclusões de Pastas',
+            },
+        ),
+    ]
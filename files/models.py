@@ -1,11 +1,20 @@
-from django.db import models
+from django.db import models, transaction
+from django.db.models import F, Q, Value
+from django.db.models.functions import Concat, Substr
 from django.conf import settings
+from django.contrib.postgres.indexes import GinIndex
+
+from .placeholders import build_field_schema
+from .search import get_page_search_vector, get_search_vector
 
 class DocumentFolder(models.Model):
     user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='document_folders')
     folder_name = models.CharField(max_length=255)
     description = models.TextField(blank=True, null=True)
     parent_folder = models.ForeignKey('self', on_delete=models.SET_NULL, null=True, blank=True, related_name='subfolders')
+    # Caminho materializado com os ids dos ancestrais e da própria pasta: "/1/5/9/"
+    path = models.CharField(max_length=500, blank=True, default='', editable=False)
+    depth = models.PositiveIntegerField(default=0, editable=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
 
@@ -14,10 +23,169 @@ class DocumentFolder(models.Model):
         verbose_name = 'Pasta de Documentos'
         verbose_name_plural = 'Pastas de Documentos'
         unique_together = ('user', 'folder_name', 'parent_folder')
+        indexes = [
+            models.Index(fields=['path'], name='files_folder_path_idx', opclasses=['varchar_pattern_ops']),
+            # Subpastas de uma pasta do usuário (API ?parent=, criação e árvore)
+            models.Index(fields=['user', 'parent_folder'], name='files_folder_parent_idx'),
+            models.Index(fields=['user', 'created_at', 'id'], name='files_folder_created_idx'),
+        ]
 
     def __str__(self):
         return self.folder_name
 
+    def save(self, *args, **kwargs):
+        parent = self.parent_folder
+        if parent is not None and self.path and parent.path.startswith(self.path):
+            raise ValueError('Não é possível mover uma pasta para dentro dela mesma.')
+        with transaction.atomic():
+            super().save(*args, **kwargs)
+            self._update_path()
+
+    def _update_path(self):
+        old_path = self.path
+        parent = self.parent_folder
+        new_path = f"{parent.path if parent else '/'}{self.pk}/"
+        if new_path == old_path:
+            return
+        new_depth = new_path.count('/') - 2
+        DocumentFolder.objects.filter(pk=self.pk).update(path=new_path, depth=new_depth)
+        if old_path:
+            self.rebase_descendants(old_path, new_path, new_depth - self.depth)
+        self.path = new_path
+        self.depth = new_depth
+
+    @classmethod
+    def rebase_descendants(cls, old_prefix, new_prefix, depth_delta):
+        return cls.objects.filter(path__startswith=old_prefix).exclude(path=old_prefix).update(
+            path=Concat(Value(new_prefix), Substr('path', len(old_prefix) + 1)),
+            depth=F('depth') + depth_delta,
+        )
+
+    def get_ancestor_ids(self):
+        return [int(part) for part in self.path.strip('/').split('/')[:-1] if part]
+
+    def get_ancestors(self, include_self=False):
+        ids = self.get_ancestor_ids()
+        if include_self:
+            ids.append(self.pk)
+        return DocumentFolder.objects.filter(id__in=ids).order_by('depth')
+
+    def get_descendants(self, include_self=False):
+        descendants = DocumentFolder.objects.filter(path__startswith=self.path)
+        if not include_self:
+            descendants = descendants.exclude(pk=self.pk)
+        return descendants
+
+    def get_full_path(self):
+        names = self.get_ancestors(include_self=True).values_list('folder_name', flat=True)
+        return '/'.join(str(name) for name in names)
+
+class FolderDeletion(models.Model):
+    # Progresso da exclusão de uma árvore de pastas, visível para todos os processos (files/folders.py)
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('running', 'Excluindo'),
+        ('completed', 'Concluído'),
+        ('failed', 'Falha'),
+    ]
+
+    # Sem ForeignKey: a pasta deixa de existir no fim da exclusão
+    folder_id = models.BigIntegerField(primary_key=True)
+    user = models.ForeignKey(settings.AUTH_USER_MODEL, on_delete=models.CASCADE, related_name='folder_deletions')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    deleted = models.PositiveIntegerField(default=0)
+    total = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Exclusão de Pasta'
+        verbose_name_plural = 'Exclusões de Pastas'
+
+    def __str__(self):
+        return f"{self.folder_id} ({self.status})"
+
+class StoredBlob(models.Model):
+    # Conteúdo armazenado uma única vez, endereçado pelo SHA-256; ref_count conta os FileCreated que o usam
+    sha256 = models.CharField(max_length=64, unique=True)
+    storage_key = models.CharField(max_length=500)
+    size = models.BigIntegerField()
+    content_type = models.CharField(max_length=255, blank=True, default='')
+    ref_count = models.PositiveIntegerField(default=0)
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Blob'
+        verbose_name_plural = 'Blobs'
+        indexes = [
+            models.Index(fields=['ref_count', 'updated_at'], name='files_blob_orphan_idx'),
+        ]
+
+    def __str__(self):
+        return self.sha256
+
+class BlobText(models.Model):
+    # Estado da extração de texto de um blob enviado pelo usuário (files/extraction.py)
+    STATUS_CHOICES = [
+        ('pending', 'Pendente'),
+        ('completed', 'Concluído'),
+        ('failed', 'Falha'),
+        ('unsupported', 'Não suportado'),
+    ]
+
+    blob = models.OneToOneField(StoredBlob, on_delete=models.CASCADE, primary_key=True, related_name='text')
+    status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='pending')
+    page_count = models.PositiveIntegerField(default=0)
+    char_count = models.PositiveIntegerField(default=0)
+    truncated = models.BooleanField(default=False)
+    error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    updated_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Texto Extraído'
+        verbose_name_plural = 'Textos Extraídos'
+
+    def __str__(self):
+        return f"{self.blob_id} ({self.status})"
+
+class BlobTextPage(models.Model):
+    # Texto de uma página (PDF) ou de um trecho de até TEXT_EXTRACTION_PAGE_CHARS caracteres (txt, docx)
+    blob = models.ForeignKey(StoredBlob, on_delete=models.CASCADE, related_name='text_pages')
+    number = models.PositiveIntegerField()
+    content = models.TextField()
+
+    class Meta:
+        ordering = ['blob', 'number']
+        verbose_name = 'Página de Texto'
+        verbose_name_plural = 'Páginas de Texto'
+        unique_together = ('blob', 'number')
+        indexes = [
+            # Busca no conteúdo dos arquivos enviados (files/search.py), só existe no Postgres
+            GinIndex(get_page_search_vector(), name='files_text_page_search_idx'),
+        ]
+
+    def __str__(self):
+        return f"{self.blob_id}:{self.number}"
+
+class RenderCacheEntry(models.Model):
+    # PDF já gerado para (template, versão, dados, branding); a chave é o SHA-256 dessa combinação
+    key = models.CharField(max_length=64, unique=True)
+    blob = models.ForeignKey(StoredBlob, on_delete=models.CASCADE, related_name='render_cache_entries')
+    created_at = models.DateTimeField(auto_now_add=True)
+    last_used_at = models.DateTimeField(auto_now=True)
+
+    class Meta:
+        verbose_name = 'Cache de Renderização'
+        verbose_name_plural = 'Cache de Renderizações'
+        indexes = [
+            models.Index(fields=['last_used_at'], name='files_render_cache_lru_idx'),
+        ]
+
+    def __str__(self):
+        return self.key
+
 class FileCreated(models.Model):
     FILE_TYPE_CHOICES = [
         ('pdf', 'PDF'),
@@ -29,6 +197,7 @@ class FileCreated(models.Model):
     
     STATUS_CHOICES = [
         ('pending', 'Pendente'),
+        ('running', 'Processando'),
         ('completed', 'Concluído'),
         ('failed', 'Falha'),
     ]
@@ -46,11 +215,26 @@ class FileCreated(models.Model):
     status = models.CharField(max_length=20, choices=STATUS_CHOICES, default='completed')
     data_used = models.JSONField(default=dict, blank=True)
     template = models.ForeignKey('PDFTemplate', on_delete=models.SET_NULL, null=True, blank=True, related_name='files')
+    blob = models.ForeignKey(StoredBlob, on_delete=models.SET_NULL, null=True, blank=True, related_name='files')
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Arquivo'
         verbose_name_plural = 'Arquivos'
+        indexes = [
+            # Listagem de PDFs gerados paginada por (created_at, id)
+            models.Index(fields=['user', 'is_generated', 'created_at', 'id'], name='files_file_generated_idx'),
+            # Todos os arquivos do usuário por data (API) e arquivos por pasta (árvore, branding, exclusão)
+            models.Index(fields=['user', 'created_at', 'id'], name='files_file_created_idx'),
+            models.Index(fields=['user', 'folder'], name='files_file_folder_idx'),
+            models.Index(fields=['folder', 'file_name'], name='files_file_folder_name_idx'),
+            # Jobs de renderização pendentes ou parados (process_render_jobs): só as poucas linhas ainda sem resultado
+            models.Index(
+                fields=['updated_at'], name='files_file_pending_idx', condition=Q(status__in=['pending', 'running']),
+            ),
+            # Busca textual (files/search.py): mesma expressão usada nas consultas, só existe no Postgres
+            GinIndex(get_search_vector(), name='files_file_search_idx'),
+        ]
 
     def __str__(self):
         return self.file_name
@@ -75,11 +259,29 @@ class PDFTemplate(models.Model):
     header_image_url = models.URLField(blank=True, null=True)
     footer_image_url = models.URLField(blank=True, null=True)
     watermark_url = models.URLField(blank=True, null=True)
+    field_schema = models.JSONField(default=dict, blank=True, editable=False)
 
     class Meta:
         ordering = ['-created_at']
         verbose_name = 'Template PDF'
         verbose_name_plural = 'Templates PDF'
+        indexes = [
+            # Templates ativos do usuário (gerador de PDF) e listagem da API por data
+            models.Index(fields=['user', 'created_at'], name='files_template_active_idx', condition=Q(is_active=True)),
+            models.Index(fields=['user', 'created_at', 'id'], name='files_template_created_idx'),
+        ]
 
     def __str__(self):
-        return self.template_name
\ No newline at end of file
+        return self.template_name
+
+    def save(self, *args, **kwargs):
+        self.field_schema = build_field_schema(self.html_content)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'html_content' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'field_schema'}
+        super().save(*args, **kwargs)
+
+    def get_field_schema(self):
+        if not self.field_schema:
+            self.field_schema = build_field_schema(self.html_content)
+        return self.field_schema
@@ -0,0 +1,74 @@
+from datetime import datetime
+from django.conf import settings
+from django.db.models import Q
+from rest_framework.pagination import CursorPagination
+
+import base64
+
+
+class CreatedCursorPagination(CursorPagination):
+    # Cursor em vez de offset: páginas profundas custam o mesmo que a primeira
+    ordering = ('-created_at', '-id')
+    page_size_query_param = 'page_size'
+    max_page_size = settings.API_MAX_PAGE_SIZE
+
+
+class KeysetPage:
+    def __init__(self, items, next_cursor=None, previous_cursor=None):
+        self.object_list = items
+        self.next_cursor = next_cursor
+        self.previous_cursor = previous_cursor
+
+    def __iter__(self):
+        return iter(self.object_list)
+
+    def __len__(self):
+        return len(self.object_list)
+
+    def has_next(self):
+        return self.next_cursor is not None
+
+    def has_previous(self):
+        return self.previous_cursor is not None
+
+
+def encode_cursor(obj):
+    value = f"{obj.created_at.isoformat()}|{obj.pk}"
+    return base64.urlsafe_b64encode(value.encode()).decode().rstrip('=')
+
+
+def decode_cursor(cursor):
+    try:
+        value = base64.urlsafe_b64decode(cursor + '=' * (-len(cursor) % 4)).decode()
+        created_at, pk = value.split('|')
+        return datetime.fromisoformat(created_at), int(pk)
+    except (ValueError, UnicodeDecodeError):
+        return None
+
+
+def keyset_paginate(queryset, page_size, after=None, before=None):
+    # Paginação por (created_at, id) decrescente: cada página é um range scan no índice, sem COUNT nem OFFSET
+    position = decode_cursor(after or before or '')
+    if position is None:
+        items = list(queryset.order_by('-created_at', '-id')[:page_size + 1])
+        return KeysetPage(items[:page_size], encode_cursor(items[page_size - 1]) if len(items) > page_size else None)
+
+    created_at, pk = position
+    if after:
+        items = list(queryset.filter(
+            Q(created_at__lt=created_at) | Q(created_at=created_at, id__lt=pk)
+        ).order_by('-created_at', '-id')[:page_size + 1])
+        has_next = len(items) > page_size
+        items = items[:page_size]
+        if not items:
+            return KeysetPage(items)
+        return KeysetPage(items, encode_cursor(items[-1]) if has_next else None, encode_cursor(items[0]))
+
+    items = list(queryset.filter(
+        Q(created_at__gt=created_at) | Q(created_at=created_at, id__gt=pk)
+    ).order_by('created_at', 'id')[:page_size + 1])
+    has_previous = len(items) > page_size
+    items = items[:page_size][::-1]
+    if not items:
+        return KeysetPage(items)
+    return KeysetPage(items, encode_cursor(items[-1]), encode_cursor(items[0]) if has_previous else None)
@@ -0,0 +1,49 @@
+import re
+
+IGNORE_VARS = {'item', 'line', 'row'}
+BRANDING_FIELDS = ['header_image_url', 'footer_image_url', 'watermark_url']
+
+FIELD_PATTERN = re.compile(
+    r'{{\s*([^\s}]+)\s*}}|\{%\s*for\s+\w+\s+in\s+([^\s%}]+)\s*%\}',
+    re.UNICODE
+)
+LIST_PATTERN = re.compile(r'\{%\s*for\s+\w+\s+in\s+([^\s%}]+)\s*%\}', re.UNICODE)
+
+
+def extract_html_fields(html_content):
+    fields = re.findall(r'{{\s*([^\s}]+)\s*}}', html_content)
+    unique_fields = []
+    for field in fields:
+        if field not in unique_fields and field not in IGNORE_VARS:
+            unique_fields.append(field)
+    return unique_fields
+
+def extract_html_all_fields(html_content):
+    found = []
+    for match in FIELD_PATTERN.finditer(html_content):
+        field_var = match.group(1)
+        field_list = match.group(2)
+        if field_var and field_var not in found and field_var not in IGNORE_VARS:
+            found.append(field_var)
+        if field_list and field_list not in found and field_list not in IGNORE_VARS:
+            found.append(field_list)
+    return found
+
+def extract_html_lists_fields(html_content):
+    return LIST_PATTERN.findall(html_content)
+
+def build_field_schema(html_content):
+    list_fields = set(extract_html_lists_fields(html_content))
+    fields = []
+    for field in extract_html_all_fields(html_content):
+        if field in BRANDING_FIELDS:
+            continue
+        fields.append({
+            'name': field,
+            'label': field.replace('_', ' ').capitalize(),
+            'is_list': field in list_fields,
+        })
+    return {'fields': fields}
+
+def list_field_names(schema):
+    return [field['name'] for field in schema['fields'] if field['is_list']]
@@ -0,0 +1,106 @@
+from datetime import timedelta
+from django.conf import settings
+from django.core.serializers.json import DjangoJSONEncoder
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+
+from .assets import get_branding_fingerprint
+from .models import RenderCacheEntry, StoredBlob
+
+import hashlib
+import json
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def render_cache_enabled():
+    return settings.PDF_RENDER_CACHE_SIZE > 0
+
+
+def get_render_key(template_obj, data, user_id):
+    # Dados normalizados (chaves ordenadas) para que o mesmo formulário sempre gere a mesma chave.
+    # None (sem cache) quando a versão do branding não pôde ser determinada
+    branding = get_branding_fingerprint(user_id)
+    if branding is None:
+        return None
+    payload = json.dumps({
+        'template': template_obj.pk,
+        'updated_at': template_obj.updated_at.isoformat(),
+        'user': user_id,
+        'data': data,
+        'branding': branding,
+    }, sort_keys=True, separators=(',', ':'), ensure_ascii=False, cls=DjangoJSONEncoder)
+    return hashlib.sha256(payload.encode()).hexdigest()
+
+
+def _expires_before():
+    return timezone.now() - timedelta(seconds=settings.PDF_RENDER_CACHE_TTL)
+
+
+def get_cached_render(key):
+    # Devolve o blob do PDF já gerado com uma referência a mais para o novo arquivo, ou None
+    if not render_cache_enabled():
+        return None
+    entry = RenderCacheEntry.objects.filter(key=key, created_at__gt=_expires_before()).values_list('id', 'blob_id').first()
+    if entry is None:
+        return None
+    entry_id, blob_id = entry
+    now = timezone.now()
+    with transaction.atomic():
+        # Se o GC já removeu o blob, o update não encontra a linha e a entrada é tratada como ausente
+        if not StoredBlob.objects.filter(id=blob_id).update(ref_count=F('ref_count') + 1, updated_at=now):
+            return None
+        RenderCacheEntry.objects.filter(id=entry_id).update(last_used_at=now)
+    logger.info(f"Render cache hit: {key}")
+    return StoredBlob.objects.get(id=blob_id)
+
+
+def remember_render(key, blob):
+    if not render_cache_enabled():
+        return None
+    try:
+        with transaction.atomic():
+            RenderCacheEntry.objects.filter(key=key).delete()
+            entry = RenderCacheEntry.objects.create(key=key, blob=blob)
+    except IntegrityError:
+        # Outro worker gravou a mesma renderização ao mesmo tempo
+        return None
+    evict_render_cache()
+    return entry
+
+
+def evict_render_cache():
+    # Remove entradas expiradas e as menos usadas recentemente além de PDF_RENDER_CACHE_SIZE
+    expired, _ = RenderCacheEntry.objects.filter(created_at__lte=_expires_before()).delete()
+    stale_ids = list(
+        RenderCacheEntry.objects.order_by('-last_used_at').values_list('id', flat=True)[settings.PDF_RENDER_CACHE_SIZE:]
+    )
+    if stale_ids:
+        RenderCacheEntry.objects.filter(id__in=stale_ids).delete()
+    return expired + len(stale_ids)
+
+
+def apply_cached_render(file_obj, key):
+    blob = get_cached_render(key)
+    if blob is None:
+        return False
+    file_obj.blob = blob
+    file_obj.file_path = blob.storage_key
+    file_obj.file_size = blob.size
+    file_obj.status = 'completed'
+    return True
+
+
+def find_cached_render(template_obj, data, user_id):
+    if not render_cache_enabled():
+        return None
+    key = get_render_key(template_obj, data, user_id)
+    return None if key is None else get_cached_render(key)
+
+
+def get_file_render_key(file_obj):
+    if not render_cache_enabled() or file_obj.template is None:
+        return None
+    return get_render_key(file_obj.template, file_obj.data_used, file_obj.user_id)
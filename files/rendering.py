@@ -0,0 +1,186 @@
+from django.conf import settings
+from django.template import Template, Context
+from django.utils import timezone
+
+from .cache import LRUCache
+from .assets import BrandingUnavailable, get_branding_fetcher, get_branding_urls
+
+import hashlib
+import logging
+import os
+import threading
+
+logger = logging.getLogger(__name__)
+
+# Folha de estilo comum a todos os templates: interpretada uma vez por processo pelo PDFRenderer.
+# As imagens usam o usuário "self", resolvido pelo url_fetcher de cada renderização.
+SHARED_CSS = '''
+    @font-face {
+        font-family: 'Barracuda Light';
+        src: url('Barracuda-Light.ttf') format('truetype');
+        font-weight: normal;
+        font-style: normal;
+    }
+
+    @font-face {
+        font-family: 'Gewtymol';
+        src: url('Gewtymol.ttf') format('truetype');
+        font-weight: normal;
+        font-style: normal;
+    }
+
+    @page {
+            size: A4;
+            margin: 110px 70px 70px 70px;
+
+            @top-left {
+                content: url('branding://self/header.png');
+                margin-left: -110px;
+                margin-top: -25px;
+            }
+
+            @bottom-center {
+                content: url('branding://self/footer.png');
+            }
+        }
+    .watermark {
+            position: fixed;
+            top: -400px;
+            left: -227px;
+            width: 25.4cm;
+            height: 39.7cm;
+            opacity: 0.9;
+            z-index: -1;
+            background-image: url('branding://self/watermark.png');
+            background-size: contain;
+            background-repeat: no-repeat;
+            background-position: center;
+            pointer-events: none;
+        }
+    '''
+
+HTML_DESIGN = '<div class="watermark"></div>'
+
+compiled_templates = LRUCache(maxsize=getattr(settings, 'PDF_TEMPLATE_CACHE_SIZE', 128))
+
+
+def get_compiled_template(template_obj):
+    key = (template_obj.pk, template_obj.updated_at)
+    template = compiled_templates.get(key)
+    if template is None:
+        template = Template(HTML_DESIGN + template_obj.html_content)
+        compiled_templates.set(key, template)
+        logger.debug(f"Template compiled: {template_obj.pk} - {compiled_templates.stats()}")
+    return template
+
+
+def invalidate_compiled_template(template_id):
+    return compiled_templates.discard_where(lambda key: key[0] == template_id)
+
+
+class PDFRenderer:
+    # Vive o processo inteiro: fontes registradas e folhas de estilo interpretadas só na primeira vez
+    def __init__(self, base_url=None, stylesheet_cache_size=None):
+        from weasyprint import CSS
+        from weasyprint.text.fonts import FontConfiguration
+
+        self.base_url = base_url or os.path.join(os.getcwd(), 'static')
+        self.font_config = FontConfiguration()
+        self.shared_css = CSS(string=SHARED_CSS, base_url=self.base_url, font_config=self.font_config)
+        cache_size = stylesheet_cache_size or settings.PDF_STYLESHEET_CACHE_SIZE
+        self.stylesheets = LRUCache(maxsize=cache_size)
+        self.template_stylesheets = LRUCache(maxsize=cache_size)
+
+    def get_stylesheet(self, css_text):
+        # Pelo conteúdo: templates diferentes com a mesma folha corporativa compartilham o objeto
+        from weasyprint import CSS
+
+        key = hashlib.sha256(css_text.encode()).hexdigest()
+        stylesheet = self.stylesheets.get(key)
+        if stylesheet is None:
+            stylesheet = CSS(string=css_text, base_url=self.base_url, font_config=self.font_config)
+            self.stylesheets.set(key, stylesheet)
+            logger.debug(f"Stylesheet parsed: {key[:12]} - {self.stylesheets.stats()}")
+        return stylesheet
+
+    def get_template_stylesheet(self, template_obj):
+        # Pela versão do template: o css_content só é lido de novo quando o template muda
+        if not template_obj.css_content:
+            return None
+        key = (template_obj.pk, template_obj.updated_at)
+        stylesheet = self.template_stylesheets.get(key)
+        if stylesheet is None:
+            stylesheet = self.get_stylesheet(template_obj.css_content)
+            self.template_stylesheets.set(key, stylesheet)
+        return stylesheet
+
+    def invalidate_template(self, template_id):
+        return self.template_stylesheets.discard_where(lambda key: key[0] == template_id)
+
+    def render(self, html, user_id, target=None, stylesheets=()):
+        from weasyprint import HTML
+
+        # Branding que existe mas não pôde ser lido: falha em vez de gerar (e guardar no cache) um PDF sem ele
+        errors = []
+        pdf = HTML(
+            string=html,
+            base_url=self.base_url,
+            url_fetcher=get_branding_fetcher(user_id, errors),
+        ).write_pdf(target, stylesheets=[self.shared_css, *stylesheets], font_config=self.font_config)
+        if errors:
+            raise BrandingUnavailable(f"Branding indisponível: {errors[0]}") from errors[0]
+        return pdf
+
+
+_renderer = None
+_renderer_lock = threading.Lock()
+
+
+def get_renderer():
+    # Import tardio do WeasyPrint: os sinais de PDFTemplate carregam este módulo em todo comando manage.py
+    global _renderer
+    if _renderer is None:
+        with _renderer_lock:
+            if _renderer is None:
+                _renderer = PDFRenderer()
+    return _renderer
+
+
+def render_pdf(template_obj, data, user_id, target=None):
+    context = dict(data)
+    context.update(get_branding_urls())
+    # Só o HTML passa pelo motor de templates do Django; o css_content vai direto para o WeasyPrint
+    html_render = get_compiled_template(template_obj).render(Context(context))
+    renderer = get_renderer()
+    stylesheet = renderer.get_template_stylesheet(template_obj)
+    return renderer.render(html_render, user_id, target=target, stylesheets=[stylesheet] if stylesheet else [])
+
+
+def invalidate_template_stylesheet(template_id):
+    # Só libera memória no processo atual; nos workers a chave com updated_at já evita a versão antiga
+    if _renderer is not None:
+        _renderer.invalidate_template(template_id)
+
+
+def get_cache_stats():
+    # Acertos e tamanho dos caches de renderização deste processo (relatório do benchmark_suite)
+    stats = {'compiled_templates': compiled_templates.stats()}
+    if _renderer is not None:
+        stats['stylesheets'] = _renderer.stylesheets.stats()
+        stats['template_stylesheets'] = _renderer.template_stylesheets.stats()
+    return stats
+
+
+def build_pdf_file_name(context, template_obj):
+    name_func = globals().get(f"nome_pdf_{template_obj.template_name.lower()}", nome_pdf_padrao)
+    return name_func(context, template_obj)
+
+
+def nome_pdf_padrao(context, template_obj):
+    # Templates sem regra própria de nome (ex.: criados pela API)
+    return f"{template_obj.template_name}_{timezone.localtime():%Y%m%d-%H%M%S}.pdf"
+
+
+def nome_pdf_proposta(context, template_obj):
+    number = context.get('número_da_proposta', 'novo').replace('/', '-').replace('\\', '-').replace(' ', '_')
+    return f"{template_obj.template_name}_{number}.pdf"
@@ -0,0 +1,96 @@
+from django.contrib.postgres.search import (
+    SearchConfig, SearchQuery, SearchRank, SearchVector, SearchVectorCombinable, SearchVectorField,
+)
+from django.db import connections
+from django.db.migrations.operations import AddIndex
+from django.db.models import Case, F, FloatField, Func, Q, TextField, Value, When
+from django.db.models.functions import Cast
+
+import re
+
+# Configuração fixa: a expressão do índice GIN e a das buscas precisam ser idênticas
+SEARCH_CONFIG = 'portuguese'
+SEARCH_MAX_TERMS = 8
+SEARCH_TERM_RE = re.compile(r'[^\W_]+')
+# Peso de um arquivo encontrado só pelo conteúdo extraído (abaixo de qualquer campo do próprio arquivo)
+CONTENT_RANK = 0.05
+
+
+class JSONStringsVector(SearchVectorCombinable, Func):
+    # Só os valores de texto do JSON entram no vetor: chaves e pontuação ficam de fora
+    function = 'jsonb_to_tsvector'
+    template = "setweight(%(function)s(%(expressions)s, '[\"string\"]'::jsonb), '%(weight)s')"
+    output_field = SearchVectorField()
+
+    def __init__(self, expression, config, weight):
+        super().__init__(SearchConfig.from_parameter(config), expression, weight=weight)
+
+
+def get_search_vector():
+    # Nome do arquivo (A), descrição (B) e valores usados na geração (C); "_", "-" e "." viram espaços
+    # para que "proposta_cliente.pdf" seja indexado como palavras
+    file_name = Func(F('file_name'), Value('_-.'), Value('   '), function='translate', output_field=TextField())
+    return (
+        SearchVector(file_name, config=SEARCH_CONFIG, weight='A')
+        + SearchVector('description', config=SEARCH_CONFIG, weight='B')
+        + JSONStringsVector('data_used', SEARCH_CONFIG, 'C')
+    )
+
+
+def get_page_search_vector():
+    return SearchVector('content', config=SEARCH_CONFIG)
+
+
+def get_search_terms(text):
+    return SEARCH_TERM_RE.findall((text or '').lower())[:SEARCH_MAX_TERMS]
+
+
+def search_files(queryset, text):
+    # Todos os termos precisam aparecer, cada um como prefixo: "prop clie" acha "Proposta Cliente".
+    # Arquivos enviados também são encontrados pelo texto extraído (BlobTextPage), com os termos na mesma página
+    from .models import BlobTextPage
+
+    terms = get_search_terms(text)
+    if not terms:
+        return queryset.none()
+    pages = BlobTextPage.objects.all()
+    if connections[queryset.db].vendor == 'postgresql':
+        query = SearchQuery(' & '.join(f"{term}:*" for term in terms), search_type='raw', config=SEARCH_CONFIG)
+        # Subconsulta sem correlação: o índice GIN das páginas é consultado uma vez e vira um hash de blob_ids
+        matching_pages = pages.alias(document=get_page_search_vector()).filter(document=query)
+        in_content = Q(blob_id__in=matching_pages.values('blob_id'))
+        content_rank = Case(When(in_content, then=Value(CONTENT_RANK)), default=Value(0.0))
+        queryset = queryset.alias(document=get_search_vector()).filter(Q(document=query) | in_content).annotate(
+            rank=SearchRank(get_search_vector(), query) + content_rank,
+        )
+    else:
+        queryset = search_files_fallback(queryset, terms, pages)
+    return queryset.order_by('-rank', '-created_at', '-id')
+
+
+def search_files_fallback(queryset, terms, pages):
+    # SQLite (desenvolvimento e testes): icontains nos mesmos campos, com pesos equivalentes aos do Postgres
+    queryset = queryset.annotate(data_text=Cast('data_used', TextField()))
+    weights = {'file_name': 1.0, 'description': 0.4, 'data_text': 0.2}
+    condition = Q()
+    rank = Value(0.0)
+    for term in terms:
+        lookups = {field: Q(**{f"{field}__icontains": term}) for field in weights}
+        condition &= lookups['file_name'] | lookups['description'] | lookups['data_text']
+        for field, weight in weights.items():
+            rank = rank + Case(When(lookups[field], then=Value(weight)), default=Value(0.0))
+        pages = pages.filter(content__icontains=term)
+    in_content = Q(blob_id__in=pages.values('blob_id'))
+    rank = rank + Case(When(in_content, then=Value(CONTENT_RANK)), default=Value(0.0))
+    return queryset.filter(condition | in_content).annotate(rank=Cast(rank, FloatField()))
+
+
+class AddPostgresIndex(AddIndex):
+    # Índices GIN só existem no Postgres; no SQLite a migração é registrada sem criar nada
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_forwards(app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            super().database_backwards(app_label, schema_editor, from_state, to_state)
@@ -0,0 +1,111 @@
+from rest_framework import serializers
+
+from .batch import is_scalar
+from .models import DocumentFolder, FileCreated, PDFTemplate
+from .placeholders import list_field_names
+
+
+def get_requested_fields(request):
+    # ?fields=id,file_name: resposta e SELECT só com esses campos
+    if request is None:
+        return None
+    value = request.query_params.get('fields')
+    if not value:
+        return None
+    return {name.strip() for name in value.split(',') if name.strip()}
+
+
+class SparseFieldsMixin:
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        requested = get_requested_fields(self.context.get('request'))
+        if requested:
+            for name in set(self.fields) - requested:
+                self.fields.pop(name)
+
+
+class OwnedRelatedField(serializers.PrimaryKeyRelatedField):
+    # Só aceita objetos do usuário autenticado
+    def get_queryset(self):
+        return super().get_queryset().filter(user=self.context['request'].user)
+
+
+class DocumentFolderSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    parent_folder = OwnedRelatedField(queryset=DocumentFolder.objects.all(), allow_null=True, required=False)
+    subfolders = serializers.PrimaryKeyRelatedField(many=True, read_only=True)
+
+    class Meta:
+        model = DocumentFolder
+        fields = [
+            'id', 'folder_name', 'description', 'parent_folder', 'subfolders', 'path', 'depth',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = ['path', 'depth', 'created_at', 'updated_at']
+
+    def validate(self, attrs):
+        folder_name = attrs.get('folder_name', getattr(self.instance, 'folder_name', None))
+        parent_folder = attrs.get('parent_folder', getattr(self.instance, 'parent_folder', None))
+        siblings = DocumentFolder.objects.filter(
+            user=self.context['request'].user, folder_name=folder_name, parent_folder=parent_folder,
+        )
+        if self.instance is not None:
+            siblings = siblings.exclude(pk=self.instance.pk)
+        if siblings.exists():
+            raise serializers.ValidationError({'folder_name': 'Já existe uma pasta com este nome aqui.'})
+        return attrs
+
+
+class PDFTemplateSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    class Meta:
+        model = PDFTemplate
+        fields = [
+            'id', 'template_name', 'template_type', 'description', 'html_content', 'css_content', 'field_schema',
+            'is_active', 'created_at', 'updated_at',
+        ]
+        read_only_fields = ['field_schema', 'created_at', 'updated_at']
+
+
+class FileCreatedSerializer(SparseFieldsMixin, serializers.ModelSerializer):
+    folder_name = serializers.CharField(source='folder.folder_name', read_only=True, default=None)
+    template_name = serializers.CharField(source='template.template_name', read_only=True, default=None)
+    download_url = serializers.HyperlinkedIdentityField(view_name='files:download_file', lookup_url_kwarg='file_id')
+
+    class Meta:
+        model = FileCreated
+        fields = [
+            'id', 'file_name', 'file_type', 'file_size', 'status', 'is_generated', 'description',
+            'folder', 'folder_name', 'template', 'template_name', 'data_used', 'download_url',
+            'created_at', 'updated_at',
+        ]
+        read_only_fields = fields
+
+
+class FileSearchResultSerializer(FileCreatedSerializer):
+    rank = serializers.FloatField(read_only=True)
+
+    class Meta(FileCreatedSerializer.Meta):
+        fields = FileCreatedSerializer.Meta.fields + ['rank']
+        read_only_fields = fields
+
+
+class GenerationSerializer(serializers.Serializer):
+    folder = OwnedRelatedField(queryset=DocumentFolder.objects.all())
+    data = serializers.DictField(child=serializers.JSONField(), allow_empty=True)
+
+    def validate_data(self, value):
+        schema = self.context['template'].get_field_schema()
+        unknown = set(value) - {field['name'] for field in schema['fields']}
+        if unknown:
+            raise serializers.ValidationError(f"Campos inexistentes no template: {', '.join(sorted(unknown))}")
+        list_fields = set(list_field_names(schema))
+        for name, item in value.items():
+            if name in list_fields:
+                # Lista de textos ou um texto com um item por linha
+                valid = isinstance(item, str) or (isinstance(item, list) and all(is_scalar(part) for part in item))
+                message = f"Valor inválido para {name}: use uma lista de textos ou um texto com um item por linha"
+            else:
+                valid = is_scalar(item)
+                message = f"Valor inválido para {name}: use texto"
+            if not valid:
+                raise serializers.ValidationError(message)
+        return value
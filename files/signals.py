@@ -0,0 +1,20 @@
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+
+from .models import DocumentFolder, PDFTemplate
+from .forms import invalidate_template_form_class
+from .rendering import invalidate_compiled_template, invalidate_template_stylesheet
+
+
+@receiver([post_save, post_delete], sender=PDFTemplate)
+def invalidate_template_caches(sender, instance, **kwargs):
+    invalidate_compiled_template(instance.pk)
+    invalidate_template_stylesheet(instance.pk)
+    invalidate_template_form_class(instance.pk)
+
+
+@receiver(post_delete, sender=DocumentFolder)
+def reroot_orphan_subfolders(sender, instance, **kwargs):
+    # parent_folder usa SET_NULL: as subpastas restantes viram raízes e seus caminhos precisam acompanhar
+    if instance.path:
+        DocumentFolder.rebase_descendants(instance.path, '/', -(instance.depth + 1))
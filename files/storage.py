@@ -0,0 +1,420 @@
+from abc import ABC, abstractmethod
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.core import signing
+from django.urls import reverse
+from django.utils.functional import SimpleLazyObject
+from django.utils.http import http_date, parse_http_date_safe
+from django.utils.module_loading import import_string
+import hashlib
+import logging
+import os
+import threading
+import time
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_CHUNK_SIZE = 64 * 1024
+SIGNED_URL_SALT = 'files.storage.local'
+FORWARDED_DOWNLOAD_HEADERS = ['Range', 'If-Range', 'If-None-Match', 'If-Modified-Since']
+PASSTHROUGH_DOWNLOAD_HEADERS = ['Content-Length', 'Content-Range', 'Accept-Ranges', 'ETag', 'Last-Modified']
+
+
+class DownloadStream:
+    def __init__(self, chunks=(), status=200, headers=None, on_close=None):
+        self.chunks = chunks
+        self.status = status
+        self.headers = headers or {}
+        self._on_close = on_close
+
+    def __iter__(self):
+        return iter(self.chunks)
+
+    def close(self):
+        if self._on_close:
+            self._on_close()
+
+
+class AsyncDownloadStream:
+    def __init__(self, chunks=None, status=200, headers=None):
+        self.chunks = chunks
+        self.status = status
+        self.headers = headers or {}
+
+    def __aiter__(self):
+        return self._iterate()
+
+    async def _iterate(self):
+        if self.chunks is not None:
+            async for chunk in self.chunks:
+                yield chunk
+
+    async def aclose(self):
+        if hasattr(self.chunks, 'aclose'):
+            await self.chunks.aclose()
+
+
+async def aiter_stream(stream):
+    # Lê cada bloco de um DownloadStream síncrono numa thread, sem bloquear o event loop
+    iterator = iter(stream)
+    next_chunk = sync_to_async(next, thread_sensitive=False)
+    try:
+        while True:
+            chunk = await next_chunk(iterator, None)
+            if chunk is None:
+                break
+            yield chunk
+    finally:
+        await sync_to_async(stream.close, thread_sensitive=False)()
+
+
+def parse_range(range_header, size):
+    # Suporta um único intervalo: bytes=ini-fim, bytes=ini- ou bytes=-sufixo
+    units, _, ranges = (range_header or '').partition('=')
+    if units.strip() != 'bytes' or ',' in ranges:
+        return None
+    start, _, end = ranges.strip().partition('-')
+    try:
+        if not start:
+            length = int(end)
+            if length <= 0:
+                return False
+            return max(size - length, 0), size - 1
+        start = int(start)
+        end = int(end) if end else size - 1
+    except ValueError:
+        return None
+    if start >= size or end < start:
+        return False
+    return start, min(end, size - 1)
+
+
+def evaluate_download(size, etag, last_modified, request_headers=None):
+    # Retorna (status, intervalo, headers) seguindo as regras de requisições condicionais do HTTP
+    request_headers = request_headers or {}
+    headers = {
+        'ETag': etag,
+        'Last-Modified': http_date(last_modified),
+        'Accept-Ranges': 'bytes',
+    }
+    if_none_match = request_headers.get('If-None-Match')
+    if if_none_match:
+        if if_none_match.strip() == '*' or etag in [tag.strip() for tag in if_none_match.split(',')]:
+            return 304, None, headers
+    else:
+        since = parse_http_date_safe(request_headers.get('If-Modified-Since') or '')
+        if since is not None and int(last_modified) <= since:
+            return 304, None, headers
+
+    range_header = request_headers.get('Range')
+    if_range = request_headers.get('If-Range')
+    if range_header and if_range and if_range not in (etag, headers['Last-Modified']):
+        range_header = None
+    byte_range = parse_range(range_header, size) if range_header else None
+    if byte_range is False:
+        headers['Content-Range'] = f"bytes */{size}"
+        return 416, None, headers
+    if byte_range:
+        start, end = byte_range
+        headers['Content-Range'] = f"bytes {start}-{end}/{size}"
+        headers['Content-Length'] = str(end - start + 1)
+        return 206, byte_range, headers
+    headers['Content-Length'] = str(size)
+    return 200, (0, size - 1), headers
+
+
+class BaseStorageService(ABC):
+    @abstractmethod
+    def upload_file(self, file, file_path, content_type=None, upsert=False):
+        pass
+
+    @abstractmethod
+    def download_file(self, file_path):
+        # FileNotFoundError quando o objeto não existe; qualquer outra exceção é falha do storage
+        pass
+
+    @abstractmethod
+    def download_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        pass
+
+    @abstractmethod
+    def get_etag(self, file_path):
+        # Versão do objeto sem baixá-lo; None quando o objeto não existe
+        pass
+
+    @abstractmethod
+    def get_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        # download: a URL responde como anexo com esse nome. filename: nome para exibição inline,
+        # nos backends que conseguem informá-lo sem forçar o download
+        pass
+
+    def get_signed_urls(self, file_paths, expires_in=3600):
+        return {file_path: self.get_signed_url(file_path, expires_in) for file_path in file_paths}
+
+    @abstractmethod
+    def delete_files(self, file_paths):
+        pass
+
+    def delete_file(self, file_path):
+        return self.delete_files([file_path])
+
+    @abstractmethod
+    def list_files(self, prefix):
+        pass
+
+    # Versões assíncronas: por padrão delegam para threads; os backends remotos podem sobrescrever
+    async def aupload_file(self, file, file_path, content_type=None, upsert=False):
+        return await sync_to_async(self.upload_file, thread_sensitive=False)(file, file_path, content_type, upsert)
+
+    async def adownload_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        stream = await sync_to_async(self.download_stream, thread_sensitive=False)(
+            file_path, chunk_size, request_headers
+        )
+        return AsyncDownloadStream(aiter_stream(stream), status=stream.status, headers=stream.headers)
+
+    async def aget_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        return await sync_to_async(self.get_signed_url, thread_sensitive=False)(
+            file_path, expires_in, download, filename
+        )
+
+    async def aget_signed_urls(self, file_paths, expires_in=3600):
+        return await sync_to_async(self.get_signed_urls, thread_sensitive=False)(file_paths, expires_in)
+
+    async def adelete_files(self, file_paths):
+        return await sync_to_async(self.delete_files, thread_sensitive=False)(file_paths)
+
+    def delete_folder_from_storage(self, prefix):
+        # Monta caminho completo de cada arquivo dentro do bucket e remove todos numa chamada
+        full_paths = [f"{prefix}{arquivo['name']}" for arquivo in self.list_files(prefix)]
+        if not full_paths:
+            return
+        try:
+            self.delete_files(full_paths)
+        except Exception as e:
+            logger.error(f"Erro ao remover do storage: {prefix} – {str(e)}")
+
+
+def read_chunks(file, chunk_size=DEFAULT_CHUNK_SIZE):
+    if hasattr(file, 'chunks'):
+        yield from file.chunks(chunk_size)
+        return
+    file.seek(0)
+    while True:
+        chunk = file.read(chunk_size)
+        if not chunk:
+            break
+        yield chunk
+
+
+def buffered_chunks(chunks, size):
+    # Reagrupa os blocos em pedaços de exatamente `size` bytes (o último pode ser menor)
+    buffer = bytearray()
+    for chunk in chunks:
+        buffer.extend(chunk)
+        while len(buffer) >= size:
+            yield bytes(buffer[:size])
+            del buffer[:size]
+    if buffer:
+        yield bytes(buffer)
+
+
+def get_file_size(file):
+    size = getattr(file, 'size', None)
+    if size is not None:
+        return size
+    file.seek(0, os.SEEK_END)
+    size = file.tell()
+    file.seek(0)
+    return size
+
+
+def iter_file(source, chunk_size=DEFAULT_CHUNK_SIZE, start=0, end=None):
+    with source:
+        source.seek(start)
+        remaining = None if end is None else end - start + 1
+        while remaining is None or remaining > 0:
+            chunk = source.read(chunk_size if remaining is None else min(chunk_size, remaining))
+            if not chunk:
+                break
+            if remaining is not None:
+                remaining -= len(chunk)
+            yield chunk
+
+
+def local_etag(stat):
+    return f'"{stat.st_size:x}-{stat.st_mtime_ns:x}"'
+
+
+def memory_etag(content):
+    return f'"{hashlib.md5(content).hexdigest()}"'
+
+
+def sign_local_path(file_path, expires_in, download=None, filename=None):
+    data = {'path': file_path, 'exp': int(time.time()) + expires_in}
+    if download or filename:
+        data['name'] = download or filename
+        data['attachment'] = bool(download)
+    token = signing.dumps(data, salt=SIGNED_URL_SALT)
+    return reverse('files:local_storage_file', args=[token])
+
+
+def unsign_local_path(token):
+    # Devolve o caminho, o nome assinado junto com ele (None quando não há) e se é um anexo
+    data = signing.loads(token, salt=SIGNED_URL_SALT)
+    if data['exp'] < time.time():
+        raise signing.SignatureExpired('URL expirada')
+    return data['path'], data.get('name'), data.get('attachment', False)
+
+
+class LocalStorageService(BaseStorageService):
+    def __init__(self, root=None):
+        self.root = os.path.abspath(str(root or settings.FILES_STORAGE_ROOT))
+        logger.info(f"Local Storage initialized - Root: {self.root}")
+
+    def path(self, file_path):
+        full_path = os.path.abspath(os.path.join(self.root, file_path))
+        if os.path.commonpath([self.root, full_path]) != self.root:
+            raise Exception(f"Caminho inválido: {file_path}")
+        return full_path
+
+    def upload_file(self, file, file_path, content_type=None, upsert=False):
+        full_path = self.path(file_path)
+        if os.path.exists(full_path) and not upsert:
+            raise Exception(f"Upload failed: The resource already exists: {file_path}")
+        os.makedirs(os.path.dirname(full_path), exist_ok=True)
+        with open(full_path, 'wb') as destination:
+            for chunk in read_chunks(file):
+                destination.write(chunk)
+        logger.info(f"Upload successful: {file_path}")
+        return file_path
+
+    def download_file(self, file_path):
+        try:
+            with open(self.path(file_path), 'rb') as source:
+                return source.read()
+        except FileNotFoundError:
+            raise FileNotFoundError(f"Download failed: Object not found: {file_path}")
+        except OSError as e:
+            raise Exception(f"Download failed: {str(e)}")
+
+    def download_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        try:
+            source = open(self.path(file_path), 'rb')
+            stat = os.fstat(source.fileno())
+        except OSError as e:
+            raise Exception(f"Download failed: {str(e)}")
+        etag = local_etag(stat)
+        status, byte_range, headers = evaluate_download(stat.st_size, etag, stat.st_mtime, request_headers)
+        if byte_range is None:
+            source.close()
+            return DownloadStream(status=status, headers=headers)
+        return DownloadStream(
+            iter_file(source, chunk_size, *byte_range), status=status, headers=headers, on_close=source.close
+        )
+
+    def get_etag(self, file_path):
+        try:
+            return local_etag(os.stat(self.path(file_path)))
+        except FileNotFoundError:
+            return None
+
+    def get_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        return sign_local_path(file_path, expires_in, download, filename)
+
+    def delete_files(self, file_paths):
+        for file_path in file_paths:
+            logger.debug(f"Deleting from storage: {file_path}")
+            try:
+                os.remove(self.path(file_path))
+            except FileNotFoundError:
+                pass
+        return True
+
+    def list_files(self, prefix):
+        try:
+            entries = os.scandir(self.path(prefix))
+        except OSError:
+            return []
+        with entries:
+            return [{'name': entry.name} for entry in entries]
+
+
+class MemoryStorageService(BaseStorageService):
+    def __init__(self):
+        self.objects = {}
+        self.modified = {}
+        self._lock = threading.Lock()
+
+    def upload_file(self, file, file_path, content_type=None, upsert=False):
+        content = b''.join(read_chunks(file))
+        with self._lock:
+            if file_path in self.objects and not upsert:
+                raise Exception(f"Upload failed: The resource already exists: {file_path}")
+            self.objects[file_path] = content
+            self.modified[file_path] = time.time()
+        return file_path
+
+    def download_file(self, file_path):
+        try:
+            return self.objects[file_path]
+        except KeyError:
+            raise FileNotFoundError(f"Download failed: Object not found: {file_path}")
+
+    def download_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        content = self.download_file(file_path)
+        etag = memory_etag(content)
+        status, byte_range, headers = evaluate_download(
+            len(content), etag, self.modified[file_path], request_headers
+        )
+        if byte_range is None:
+            return DownloadStream(status=status, headers=headers)
+        start, end = byte_range
+        return DownloadStream(
+            (content[offset:min(offset + chunk_size, end + 1)] for offset in range(start, end + 1, chunk_size)),
+            status=status,
+            headers=headers,
+        )
+
+    def get_etag(self, file_path):
+        content = self.objects.get(file_path)
+        return None if content is None else memory_etag(content)
+
+    def get_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        return sign_local_path(file_path, expires_in, download, filename)
+
+    def delete_files(self, file_paths):
+        with self._lock:
+            for file_path in file_paths:
+                self.objects.pop(file_path, None)
+                self.modified.pop(file_path, None)
+        return True
+
+    def list_files(self, prefix):
+        names = set()
+        for file_path in list(self.objects):
+            if file_path.startswith(prefix):
+                names.add(file_path[len(prefix):].split('/')[0])
+        return [{'name': name} for name in sorted(names)]
+
+
+def get_storage_service(backend=None):
+    started = time.perf_counter()
+    service = import_string(backend or settings.FILES_STORAGE_BACKEND)()
+    logger.info(f"Storage backend ready: {type(service).__name__} in {(time.perf_counter() - started) * 1000:.1f}ms")
+    return service
+
+
+_default_storage = None
+_default_storage_lock = threading.Lock()
+
+
+def get_default_storage():
+    global _default_storage
+    if _default_storage is None:
+        with _default_storage_lock:
+            if _default_storage is None:
+                _default_storage = get_storage_service()
+    return _default_storage
+
+
+storage = SimpleLazyObject(get_default_storage)
@@ -1,33 +1,112 @@
-from supabase import create_client, Client
 from django.conf import settings
+from django.core.cache import caches
+from django.core.exceptions import ImproperlyConfigured
+from .cache import LRUCache
+from .http import (
+    StorageHttpClient, acall_with_retry, call_with_retry, create_async_httpx_client, create_httpx_client,
+    get_httpx_timeout, RETRY_STATUSES,
+)
+from .storage import (
+    AsyncDownloadStream, BaseStorageService, DownloadStream, DEFAULT_CHUNK_SIZE, FORWARDED_DOWNLOAD_HEADERS,
+    PASSTHROUGH_DOWNLOAD_HEADERS, buffered_chunks, get_file_size, read_chunks,
+)
+from asgiref.sync import sync_to_async
+from urllib.parse import quote
+import asyncio
+import httpx
+import requests
+import weakref
+import base64
+import hashlib
 import logging
 import mimetypes
+import threading
+import time
 
 logger = logging.getLogger(__name__)
 
-class SupabaseStorageService:
+
+def with_download_name(url, download):
+    # O Supabase responde com Content-Disposition: attachment; filename=<download> quando o parâmetro vem na URL.
+    # Não há como informar o nome sem forçar o download: filename (exibição inline) é ignorado neste backend.
+    # O cache guarda a URL sem o parâmetro: o mesmo objeto pode ser baixado com nomes diferentes
+    if not download:
+        return url
+    return f"{url}{'&' if '?' in url else '?'}download={quote(download, safe='')}"
+
+
+def is_not_found_error(exc):
+    # O Storage responde 404, ou 400 com código not_found/NoSuchKey, para objetos inexistentes
+    status = getattr(exc, 'status', None)
+    code = getattr(exc, 'code', None)
+    return str(status) == '404' or code in ('not_found', 'NoSuchKey')
+
+
+class SupabaseStorageService(BaseStorageService):
     def __init__(self):
-        self.supabase: Client = create_client(
-            settings.SUPABASE_URL,
-            settings.SUPABASE_KEY
-        )
+        self._client = None
+        self._client_lock = threading.Lock()
         self.bucket_name = settings.SUPABASE_BUCKET
+        self.signed_urls = LRUCache(maxsize=settings.SUPABASE_SIGNED_URL_CACHE_SIZE)
+        # Pool HTTP compartilhado (SDK e chamadas diretas) com o mesmo circuit breaker
+        self.http = StorageHttpClient('supabase')
+        self.breaker = self.http.breaker
+        self._async_clients = weakref.WeakKeyDictionary()
         logger.info(f"Supabase Storage initialized - Bucket: {self.bucket_name}")
 
-    def upload_file(self, file, file_path):
+    @property
+    def supabase(self):
+        # O SDK só é importado e o cliente só é criado no primeiro uso, fora da inicialização do worker
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = self._create_client()
+        return self._client
+
+    def _create_client(self):
+        if not settings.SUPABASE_URL or not settings.SUPABASE_KEY:
+            raise ImproperlyConfigured("Supabase não configurado: defina SUPABASE_URL e SUPABASE_KEY")
+        started = time.perf_counter()
+        from supabase import ClientOptions, create_client
+        imported = time.perf_counter()
+        client = create_client(
+            settings.SUPABASE_URL,
+            settings.SUPABASE_KEY,
+            options=ClientOptions(httpx_client=create_httpx_client()),
+        )
+        finished = time.perf_counter()
+        logger.info(
+            f"Supabase client created - SDK import: {(imported - started) * 1000:.1f}ms, "
+            f"client setup: {(finished - imported) * 1000:.1f}ms"
+        )
+        return client
+
+    def _auth_headers(self):
+        return {
+            'Authorization': f"Bearer {settings.SUPABASE_KEY}",
+            'apikey': settings.SUPABASE_KEY,
+        }
+
+    def upload_file(self, file, file_path, content_type=None, upsert=False):
         try:
-            file.seek(0)
-            file_content = file.read()
-            content_type, _ = mimetypes.guess_type(file.name)
+            if not content_type:
+                content_type, _ = mimetypes.guess_type(getattr(file, 'name', None) or file_path)
             if not content_type:
                 content_type = "application/octet-stream"
+            file_size = get_file_size(file)
+            if file_size > settings.FILES_UPLOAD_CHUNK_SIZE:
+                return self._upload_resumable(file, file_path, file_size, content_type, upsert)
+            file.seek(0)
+            file_content = file.read()
             options = {
                 "content-type": content_type
             }
-            response = self.supabase.storage.from_(self.bucket_name).upload(
-                file_path,
-                file_content,
-                options
+            if upsert:
+                options["upsert"] = "true"
+            # Sem upsert o upload não é idempotente: sem novas tentativas, só o circuit breaker
+            response = call_with_retry(
+                self.breaker, 'upload', self.supabase.storage.from_(self.bucket_name).upload,
+                file_path, file_content, options, idempotent=upsert,
             )
             logger.info(f"Upload successful: {response}")
             return response.path
@@ -35,20 +114,190 @@ class SupabaseStorageService:
             logger.error(f"Upload failed: {str(e)}", exc_info=True)
             raise Exception(f"Upload failed: {str(e)}")
 
-    def get_signed_url(self, file_path, expires_in=3600):
+    def _upload_resumable(self, file, file_path, file_size, content_type, upsert=False):
+        # Protocolo TUS: cria o upload e envia blocos de FILES_UPLOAD_CHUNK_SIZE (o Supabase exige 6MB)
+        headers = {**self._auth_headers(), 'Tus-Resumable': '1.0.0'}
+        if upsert:
+            headers['x-upsert'] = 'true'
+        metadata = {
+            'bucketName': self.bucket_name,
+            'objectName': file_path,
+            'contentType': content_type,
+        }
+        response = self.http.post(
+            f"{settings.SUPABASE_URL}/storage/v1/upload/resumable",
+            headers={
+                **headers,
+                'Upload-Length': str(file_size),
+                'Upload-Metadata': ','.join(
+                    f"{key} {base64.b64encode(value.encode()).decode()}" for key, value in metadata.items()
+                ),
+            },
+        )
+        if response.status_code != 201:
+            raise Exception(f"Resumable upload not created: {response.status_code} {response.text}")
+        upload_url = response.headers['Location']
+
+        offset = 0
+        for chunk in buffered_chunks(read_chunks(file), settings.FILES_UPLOAD_CHUNK_SIZE):
+            offset = self._send_chunk(upload_url, headers, chunk, offset)
+        if offset != file_size:
+            raise Exception(f"Resumable upload incomplete: {offset}/{file_size} bytes")
+        logger.info(f"Resumable upload successful: {file_path} ({file_size} bytes)")
+        return file_path
+
+    def _send_chunk(self, upload_url, headers, chunk, offset, attempts=3):
+        for attempt in range(1, attempts + 1):
+            try:
+                response = self.http.patch(
+                    upload_url,
+                    data=chunk,
+                    headers={
+                        **headers,
+                        'Upload-Offset': str(offset),
+                        'Content-Type': 'application/offset+octet-stream',
+                    },
+                )
+                if response.status_code == 204:
+                    return int(response.headers['Upload-Offset'])
+                error = f"{response.status_code} {response.text}"
+            except requests.RequestException as e:
+                error = str(e)
+            logger.warning(f"Chunk upload failed at offset {offset} (attempt {attempt}): {error}")
+            # Confere no servidor se o bloco chegou antes de reenviar
+            head = self.http.head(upload_url, headers=headers)
+            server_offset = int(head.headers.get('Upload-Offset', offset))
+            if server_offset == offset + len(chunk):
+                return server_offset
+        raise Exception(f"Chunk upload failed at offset {offset}: {error}")
+
+    def _signed_url_cache_key(self, file_path):
+        digest = hashlib.sha1(f"{self.bucket_name}:{file_path}".encode()).hexdigest()
+        return f"signed-url:{digest}"
+
+    def _get_cached_signed_url(self, file_path, expires_in):
+        # Só serve uma URL em cache se ela ainda vale quase todo o prazo pedido (expires_in - margem)
+        min_remaining = expires_in - settings.SUPABASE_SIGNED_URL_MARGIN
+        entry = self.signed_urls.get((self.bucket_name, file_path))
+        if (entry is None or entry[1] - time.time() < min_remaining) and settings.SUPABASE_SIGNED_URL_CACHE:
+            shared = caches[settings.SUPABASE_SIGNED_URL_CACHE].get(self._signed_url_cache_key(file_path))
+            if shared is not None and (entry is None or shared[1] > entry[1]):
+                entry = shared
+                self.signed_urls.set((self.bucket_name, file_path), entry)
+        if entry is None:
+            return None
+        url, expires_at = entry
+        if expires_at - time.time() < min_remaining:
+            return None
+        return url
+
+    def _cache_signed_url(self, file_path, url, expires_in):
+        entry = (url, time.time() + expires_in)
+        self.signed_urls.set((self.bucket_name, file_path), entry)
+        if settings.SUPABASE_SIGNED_URL_CACHE:
+            timeout = max(expires_in - settings.SUPABASE_SIGNED_URL_MARGIN, 1)
+            caches[settings.SUPABASE_SIGNED_URL_CACHE].set(self._signed_url_cache_key(file_path), entry, timeout)
+
+    def _forget_signed_url(self, file_path):
+        self.signed_urls.pop((self.bucket_name, file_path))
+        if settings.SUPABASE_SIGNED_URL_CACHE:
+            caches[settings.SUPABASE_SIGNED_URL_CACHE].delete(self._signed_url_cache_key(file_path))
+
+    def get_etag(self, file_path):
+        # HEAD no objeto: só os cabeçalhos, sem transferir o conteúdo
+        response = self.http.head(self._object_url(self.bucket_name, file_path), headers=self._auth_headers())
+        if response.status_code in (400, 404):
+            return None
+        if response.status_code != 200:
+            logger.error(f"Failed to read file metadata: Status {response.status_code}")
+            raise Exception(f"Metadata failed: Status {response.status_code}")
+        return response.headers.get('ETag')
+
+    def get_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        cached = self._get_cached_signed_url(file_path, expires_in)
+        if cached:
+            return with_download_name(cached, download)
         try:
-            response = self.supabase.storage.from_(self.bucket_name).create_signed_url(file_path, expires_in)
+            response = call_with_retry(
+                self.breaker, 'signed_url', self.supabase.storage.from_(self.bucket_name).create_signed_url,
+                file_path, expires_in,
+            )
             if isinstance(response, dict) and 'signedUrl' in response:
-                return response['signedUrl']
-            return response
+                url = response['signedUrl']
+            else:
+                url = response
         except Exception as e:
             logger.error(f"Signed URL error: {str(e)}", exc_info=True)
             raise Exception(f"Signed URL error: {str(e)}")
+        self._cache_signed_url(file_path, url, expires_in)
+        return with_download_name(url, download)
+
+    def get_signed_urls(self, file_paths, expires_in=3600):
+        urls = {}
+        missing = []
+        for file_path in file_paths:
+            cached = self._get_cached_signed_url(file_path, expires_in)
+            if cached:
+                urls[file_path] = cached
+            elif file_path not in missing:
+                missing.append(file_path)
+        if not missing:
+            return urls
+        try:
+            response = call_with_retry(
+                self.breaker, 'signed_url', self.supabase.storage.from_(self.bucket_name).create_signed_urls,
+                missing, expires_in,
+            )
+        except Exception as e:
+            logger.error(f"Signed URLs error: {str(e)}", exc_info=True)
+            raise Exception(f"Signed URLs error: {str(e)}")
+        for item in response:
+            if item.get('error'):
+                logger.error(f"Signed URL error: {item['path']} - {item['error']}")
+                raise Exception(f"Signed URL error: {item['path']} - {item['error']}")
+            urls[item['path']] = item['signedUrl']
+            self._cache_signed_url(item['path'], item['signedUrl'], expires_in)
+        return urls
 
-    def delete_file(self, file_path):
+    def download_file(self, file_path):
         try:
-            logger.debug(f"Deleting from storage: {file_path}")
-            self.supabase.storage.from_(self.bucket_name).remove([file_path])
+            return call_with_retry(
+                self.breaker, 'download', self.supabase.storage.from_(self.bucket_name).download, file_path
+            )
+        except Exception as e:
+            if is_not_found_error(e):
+                raise FileNotFoundError(f"Download failed: Object not found: {file_path}") from e
+            logger.error(f"Download failed: {str(e)}", exc_info=True)
+            raise Exception(f"Download failed: {str(e)}")
+
+    def download_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        signed_url = self.get_signed_url(file_path, expires_in=300)
+        headers = {
+            name: value for name, value in (request_headers or {}).items()
+            if name in FORWARDED_DOWNLOAD_HEADERS and value
+        }
+        # Bytes exatamente como armazenados: Content-Length e Content-Range continuam válidos
+        headers['Accept-Encoding'] = 'identity'
+        response = self.http.get(signed_url, headers=headers, stream=True)
+        if response.status_code not in (200, 206, 304, 416):
+            response.close()
+            logger.error(f"Failed to download file: Status {response.status_code}")
+            raise Exception(f"Download failed: Status {response.status_code}")
+        return DownloadStream(
+            response.raw.stream(chunk_size, decode_content=False),
+            status=response.status_code,
+            headers={name: response.headers[name] for name in PASSTHROUGH_DOWNLOAD_HEADERS if name in response.headers},
+            on_close=response.close,
+        )
+
+    def delete_files(self, file_paths):
+        try:
+            logger.debug(f"Deleting from storage: {file_paths}")
+            call_with_retry(
+                self.breaker, 'delete', self.supabase.storage.from_(self.bucket_name).remove, list(file_paths)
+            )
+            for file_path in file_paths:
+                self._forget_signed_url(file_path)
             return True
         except Exception as e:
             logger.error(f"Delete failed: {str(e)}", exc_info=True)
@@ -56,21 +305,122 @@ class SupabaseStorageService:
 
     def list_files(self, prefix):
         try:
-            response = self.supabase.storage.from_(self.bucket_name).list(prefix)
+            response = call_with_retry(
+                self.breaker, 'list', self.supabase.storage.from_(self.bucket_name).list, prefix
+            )
             # Retorna lista de arquivos {'name': ..., ...}
             return response
         except Exception as e:
             logger.error(f"List files failed: {str(e)}", exc_info=True)
             return []
 
-    def delete_folder_from_storage(self, prefix):
-        arquivos = self.list_files(prefix)
-        for arquivo in arquivos:
-            # Monta caminho completo do arquivo dentro do bucket
-            full_path = f"{prefix}{arquivo['name']}"
+    # Cliente assíncrono (views ASGI): chamadas diretas à API REST do Storage com httpx.AsyncClient
+    @property
+    def async_http(self):
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = self._async_clients[loop] = create_async_httpx_client()
+        return client
+
+    def _object_url(self, *parts):
+        return '/'.join([f"{settings.SUPABASE_URL}/storage/v1/object", *(quote(part) for part in parts)])
+
+    async def _arequest(self, method, url, operation, **kwargs):
+        response = await self.async_http.request(
+            method, url, headers={**self._auth_headers(), **kwargs.pop('headers', {})},
+            timeout=get_httpx_timeout(operation), **kwargs,
+        )
+        response.raise_for_status()
+        return response
+
+    async def aupload_file(self, file, file_path, content_type=None, upsert=False):
+        if not content_type:
+            content_type, _ = mimetypes.guess_type(getattr(file, 'name', None) or file_path)
+        file_size = get_file_size(file)
+        if file_size > settings.FILES_UPLOAD_CHUNK_SIZE:
+            return await sync_to_async(self.upload_file, thread_sensitive=False)(
+                file, file_path, content_type, upsert
+            )
+        file.seek(0)
+        try:
+            await acall_with_retry(
+                self.breaker, 'upload', self._arequest, 'POST', self._object_url(self.bucket_name, file_path),
+                'upload',
+                files={'file': (file_path.split('/')[-1], file.read(), content_type or 'application/octet-stream')},
+                headers={'x-upsert': 'true' if upsert else 'false', 'cache-control': '3600'},
+                idempotent=upsert,
+            )
+        except Exception as e:
+            logger.error(f"Upload failed: {str(e)}", exc_info=True)
+            raise Exception(f"Upload failed: {str(e)}")
+        logger.info(f"Upload successful: {file_path}")
+        return file_path
+
+    async def aget_signed_url(self, file_path, expires_in=3600, download=None, filename=None):
+        cached = self._get_cached_signed_url(file_path, expires_in)
+        if cached:
+            return with_download_name(cached, download)
+        try:
+            response = await acall_with_retry(
+                self.breaker, 'signed_url', self._arequest, 'POST',
+                self._object_url('sign', self.bucket_name, file_path), 'metadata',
+                json={'expiresIn': expires_in},
+            )
+        except Exception as e:
+            logger.error(f"Signed URL error: {str(e)}", exc_info=True)
+            raise Exception(f"Signed URL error: {str(e)}")
+        url = f"{settings.SUPABASE_URL}/storage/v1/{response.json()['signedURL'].lstrip('/')}"
+        self._cache_signed_url(file_path, url, expires_in)
+        return with_download_name(url, download)
+
+    async def adownload_stream(self, file_path, chunk_size=DEFAULT_CHUNK_SIZE, request_headers=None):
+        signed_url = await self.aget_signed_url(file_path, expires_in=300)
+        headers = {
+            name: value for name, value in (request_headers or {}).items()
+            if name in FORWARDED_DOWNLOAD_HEADERS and value
+        }
+        headers['Accept-Encoding'] = 'identity'
+        request = self.async_http.build_request(
+            'GET', signed_url, headers=headers, timeout=get_httpx_timeout('download')
+        )
+        self.breaker.before_call()
+        try:
+            response = await self.async_http.send(request, stream=True)
+        except httpx.HTTPError:
+            self.breaker.record_failure()
+            raise
+        if response.status_code in RETRY_STATUSES:
+            self.breaker.record_failure()
+        else:
+            self.breaker.record_success()
+        if response.status_code not in (200, 206, 304, 416):
+            await response.aclose()
+            logger.error(f"Failed to download file: Status {response.status_code}")
+            raise Exception(f"Download failed: Status {response.status_code}")
+
+        async def chunks():
             try:
-                self.delete_file(full_path)
-            except Exception as e:
-                logger.error(f"Erro ao remover do storage: {full_path} – {str(e)}")
+                async for chunk in response.aiter_raw(chunk_size):
+                    yield chunk
+            finally:
+                await response.aclose()
+
+        return AsyncDownloadStream(
+            chunks(),
+            status=response.status_code,
+            headers={name: response.headers[name] for name in PASSTHROUGH_DOWNLOAD_HEADERS if name in response.headers},
+        )
 
-supabase_storage = SupabaseStorageService()
+    async def adelete_files(self, file_paths):
+        try:
+            await acall_with_retry(
+                self.breaker, 'delete', self._arequest, 'DELETE', self._object_url(self.bucket_name), 'metadata',
+                json={'prefixes': list(file_paths)},
+            )
+        except Exception as e:
+            logger.error(f"Delete failed: {str(e)}", exc_info=True)
+            raise Exception(f"Delete failed: {str(e)}")
+        for file_path in file_paths:
+            self._forget_signed_url(file_path)
+        return True
@@ -1,3 +1,1595 @@
-from django.test import TestCase
+from django import forms
+from django.contrib.auth import get_user_model
+from django.core.exceptions import ImproperlyConfigured
+from django.core.files.uploadedfile import SimpleUploadedFile
+from django.db import DEFAULT_DB_ALIAS, connections
+from django.test import SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.urls import resolve, reverse
+from django.template import Context
+from django.utils import timezone
+from rest_framework.authtoken.models import Token
+from asgiref.sync import async_to_sync, iscoroutinefunction, sync_to_async
 
-# Create your tests here.
+from .assets import BrandingAssetCache, branding_assets, branding_url_fetcher, invalidate_branding_path
+from .benchmarks import reload_urls, reset_storage
+from .cache import LRUCache
+from .batch import BatchInputError, load_rows, normalize_row
+from .blobs import (
+    collect_orphan_blobs, collect_released_blobs, delete_file_rows, reconcile_blob_refs, release_blobs, store_blob,
+)
+from .http import (
+    CircuitBreaker, CircuitOpenError, acall_with_retry, call_with_retry, create_httpx_client, is_transient_error,
+)
+from .folders import delete_folder_tree, get_delete_progress, set_delete_progress
+from .pagination import decode_cursor, encode_cursor, keyset_paginate
+from .rendering import (
+    SHARED_CSS, compiled_templates, get_cache_stats, get_compiled_template, get_renderer, render_pdf,
+)
+from .render_cache import evict_render_cache, get_cached_render, get_render_key, remember_render
+from .jobs import claim_render_jobs, pending_render_jobs, run_render_job
+from .forms import get_template_form_class, template_form_classes
+from .extraction import DOCX_CONTENT_TYPE, extract_blob_text, pending_text_blobs
+from .models import (
+    BlobTextPage, DocumentFolder, FileCreated, FolderDeletion, PDFTemplate, RenderCacheEntry, StoredBlob,
+)
+from .storage import LocalStorageService, buffered_chunks, sign_local_path, storage
+from .supabase_storage import SupabaseStorageService, is_not_found_error, with_download_name
+
+from datetime import timedelta
+from unittest import mock
+
+import httpcore
+import httpx
+import io
+import itertools
+import json
+import requests
+import socket
+import tempfile
+import time
+import zipfile
+
+HTML_CONTENT = '<p>{{ nome }}</p>{% for item in itens %}<li>{{ item }}</li>{% endfor %}'
+
+
+@override_settings(
+    FILES_STORAGE_BACKEND='files.storage.MemoryStorageService',
+    FILES_ASYNC_VIEWS=False,
+    PDF_RENDER_WORKERS=0,
+    SECURE_SSL_REDIRECT=False,
+)
+class QueryBudgetTests(TestCase):
+    # Cada view tem um orçamento de queries que não pode crescer com o volume de dados do usuário:
+    # a mesma requisição é medida com poucos e com muitos registros
+    small = 2
+    large = 40
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='budget@easydocs.local', password='secret')
+        cls.template = PDFTemplate.objects.create(user=cls.user, template_name='proposta', html_content=HTML_CONTENT)
+        cls.folder = DocumentFolder.objects.create(user=cls.user, folder_name='contratos')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.client.force_login(self.user)
+
+    def grow(self, amount):
+        # Pastas, subpastas, arquivos e templates extras para o usuário
+        for index in range(amount):
+            parent = DocumentFolder.objects.create(user=self.user, folder_name=f"pasta-{index}-{amount}")
+            DocumentFolder.objects.create(user=self.user, folder_name='sub', parent_folder=parent)
+            PDFTemplate.objects.create(user=self.user, template_name=f"extra-{index}", html_content=HTML_CONTENT)
+            FileCreated.objects.bulk_create([
+                FileCreated(
+                    user=self.user, file_name=f"doc-{index}-{n}.pdf", file_path=f"x/doc-{index}-{n}.pdf",
+                    file_size=1, folder=folder, is_generated=True, data_used={'nome': 'A'}, template=self.template,
+                )
+                for n, folder in enumerate([parent, self.folder])
+            ])
+
+    def count_queries(self, request):
+        with CaptureQueriesContext(connections[DEFAULT_DB_ALIAS]) as context:
+            response = request()
+        self.assertLess(response.status_code, 500, getattr(response, 'content', b'')[:500])
+        return len(context.captured_queries), response
+
+    def assertQueryBudget(self, budget, request, setup=None):
+        counts = []
+        for amount in (self.small, self.large):
+            self.grow(amount)
+            if setup is not None:
+                setup()
+            count, _ = self.count_queries(request)
+            counts.append(count)
+            self.assertLessEqual(count, budget, f"{count} queries com {amount} registros extras (orçamento: {budget})")
+        self.assertEqual(counts[0], counts[1], f"Queries crescem com o volume de dados: {counts}")
+
+    def create_file(self, name='relatorio.pdf', folder=None):
+        storage.upload_file(io.BytesIO(b'%PDF-1.7'), f"x/{name}")
+        return FileCreated.objects.create(
+            user=self.user, file_name=name, file_path=f"x/{name}", file_size=8, folder=folder or self.folder,
+        )
+
+    def test_pdf_generator(self):
+        self.assertQueryBudget(4, lambda: self.client.get(reverse('files:pdf_generator')))
+
+    def test_create_template(self):
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('files:create_template')))
+        self.assertQueryBudget(3, lambda: self.client.post(reverse('files:create_template'), {
+            'template_name': 'novo', 'template_type': 'proposal', 'html_content': HTML_CONTENT, 'is_active': 'on',
+        }))
+
+    def test_fill_template(self):
+        url = reverse('files:fill_template', args=[self.template.id])
+        self.assertQueryBudget(4, lambda: self.client.get(url))
+        self.assertQueryBudget(8, lambda: self.client.post(url, {
+            'action': 'generate', 'folder_id': self.folder.id, 'nome': 'Cliente', 'itens': 'um\ndois',
+        }))
+
+    def test_batch_generate(self):
+        url = reverse('files:batch_generate', args=[self.template.id])
+        rows = json.dumps([{'nome': f"Cliente {n}", 'itens': ['a']} for n in range(20)]).encode()
+        self.assertQueryBudget(6, lambda: self.client.post(url, {
+            'folder_id': self.folder.id, 'rows': SimpleUploadedFile('linhas.json', rows),
+        }))
+
+    def test_batch_generate_invalid_input(self):
+        url = reverse('files:batch_generate', args=[self.template.id])
+        for name, content in [
+            ('linhas.json', json.dumps([{'nome': 'A', 'itens': {'a': 1}}]).encode()),
+            ('linhas.csv', 'nome,itens\nJoão,um\n'.encode('latin-1')),
+        ]:
+            response = self.client.post(url, {'folder_id': self.folder.id, 'rows': SimpleUploadedFile(name, content)})
+            self.assertEqual(response.status_code, 200)
+            self.assertTrue(response.context['error'])
+        self.assertFalse(FileCreated.objects.filter(status='pending').exists())
+
+    def test_download_and_status(self):
+        file_obj = self.create_file()
+        self.assertQueryBudget(3, lambda: self.client.get(reverse('files:download_file', args=[file_obj.id])))
+        self.assertQueryBudget(3, lambda: self.client.get(reverse('files:file_status', args=[file_obj.id])))
+
+    def test_local_storage_file(self):
+        file_obj = self.create_file()
+        url = sign_local_path(file_obj.file_path, 60)
+        self.assertQueryBudget(0, lambda: self.client.get(url))
+
+    def test_file_management(self):
+        self.assertQueryBudget(4, lambda: self.client.get(reverse('files:file_management')))
+
+    def test_create_folder(self):
+        names = iter(range(10))
+        self.assertQueryBudget(8, lambda: self.client.post(reverse('files:create_folder'), {
+            'folder_name': f"nova-{next(names)}", 'parent_folder': self.folder.id,
+        }))
+
+    def test_upload_file(self):
+        names = iter(range(10))
+
+        def upload():
+            # Conteúdo diferente a cada envio: a deduplicação de blobs não pode encurtar o caminho
+            n = next(names)
+            return self.client.post(reverse('files:upload_file'), {
+                'folder': self.folder.id,
+                'file': SimpleUploadedFile(f"anexo-{n}.pdf", f"%PDF-1.7 {n}".encode(), content_type='application/pdf'),
+            })
+
+        self.assertQueryBudget(10, upload)
+
+    def test_delete_file(self):
+        files = []
+        self.assertQueryBudget(
+            7,
+            lambda: self.client.get(reverse('files:delete_file', args=[files[-1].id])),
+            setup=lambda: files.append(self.create_file(f"apagar-{len(files)}.pdf")),
+        )
+
+    def test_delete_folder(self):
+        folders = []
+
+        def setup():
+            folder = DocumentFolder.objects.create(user=self.user, folder_name=f"apagar-{len(folders)}")
+            DocumentFolder.objects.create(user=self.user, folder_name='sub', parent_folder=folder)
+            for n in range(len(folders) * 10 + 1):
+                self.create_file(f"apagar-{len(folders)}-{n}.pdf", folder=folder)
+            folders.append(folder)
+
+        # A pasta apagada cresce de 1 para 21 arquivos: o custo continua o mesmo
+        self.assertQueryBudget(
+            22, lambda: self.client.get(reverse('files:delete_folder', args=[folders[-1].id])), setup=setup,
+        )
+        self.assertQueryBudget(
+            4, lambda: self.client.get(reverse('files:delete_folder_status', args=[self.folder.id])),
+        )
+
+    def test_api_lists(self):
+        self.client.logout()
+        token = Token.objects.create(user=self.user)
+        headers = {'HTTP_AUTHORIZATION': f"Token {token.key}"}
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('files:api-template-list'), **headers))
+        self.assertQueryBudget(2, lambda: self.client.get(reverse('files:api-file-list'), **headers))
+        self.assertQueryBudget(3, lambda: self.client.get(reverse('files:api-folder-list'), **headers))
+        self.assertQueryBudget(2, lambda: self.client.get(
+            reverse('files:api-file-list') + '?fields=id,file_name,folder_name', **headers,
+        ))
+
+    def test_api_generate(self):
+        url = reverse('files:api-template-generate', args=[self.template.id])
+        self.assertQueryBudget(7, lambda: self.client.post(
+            url, {'folder': self.folder.id, 'data': {'nome': 'Cliente', 'itens': ['um']}}, content_type='application/json',
+        ))
+
+    def test_api_generate_invalid_data(self):
+        url = reverse('files:api-template-generate', args=[self.template.id])
+        for data in [{'itens': 3}, {'itens': [['a']]}, {'nome': ['a']}, {'nome': True}]:
+            response = self.client.post(url, {'folder': self.folder.id, 'data': data}, content_type='application/json')
+            self.assertEqual(response.status_code, 400, data)
+        response = self.client.post(
+            url, {'folder': self.folder.id, 'data': {'nome': 1, 'itens': 'um\ndois'}}, content_type='application/json',
+        )
+        self.assertEqual(response.status_code, 202)
+        self.assertEqual(FileCreated.objects.get(id=response.json()['job_id']).data_used['itens'], ['um', 'dois'])
+
+    def test_api_token(self):
+        self.client.logout()
+        self.assertQueryBudget(
+            5,
+            lambda: self.client.post(reverse('files:api_token'), {
+                'username': 'budget@easydocs.local', 'password': 'secret',
+            }),
+            setup=lambda: Token.objects.filter(user=self.user).delete(),
+        )
+
+    def test_search(self):
+        self.assertQueryBudget(4, lambda: self.client.get(reverse('files:pdf_generator') + '?q=doc'))
+        self.assertQueryBudget(3, lambda: self.client.get(reverse('files:api-file-search') + '?q=doc&limit=20'))
+
+
+@override_settings(SECURE_SSL_REDIRECT=False)
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email='busca@easydocs.local', password='secret')
+        other = User.objects.create_user(email='outro@easydocs.local', password='secret')
+        for user, name, description, data in [
+            (cls.user, 'proposta_acme.pdf', None, {'cliente': 'Acme Ltda'}),
+            (cls.user, 'contrato.pdf', 'Proposta aprovada', {}),
+            (cls.user, 'relatorio.pdf', None, {'itens': ['Proposta anexa']}),
+            (cls.user, 'recibo.pdf', None, {'cliente': 'Outra Empresa'}),
+            (other, 'proposta_outro.pdf', None, {}),
+        ]:
+            FileCreated.objects.create(
+                user=user, file_name=name, file_path=f"x/{name}", file_size=1, description=description,
+                is_generated=True, data_used=data,
+            )
+
+    def setUp(self):
+        self.client.force_login(self.user)
+
+    def search(self, query, **params):
+        response = self.client.get(reverse('files:api-file-search'), {'q': query, **params})
+        self.assertEqual(response.status_code, 200)
+        return [item['file_name'] for item in response.json()['results']]
+
+    def test_ranked_by_field(self):
+        self.assertEqual(self.search('proposta'), ['proposta_acme.pdf', 'contrato.pdf', 'relatorio.pdf'])
+
+    def test_prefix_and_all_terms(self):
+        self.assertEqual(self.search('prop acm'), ['proposta_acme.pdf'])
+        self.assertEqual(self.search('empr'), ['recibo.pdf'])
+        self.assertEqual(self.search('proposta', limit=1), ['proposta_acme.pdf'])
+
+    def test_invalid_query(self):
+        response = self.client.get(reverse('files:api-file-search'), {'q': ' -_ '})
+        self.assertEqual(response.status_code, 400)
+
+    def test_pdf_generator_page(self):
+        response = self.client.get(reverse('files:pdf_generator'), {'q': 'acme'})
+        self.assertEqual([pdf.file_name for pdf in response.context['page_obj']], ['proposta_acme.pdf'])
+
+
+@override_settings(
+    FILES_STORAGE_BACKEND='files.storage.MemoryStorageService',
+    SECURE_SSL_REDIRECT=False,
+    TEXT_EXTRACTION_PAGE_CHARS=100,
+    TEXT_EXTRACTION_BATCH_SIZE=2,
+)
+class TextExtractionTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='texto@easydocs.local', password='secret')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    def upload(self, name, content, content_type):
+        blob = store_blob(io.BytesIO(content), content_type=content_type)
+        FileCreated.objects.create(
+            user=self.user, file_name=name, file_path=blob.storage_key, file_size=blob.size, blob=blob,
+        )
+        return blob
+
+    def docx(self, paragraphs):
+        content = io.BytesIO()
+        body = ''.join(f"<w:p><w:r><w:t>{text}</w:t></w:r></w:p>" for text in paragraphs)
+        with zipfile.ZipFile(content, 'w') as archive:
+            archive.writestr(
+                'word/document.xml',
+                '<w:document xmlns:w="http://schemas.openxmlformats.org/wordprocessingml/2006/main">'
+                f"<w:body>{body}</w:body></w:document>",
+            )
+        return content.getvalue()
+
+    def test_txt_split_into_pages(self):
+        blob = self.upload('notas.txt', ('São Paulo, cláusula penal. ' * 20).encode(), 'text/plain')
+        self.assertEqual(list(pending_text_blobs()), [blob.id])
+        self.assertEqual(extract_blob_text(blob.id), 'completed')
+        pages = list(BlobTextPage.objects.filter(blob=blob).values_list('content', flat=True))
+        self.assertEqual(len(pages), 6)
+        self.assertTrue(all(len(page) <= 100 for page in pages))
+        self.assertEqual(''.join(pages), 'São Paulo, cláusula penal. ' * 20)
+        self.assertEqual(blob.text.char_count, 540)
+        # Já extraído: nem o comando nem um novo envio do mesmo conteúdo extraem de novo
+        self.assertEqual(list(pending_text_blobs()), [])
+        self.assertIsNone(extract_blob_text(blob.id))
+
+    def test_docx_and_search(self):
+        blob = self.upload('relatorio.docx', self.docx(['Relatório trimestral', 'Fornecedor Zeta']), DOCX_CONTENT_TYPE)
+        self.assertEqual(extract_blob_text(blob.id), 'completed')
+        self.assertEqual(BlobTextPage.objects.get(blob=blob).content, 'Relatório trimestral\nFornecedor Zeta\n')
+        self.client.force_login(self.user)
+        response = self.client.get(reverse('files:api-file-search'), {'q': 'fornec zeta'})
+        self.assertEqual([item['file_name'] for item in response.json()['results']], ['relatorio.docx'])
+
+    def test_invalid_and_unsupported(self):
+        broken = self.upload('quebrado.docx', b'nao e um zip', DOCX_CONTENT_TYPE)
+        image = self.upload('foto.png', b'\x89PNG', 'image/png')
+        self.assertEqual(list(pending_text_blobs()), [broken.id])
+        self.assertEqual(extract_blob_text(broken.id), 'unsupported')
+        self.assertEqual(extract_blob_text(image.id), 'unsupported')
+        self.assertFalse(BlobTextPage.objects.exists())
+
+
+class BrandingIsolationTests(TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.cache = BrandingAssetCache(directory.name, ttl=60, max_bytes=1024)
+
+    def test_fetcher_only_serves_own_branding(self):
+        for url in [
+            'branding://2/header.png',
+            'branding://2/contrato.pdf',
+            'branding://2/sub/legacy.docx',
+            'branding://self/contrato.pdf',
+            'branding://self/../../header.png',
+        ]:
+            with self.assertRaises(ValueError, msg=url):
+                branding_url_fetcher(url, user_id=1)
+
+    @override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService')
+    def test_missing_marker_shared_between_processes(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        worker = BrandingAssetCache(self.cache.directory, ttl=60, max_bytes=1024)
+        with self.assertRaises(Exception):
+            worker.get('1', 'header.png')
+        storage.upload_file(io.BytesIO(b'logo'), '1/header.png')
+        # Ainda marcado como ausente até a invalidação, feita por outro processo (o web)
+        with self.assertRaises(FileNotFoundError):
+            worker.get('1', 'header.png')
+        self.cache.invalidate('1', 'header.png')
+        self.assertEqual(worker.get('1', 'header.png'), b'logo')
+
+    @override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService')
+    def test_legacy_version_independent_of_local_cache(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        storage.upload_file(io.BytesIO(b'logo'), '1/header.png')
+        version = self.cache.version('1', 'header.png')
+        self.assertTrue(version)
+        self.cache.get('1', 'header.png')
+        self.assertEqual(self.cache.version('1', 'header.png'), version)
+        # Sem nada em disco (ttl vencido) a versão continua a mesma
+        expired = BrandingAssetCache(self.cache.directory, ttl=0, max_bytes=1024)
+        self.assertEqual(expired.version('1', 'header.png'), version)
+        self.assertEqual(expired.version('1', 'footer.png'), '')
+        storage.upload_file(io.BytesIO(b'novo logo'), '1/header.png', upsert=True)
+        self.cache.invalidate('1', 'header.png')
+        self.assertNotEqual(self.cache.version('1', 'header.png'), version)
+
+    @override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService')
+    def test_transient_errors_not_marked_missing(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        with mock.patch.object(storage, 'download_file', side_effect=Exception('Download failed: 503')):
+            with self.assertRaises(Exception) as raised:
+                self.cache.get('1', 'header.png')
+        self.assertNotIsInstance(raised.exception, FileNotFoundError)
+        storage.upload_file(io.BytesIO(b'logo'), '1/header.png')
+        # Sem marca de ausência: a próxima tentativa já encontra a imagem
+        self.assertEqual(self.cache.get('1', 'header.png'), b'logo')
+
+    @override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService')
+    def test_fetcher_reports_storage_failures(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        branding_assets.invalidate('1')
+        self.addCleanup(branding_assets.invalidate, '1')
+        errors = []
+        with self.assertRaises(FileNotFoundError):
+            branding_url_fetcher('branding://self/footer.png', user_id=1, errors=errors)
+        self.assertEqual(errors, [])
+        with mock.patch.object(storage, 'download_file', side_effect=Exception('timeout')):
+            with self.assertRaises(Exception):
+                branding_url_fetcher('branding://self/header.png', user_id=1, errors=errors)
+        self.assertEqual([str(error) for error in errors], ['timeout'])
+
+    def test_supabase_not_found_errors(self):
+        self.assertTrue(is_not_found_error(mock.Mock(status=404, code='')))
+        self.assertTrue(is_not_found_error(mock.Mock(status=400, code='not_found')))
+        self.assertFalse(is_not_found_error(mock.Mock(status=503, code='')))
+        self.assertFalse(is_not_found_error(Exception('timeout')))
+
+    def test_cache_rejects_unknown_names(self):
+        self.cache.put('1', 'header.png', b'png')
+        self.assertEqual(self.cache.get('1', 'header.png'), b'png')
+        for user_id, name in [('1', '../../evil.png'), ('1', 'contrato.pdf'), ('../1', 'header.png')]:
+            with self.assertRaises(ValueError):
+                self.cache.put(user_id, name, b'x')
+
+
+@override_settings(PDF_RENDER_TIMEOUT=600)
+class RenderJobClaimTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='jobs@easydocs.local', password='secret')
+
+    def create_job(self, status='pending', age=0):
+        file_obj = FileCreated.objects.create(
+            user=self.user, file_name='job.pdf', file_path='x/job.pdf', file_size=0, is_generated=True, status=status,
+        )
+        FileCreated.objects.filter(id=file_obj.id).update(updated_at=timezone.now() - timedelta(seconds=age))
+        return file_obj
+
+    def test_each_job_claimed_once(self):
+        jobs = [self.create_job(), self.create_job(), self.create_job(status='completed')]
+        ids = [job.id for job in jobs]
+        self.assertEqual(claim_render_jobs(ids), ids[:2])
+        self.assertEqual(claim_render_jobs(ids), [])
+        self.assertEqual(FileCreated.objects.get(id=ids[0]).status, 'running')
+        # O pool do servidor e o process_render_jobs não renderizam o mesmo arquivo
+        self.assertIsNone(run_render_job(ids[0]))
+
+    def test_abandoned_jobs_are_reclaimed(self):
+        recent = self.create_job(status='running', age=60)
+        abandoned = self.create_job(status='running', age=3600)
+        waiting = self.create_job(age=120)
+        self.assertEqual(sorted(pending_render_jobs(min_age=60)), sorted([abandoned.id, waiting.id]))
+        self.assertEqual(claim_render_jobs([recent.id, abandoned.id]), [abandoned.id])
+
+
+class BatchInputTests(TestCase):
+    schema = {'fields': [{'name': 'nome', 'is_list': False}, {'name': 'itens', 'is_list': True}]}
+
+    def test_normalize_list_values(self):
+        self.assertEqual(normalize_row({'nome': 1, 'itens': 3}, self.schema), {'nome': '1', 'itens': ['3']})
+        self.assertEqual(normalize_row({'itens': 'um\n\ndois '}, self.schema)['itens'], ['um', 'dois'])
+        self.assertEqual(normalize_row({'itens': ['a', 2]}, self.schema)['itens'], ['a', '2'])
+        for value in [{'a': 1}, [['a']], True]:
+            with self.assertRaises(BatchInputError):
+                normalize_row({'itens': value}, self.schema)
+
+    def test_load_rows_requires_utf8(self):
+        self.assertEqual(load_rows(io.BytesIO('\ufeffnome\nJoão\n'.encode()), 'a.csv'), [{'nome': 'João'}])
+        with self.assertRaises(BatchInputError):
+            load_rows(io.BytesIO('nome\nJoão\n'.encode('latin-1')), 'a.csv')
+
+
+@override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService', FILES_DELETE_TIMEOUT=600)
+class FolderDeleteProgressTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        User = get_user_model()
+        cls.user = User.objects.create_user(email='pastas@easydocs.local', password='secret')
+        cls.other = User.objects.create_user(email='outra@easydocs.local', password='secret')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    def test_progress_counts_blob_backed_files(self):
+        folder = DocumentFolder.objects.create(user=self.user, folder_name='clientes')
+        for n in range(3):
+            blob = store_blob(io.BytesIO(f"pdf {n}".encode()))
+            FileCreated.objects.create(
+                user=self.user, file_name=f"{n}.pdf", file_path=blob.storage_key, file_size=1, folder=folder, blob=blob,
+            )
+        progress = delete_folder_tree(folder.id, track_progress=True)
+        self.assertEqual(progress, {'status': 'completed', 'deleted': 3, 'total': 3})
+        self.assertEqual(get_delete_progress(folder.id, user=self.user), progress)
+        self.assertIsNone(get_delete_progress(folder.id, user=self.other))
+
+    def test_interrupted_delete_reported_as_failed(self):
+        folder = DocumentFolder.objects.create(user=self.user, folder_name='grande')
+        set_delete_progress(folder.id, 'running', 10, 100)
+        self.assertEqual(get_delete_progress(folder.id)['status'], 'running')
+        FolderDeletion.objects.filter(folder_id=folder.id).update(updated_at=timezone.now() - timedelta(seconds=3600))
+        self.assertEqual(get_delete_progress(folder.id)['status'], 'failed')
+
+
+@override_settings(
+    FILES_STORAGE_BACKEND='files.storage.MemoryStorageService',
+    FILES_ASYNC_VIEWS=False,
+    SECURE_SSL_REDIRECT=False,
+)
+class DownloadNameTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='download@easydocs.local', password='secret')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.client.force_login(self.user)
+
+    def test_blob_redirect_keeps_original_name(self):
+        blob = store_blob(io.BytesIO(b'%PDF-1.7'), content_type='application/pdf')
+        file_obj = FileCreated.objects.create(
+            user=self.user, file_name='Proposta Ação.pdf', file_path=blob.storage_key, file_size=8, blob=blob,
+        )
+        response = self.client.get(reverse('files:download_file', args=[file_obj.id]))
+        self.assertEqual(response.status_code, 302)
+        response = self.client.get(response['Location'])
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        # Visualizável: abre no navegador, mas "salvar como" usa o nome original
+        self.assertTrue(response['Content-Disposition'].startswith('inline'), response['Content-Disposition'])
+        self.assertIn("filename*=utf-8''Proposta%20A%C3%A7%C3%A3o.pdf", response['Content-Disposition'])
+
+    def test_deleting_branding_file_invalidates_cache(self):
+        user_id = str(self.user.id)
+        self.addCleanup(branding_assets.invalidate, user_id)
+        folder = DocumentFolder.objects.create(user=self.user, folder_name=user_id)
+        blob = store_blob(io.BytesIO(b'logo'))
+        file_obj = FileCreated.objects.create(
+            user=self.user, file_name='header.png', file_path=blob.storage_key, file_size=4, folder=folder, blob=blob,
+        )
+        branding_assets.put(user_id, 'header.png', b'logo')
+        self.client.get(reverse('files:delete_file', args=[file_obj.id]))
+        self.assertIsNone(branding_assets.digest(user_id, 'header.png'))
+        with self.assertRaises(FileNotFoundError):
+            branding_assets.get(user_id, 'header.png')
+
+    def test_attachment_download_name(self):
+        url = storage.get_signed_url('blobs/ab/abc', 60, download='relatório.docx')
+        storage.upload_file(io.BytesIO(b'docx'), 'blobs/ab/abc')
+        response = self.client.get(url)
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertIn("relat%C3%B3rio.docx", response['Content-Disposition'])
+
+    def test_supabase_download_parameter(self):
+        url = 'https://x.supabase.co/storage/v1/object/sign/docs/blobs/ab/abc?token=t'
+        self.assertEqual(with_download_name(url, None), url)
+        self.assertEqual(with_download_name(url, 'a b/c.pdf'), f"{url}&download=a%20b%2Fc.pdf")
+
+
+@override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService')
+class BlobCollectionTests(TestCase):
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+
+    def test_objects_removed_after_rows_commit(self):
+        blob = store_blob(io.BytesIO(b'orphan'))
+        release_blobs([blob.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            self.assertEqual(collect_orphan_blobs(), 1)
+        self.assertFalse(StoredBlob.objects.filter(id=blob.id).exists())
+        self.assertIn(blob.storage_key, storage.objects)
+        for callback in callbacks:
+            callback()
+        self.assertNotIn(blob.storage_key, storage.objects)
+
+    def test_reuploaded_content_kept(self):
+        blob = store_blob(io.BytesIO(b'again'))
+        release_blobs([blob.id])
+        with self.captureOnCommitCallbacks() as callbacks:
+            collect_orphan_blobs()
+        # O mesmo conteúdo é enviado de novo antes da remoção do objeto
+        again = store_blob(io.BytesIO(b'again'))
+        for callback in callbacks:
+            callback()
+        self.assertEqual(storage.download_file(again.storage_key), b'again')
+
+    def create_files(self, blob, count):
+        user, _ = get_user_model().objects.get_or_create(email='blobs@easydocs.local')
+        return [
+            FileCreated.objects.create(
+                user=user, file_name=f"{n}.pdf", file_path=blob.storage_key, file_size=blob.size, blob=blob,
+            )
+            for n in range(count)
+        ]
+
+    def test_same_content_shares_one_blob(self):
+        first = store_blob(io.BytesIO(b'contrato'))
+        storage.delete_files([first.storage_key])
+        # Conteúdo já registrado: só ganha referência, sem novo upload
+        second = store_blob(io.BytesIO(b'contrato'))
+        self.assertEqual(second.id, first.id)
+        self.assertEqual(second.ref_count, 2)
+        self.assertNotIn(first.storage_key, storage.objects)
+        self.assertEqual(StoredBlob.objects.count(), 1)
+
+    def test_release_counts_each_reference(self):
+        blob = store_blob(io.BytesIO(b'x'))
+        store_blob(io.BytesIO(b'x'))
+        store_blob(io.BytesIO(b'x'))
+        release_blobs([blob.id, blob.id, None])
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 1)
+        release_blobs([blob.id, blob.id])
+        blob.refresh_from_db()
+        self.assertEqual(blob.ref_count, 0)
+
+    def test_delete_file_rows_releases_and_collects(self):
+        blob = store_blob(io.BytesIO(b'compartilhado'))
+        store_blob(io.BytesIO(b'compartilhado'))
+        first, second = self.create_files(blob, 2)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_released_blobs(delete_file_rows(FileCreated.objects.filter(id=first.id))), 0)
+        self.assertIn(blob.storage_key, storage.objects)
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_released_blobs(delete_file_rows(FileCreated.objects.filter(id=second.id))), 1)
+        self.assertFalse(StoredBlob.objects.exists())
+        self.assertNotIn(blob.storage_key, storage.objects)
+
+    def test_grace_period(self):
+        blob = store_blob(io.BytesIO(b'recente'))
+        release_blobs([blob.id])
+        self.assertEqual(collect_orphan_blobs(grace=3600), 0)
+        StoredBlob.objects.filter(id=blob.id).update(updated_at=timezone.now() - timedelta(hours=2))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_orphan_blobs(grace=3600), 1)
+
+    def test_reconcile_refs(self):
+        used = store_blob(io.BytesIO(b'usado'))
+        unused = store_blob(io.BytesIO(b'sem uso'))
+        self.create_files(used, 3)
+        reconcile_blob_refs()
+        used.refresh_from_db()
+        unused.refresh_from_db()
+        self.assertEqual((used.ref_count, unused.ref_count), (3, 0))
+        with self.captureOnCommitCallbacks(execute=True):
+            self.assertEqual(collect_orphan_blobs(), 1)
+        self.assertEqual(list(StoredBlob.objects.values_list('id', flat=True)), [used.id])
+
+
+@override_settings(
+    FILES_STORAGE_BACKEND='files.storage.MemoryStorageService',
+    FILES_ASYNC_VIEWS=False,
+    SECURE_SSL_REDIRECT=False,
+)
+class DownloadRangeTests(TestCase):
+    content = b'0123456789abcdefghij'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='range@easydocs.local', password='secret')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.client.force_login(self.user)
+        storage.upload_file(io.BytesIO(self.content), 'x/notas.txt')
+        file_obj = FileCreated.objects.create(
+            user=self.user, file_name='notas.txt', file_path='x/notas.txt', file_size=len(self.content),
+        )
+        self.url = reverse('files:download_file', args=[file_obj.id])
+
+    def get(self, **headers):
+        response = self.client.get(self.url, headers=headers)
+        body = b''.join(response.streaming_content) if response.streaming else response.content
+        return response, body
+
+    def test_full_download(self):
+        response, body = self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+
+    def test_ranges(self):
+        for header, status, expected, content_range in [
+            ('bytes=2-5', 206, b'2345', 'bytes 2-5/20'),
+            ('bytes=15-', 206, b'fghij', 'bytes 15-19/20'),
+            ('bytes=-3', 206, b'hij', 'bytes 17-19/20'),
+            ('bytes=18-100', 206, b'ij', 'bytes 18-19/20'),
+            ('bytes=0-1,4-5', 200, self.content, None),
+            ('items=0-1', 200, self.content, None),
+        ]:
+            response, body = self.get(Range=header)
+            self.assertEqual(response.status_code, status, header)
+            self.assertEqual(body, expected, header)
+            self.assertEqual(response.get('Content-Range'), content_range, header)
+
+    def test_unsatisfiable_range(self):
+        for header in ['bytes=20-', 'bytes=7-3', 'bytes=-0']:
+            response, body = self.get(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */20')
+            self.assertEqual(body, b'')
+
+    def test_conditional_requests(self):
+        response, _ = self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual(self.get(**{'If-None-Match': etag})[0].status_code, 304)
+        self.assertEqual(self.get(**{'If-None-Match': f'"outro", {etag}'})[0].status_code, 304)
+        self.assertEqual(self.get(**{'If-Modified-Since': last_modified})[0].status_code, 304)
+        # If-None-Match tem precedência sobre If-Modified-Since
+        response, _ = self.get(**{'If-None-Match': '"outro"', 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+
+    def test_if_range(self):
+        etag = self.get()[0]['ETag']
+        response, body = self.get(Range='bytes=0-3', **{'If-Range': etag})
+        self.assertEqual((response.status_code, body), (206, b'0123'))
+        # Conteúdo mudou desde a primeira parte: o arquivo vem inteiro
+        response, body = self.get(Range='bytes=0-3', **{'If-Range': '"antigo"'})
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    def test_local_storage_ranges(self):
+        with tempfile.TemporaryDirectory() as root:
+            local = LocalStorageService(root)
+            local.upload_file(io.BytesIO(self.content), 'x/notas.txt')
+            stream = local.download_stream('x/notas.txt', chunk_size=3, request_headers={'Range': 'bytes=4-10'})
+            self.assertEqual((stream.status, b''.join(stream)), (206, b'456789a'))
+            stream.close()
+            etag = stream.headers['ETag']
+            self.assertEqual(local.get_etag('x/notas.txt'), etag)
+            stream = local.download_stream('x/notas.txt', request_headers={'If-None-Match': etag})
+            stream.close()
+            self.assertEqual(stream.status, 304)
+
+
+@override_settings(
+    FILES_STORAGE_BACKEND='files.storage.MemoryStorageService',
+    FILES_ASYNC_VIEWS=True,
+    FILES_DELETE_ASYNC_THRESHOLD=100,
+    TEXT_EXTRACTION_WORKERS=0,
+    SECURE_SSL_REDIRECT=False,
+)
+class AsyncViewTests(TestCase):
+    # As mesmas garantias de DownloadRangeTests e DownloadNameTests, pelas views de async_views
+    content = DownloadRangeTests.content
+
+    @classmethod
+    def setUpClass(cls):
+        # files.urls escolhe as views na importação. A limpeza registrada primeiro roda por último,
+        # depois que o override_settings da classe já saiu, e devolve as rotas síncronas
+        cls.addClassCleanup(reload_urls)
+        super().setUpClass()
+        reload_urls()
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='async@easydocs.local', password='secret')
+        cls.folder = DocumentFolder.objects.create(user=cls.user, folder_name='async')
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        self.async_client.force_login(self.user)
+        storage.upload_file(io.BytesIO(self.content), 'x/notas.txt')
+        self.file_obj = FileCreated.objects.create(
+            user=self.user, file_name='notas.txt', file_path='x/notas.txt', file_size=len(self.content),
+        )
+        self.url = reverse('files:download_file', args=[self.file_obj.id])
+
+    async def get(self, url=None, **headers):
+        response = await self.async_client.get(url or self.url, headers=headers)
+        if response.streaming:
+            return response, b''.join([chunk async for chunk in response.streaming_content])
+        return response, response.content
+
+    def test_routes_use_async_views(self):
+        for name, args in [
+            ('download_file', [1]), ('local_storage_file', ['t']), ('file_status', [1]),
+            ('upload_file', []), ('delete_folder', [1]),
+        ]:
+            self.assertTrue(iscoroutinefunction(resolve(reverse(f"files:{name}", args=args)).func), name)
+
+    async def test_full_download(self):
+        response, body = await self.get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(body, self.content)
+        self.assertEqual(response['Accept-Ranges'], 'bytes')
+        self.assertEqual(response['Content-Length'], str(len(self.content)))
+        self.assertEqual(response['Content-Disposition'], 'attachment; filename="notas.txt"')
+
+    async def test_ranges(self):
+        for header, status, expected, content_range in [
+            ('bytes=2-5', 206, b'2345', 'bytes 2-5/20'),
+            ('bytes=15-', 206, b'fghij', 'bytes 15-19/20'),
+            ('bytes=-3', 206, b'hij', 'bytes 17-19/20'),
+            ('bytes=18-100', 206, b'ij', 'bytes 18-19/20'),
+            ('bytes=0-1,4-5', 200, self.content, None),
+            ('items=0-1', 200, self.content, None),
+        ]:
+            response, body = await self.get(Range=header)
+            self.assertEqual(response.status_code, status, header)
+            self.assertEqual(body, expected, header)
+            self.assertEqual(response.get('Content-Range'), content_range, header)
+
+    async def test_unsatisfiable_range(self):
+        for header in ['bytes=20-', 'bytes=7-3', 'bytes=-0']:
+            response, body = await self.get(Range=header)
+            self.assertEqual(response.status_code, 416, header)
+            self.assertEqual(response['Content-Range'], 'bytes */20')
+            self.assertEqual(body, b'')
+
+    async def test_conditional_requests(self):
+        response, _ = await self.get()
+        etag, last_modified = response['ETag'], response['Last-Modified']
+        self.assertEqual((await self.get(**{'If-None-Match': etag}))[0].status_code, 304)
+        self.assertEqual((await self.get(**{'If-None-Match': f'"outro", {etag}'}))[0].status_code, 304)
+        self.assertEqual((await self.get(**{'If-Modified-Since': last_modified}))[0].status_code, 304)
+        response, _ = await self.get(**{'If-None-Match': '"outro"', 'If-Modified-Since': last_modified})
+        self.assertEqual(response.status_code, 200)
+
+    async def test_if_range(self):
+        etag = (await self.get())[0]['ETag']
+        response, body = await self.get(Range='bytes=0-3', **{'If-Range': etag})
+        self.assertEqual((response.status_code, body), (206, b'0123'))
+        response, body = await self.get(Range='bytes=0-3', **{'If-Range': '"antigo"'})
+        self.assertEqual((response.status_code, body), (200, self.content))
+
+    async def test_blob_redirect_keeps_original_name(self):
+        blob = await sync_to_async(store_blob)(io.BytesIO(b'%PDF-1.7'), content_type='application/pdf')
+        file_obj = await FileCreated.objects.acreate(
+            user=self.user, file_name='Proposta Ação.pdf', file_path=blob.storage_key, file_size=8, blob=blob,
+        )
+        response = await self.async_client.get(reverse('files:download_file', args=[file_obj.id]))
+        self.assertEqual(response.status_code, 302)
+        response, body = await self.get(response['Location'])
+        self.assertEqual((response.status_code, body), (200, b'%PDF-1.7'))
+        self.assertEqual(response['Content-Type'], 'application/pdf')
+        self.assertTrue(response['Content-Disposition'].startswith('inline'), response['Content-Disposition'])
+        self.assertIn("filename*=utf-8''Proposta%20A%C3%A7%C3%A3o.pdf", response['Content-Disposition'])
+
+    async def test_attachment_download_name(self):
+        url = await storage.aget_signed_url('x/notas.txt', 60, download='relatório.txt')
+        response, body = await self.get(url, Range='bytes=0-3')
+        self.assertEqual((response.status_code, body), (206, b'0123'))
+        self.assertTrue(response['Content-Disposition'].startswith('attachment'))
+        self.assertIn("relat%C3%B3rio.txt", response['Content-Disposition'])
+
+    async def test_file_status(self):
+        response = await self.async_client.get(reverse('files:file_status', args=[self.file_obj.id]))
+        data = response.json()
+        self.assertEqual((data['id'], data['status']), (self.file_obj.id, 'completed'))
+        response, body = await self.get(data['url'])
+        self.assertEqual(body, self.content)
+
+    async def test_upload_and_list(self):
+        response = await self.async_client.post(reverse('files:upload_file'), {
+            'folder': self.folder.id,
+            'file': SimpleUploadedFile('anexo.pdf', b'%PDF-1.7 async', content_type='application/pdf'),
+        })
+        self.assertRedirects(response, reverse('files:file_management'), fetch_redirect_response=False)
+        file_obj = await FileCreated.objects.select_related('blob').aget(file_name='anexo.pdf')
+        self.assertEqual((file_obj.folder_id, file_obj.file_path), (self.folder.id, file_obj.blob.storage_key))
+        self.assertEqual(storage.download_file(file_obj.file_path), b'%PDF-1.7 async')
+        response = await self.async_client.get(reverse('files:file_management'))
+        self.assertContains(response, 'anexo.pdf')
+
+    async def test_delete_folder(self):
+        folder = await DocumentFolder.objects.acreate(user=self.user, folder_name='apagar')
+        response = await self.async_client.get(reverse('files:delete_folder', args=[folder.id]))
+        self.assertRedirects(response, reverse('files:file_management'), fetch_redirect_response=False)
+        self.assertFalse(await DocumentFolder.objects.filter(id=folder.id).aexists())
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        user = get_user_model().objects.create_user(email='cursor@easydocs.local', password='secret')
+        cls.user = user
+        now = timezone.now()
+        # Vários arquivos com o mesmo created_at: o id desempata
+        moments = [now, now, now - timedelta(minutes=1), now - timedelta(minutes=1), now - timedelta(minutes=2),
+                   now - timedelta(minutes=3), now - timedelta(minutes=3)]
+        for index, moment in enumerate(moments):
+            file_obj = FileCreated.objects.create(
+                user=user, file_name=f"{index}.pdf", file_path=f"x/{index}.pdf", file_size=1,
+            )
+            FileCreated.objects.filter(id=file_obj.id).update(created_at=moment)
+        cls.expected = list(FileCreated.objects.order_by('-created_at', '-id').values_list('id', flat=True))
+
+    def files(self):
+        return FileCreated.objects.filter(user=self.user)
+
+    def test_cursor_round_trip(self):
+        file_obj = self.files().first()
+        self.assertEqual(decode_cursor(encode_cursor(file_obj)), (file_obj.created_at, file_obj.pk))
+        for cursor in ['', 'lixo', '!!!', 'eHwx', 'MjAyNi0wMS0wMQ']:
+            self.assertIsNone(decode_cursor(cursor), cursor)
+
+    def test_forward_and_backward(self):
+        pages = [keyset_paginate(self.files(), 3)]
+        while pages[-1].has_next():
+            pages.append(keyset_paginate(self.files(), 3, after=pages[-1].next_cursor))
+        self.assertEqual([len(page) for page in pages], [3, 3, 1])
+        self.assertEqual([file_obj.id for page in pages for file_obj in page], self.expected)
+        self.assertFalse(pages[0].has_previous())
+
+        # Voltando a partir da última página, as mesmas páginas na ordem inversa
+        page = pages[-1]
+        for expected in reversed(pages[:-1]):
+            page = keyset_paginate(self.files(), 3, before=page.previous_cursor)
+            self.assertEqual([file_obj.id for file_obj in page], [file_obj.id for file_obj in expected])
+        self.assertFalse(page.has_previous())
+        self.assertTrue(page.has_next())
+
+    def test_past_the_ends(self):
+        last = self.files().order_by('created_at', 'id').first()
+        first = self.files().order_by('-created_at', '-id').first()
+        self.assertEqual(len(keyset_paginate(self.files(), 3, after=encode_cursor(last))), 0)
+        self.assertEqual(len(keyset_paginate(self.files(), 3, before=encode_cursor(first))), 0)
+        # Cursor inválido volta para a primeira página
+        page = keyset_paginate(self.files(), 3, after='lixo')
+        self.assertEqual([file_obj.id for file_obj in page], self.expected[:3])
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_api_cursor(self):
+        token = Token.objects.create(user=self.user)
+        url = reverse('files:api-file-list') + '?page_size=2&fields=id'
+        ids = []
+        while url:
+            data = self.client.get(url, HTTP_AUTHORIZATION=f"Token {token.key}").json()
+            ids += [item['id'] for item in data['results']]
+            url = data['next']
+        self.assertEqual(ids, self.expected)
+
+
+class FolderPathTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='arvore@easydocs.local', password='secret')
+
+    def setUp(self):
+        self.a = self.folder('a')
+        self.b = self.folder('b', self.a)
+        self.c = self.folder('c', self.b)
+        self.d = self.folder('d')
+
+    def folder(self, name, parent=None):
+        return DocumentFolder.objects.create(user=self.user, folder_name=name, parent_folder=parent)
+
+    def reload(self):
+        for folder in (self.a, self.b, self.c, self.d):
+            folder.refresh_from_db()
+
+    def test_paths_on_create(self):
+        self.assertEqual(self.a.path, f"/{self.a.id}/")
+        self.assertEqual(self.c.path, f"/{self.a.id}/{self.b.id}/{self.c.id}/")
+        self.assertEqual([self.a.depth, self.b.depth, self.c.depth], [0, 1, 2])
+        self.assertEqual(self.c.get_ancestor_ids(), [self.a.id, self.b.id])
+        self.assertEqual(self.c.get_full_path(), 'a/b/c')
+        self.assertEqual(set(self.a.get_descendants()), {self.b, self.c})
+
+    def test_move_rebases_descendants(self):
+        self.b.parent_folder = self.d
+        self.b.save()
+        self.reload()
+        self.assertEqual(self.b.path, f"/{self.d.id}/{self.b.id}/")
+        self.assertEqual(self.c.path, f"/{self.d.id}/{self.b.id}/{self.c.id}/")
+        self.assertEqual([self.b.depth, self.c.depth], [1, 2])
+        self.assertEqual(self.c.get_full_path(), 'd/b/c')
+        self.assertFalse(self.a.get_descendants().exists())
+
+        # De volta para a raiz: a profundidade de toda a subárvore diminui
+        self.b.parent_folder = None
+        self.b.save()
+        self.reload()
+        self.assertEqual(self.c.path, f"/{self.b.id}/{self.c.id}/")
+        self.assertEqual([self.b.depth, self.c.depth], [0, 1])
+
+    def test_cycle_guard(self):
+        for parent in (self.a, self.c):
+            self.a.refresh_from_db()
+            self.a.parent_folder = parent
+            with self.assertRaises(ValueError):
+                self.a.save()
+        self.reload()
+        self.assertIsNone(self.a.parent_folder_id)
+        self.assertEqual(self.c.path, f"/{self.a.id}/{self.b.id}/{self.c.id}/")
+
+    @override_settings(SECURE_SSL_REDIRECT=False)
+    def test_api_rejects_cycle(self):
+        token = Token.objects.create(user=self.user)
+        url = reverse('files:api-folder-detail', args=[self.a.id])
+        response = self.client.patch(
+            url, {'parent_folder': self.c.id}, content_type='application/json',
+            HTTP_AUTHORIZATION=f"Token {token.key}",
+        )
+        self.assertEqual(response.status_code, 400)
+        self.assertIn('parent_folder', response.json())
+
+
+def fake_render_pdf(template_obj, data, user_id, target):
+    target.write(f"%PDF {template_obj.pk} {json.dumps(data, sort_keys=True)}".encode())
+
+
+@override_settings(FILES_STORAGE_BACKEND='files.storage.MemoryStorageService', PDF_RENDER_CACHE_SIZE=10)
+class RenderCacheTests(TestCase):
+    data = {'nome': 'Ana', 'itens': ['a', 'b']}
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='cache@easydocs.local', password='secret')
+        cls.template = PDFTemplate.objects.create(user=cls.user, template_name='recibo', html_content=HTML_CONTENT)
+
+    def setUp(self):
+        reset_storage()
+        self.addCleanup(reset_storage)
+        # O cache de branding fica em disco e é compartilhado entre execuções
+        branding_assets.invalidate(str(self.user.id))
+        self.addCleanup(branding_assets.invalidate, str(self.user.id))
+
+    def key(self, data=None):
+        return get_render_key(self.template, data or self.data, self.user.id)
+
+    def test_key_depends_on_inputs(self):
+        key = self.key()
+        self.assertEqual(self.key({'itens': ['a', 'b'], 'nome': 'Ana'}), key)
+        self.assertNotEqual(self.key({'nome': 'Bia', 'itens': ['a', 'b']}), key)
+        self.assertNotEqual(self.key({'nome': 'Ana', 'itens': ['b', 'a']}), key)
+        self.assertNotEqual(get_render_key(self.template, self.data, self.user.id + 1), key)
+        self.template.html_content += '<p>rodapé</p>'
+        self.template.save()
+        self.assertNotEqual(self.key(), key)
+
+    def test_branding_upload_changes_key(self):
+        key = self.key()
+        self.assertEqual(self.key(), key)
+        # Imagem antiga, só no storage: vale depois da invalidação feita pelo upload
+        path = f"{self.user.id}/header.png"
+        storage.upload_file(io.BytesIO(b'logo'), path)
+        invalidate_branding_path(path)
+        legacy_key = self.key()
+        self.assertNotEqual(legacy_key, key)
+        self.assertEqual(self.key(), legacy_key)
+        # Imagem registrada num blob: a versão é o hash do conteúdo
+        folder = DocumentFolder.objects.create(user=self.user, folder_name=str(self.user.id))
+        blob = store_blob(io.BytesIO(b'novo logo'))
+        FileCreated.objects.create(
+            user=self.user, file_name='header.png', file_path=blob.storage_key, file_size=blob.size, folder=folder,
+            blob=blob,
+        )
+        self.assertNotEqual(self.key(), legacy_key)
+
+    def test_unknown_branding_version_skips_cache(self):
+        with mock.patch.object(storage, 'get_etag', side_effect=Exception('indisponível')):
+            self.assertIsNone(self.key())
+
+    def test_hit_adds_reference(self):
+        blob = store_blob(io.BytesIO(b'%PDF'))
+        remember_render(self.key(), blob)
+        cached = get_cached_render(self.key())
+        self.assertEqual(cached.id, blob.id)
+        self.assertEqual(cached.ref_count, 2)
+        self.assertIsNone(get_cached_render(self.key({'nome': 'Bia'})))
+
+    def test_expired_or_collected_entries_miss(self):
+        blob = store_blob(io.BytesIO(b'%PDF'))
+        remember_render(self.key(), blob)
+        with override_settings(PDF_RENDER_CACHE_TTL=0):
+            self.assertIsNone(get_cached_render(self.key()))
+        StoredBlob.objects.filter(id=blob.id).delete()
+        self.assertIsNone(get_cached_render(self.key()))
+
+    @override_settings(PDF_RENDER_CACHE_SIZE=2)
+    def test_least_recently_used_evicted(self):
+        keys = [self.key({'nome': name}) for name in ('a', 'b', 'c')]
+        for index, key in enumerate(keys[:2]):
+            remember_render(key, store_blob(io.BytesIO(f"%PDF {index}".encode())))
+        RenderCacheEntry.objects.filter(key=keys[0]).update(last_used_at=timezone.now() - timedelta(minutes=5))
+        get_cached_render(keys[0])
+        remember_render(keys[2], store_blob(io.BytesIO(b'%PDF 2')))
+        self.assertEqual(set(RenderCacheEntry.objects.values_list('key', flat=True)), {keys[0], keys[2]})
+        self.assertEqual(evict_render_cache(), 0)
+
+    def test_identical_jobs_render_once(self):
+        jobs = [
+            FileCreated.objects.create(
+                user=self.user, file_name='recibo.pdf', file_path='', file_size=0, is_generated=True, status='pending',
+                template=self.template, data_used=self.data,
+            )
+            for _ in range(2)
+        ]
+        with mock.patch('files.jobs.render_pdf', side_effect=fake_render_pdf) as render:
+            self.assertEqual([run_render_job(job.id) for job in jobs], ['completed', 'completed'])
+        self.assertEqual(render.call_count, 1)
+        first, second = FileCreated.objects.filter(id__in=[job.id for job in jobs]).order_by('id')
+        self.assertEqual(first.blob_id, second.blob_id)
+        self.assertEqual(first.blob.ref_count, 2)
+
+
+class Flaky:
+    # Falha com as exceções dadas, na ordem, e depois devolve 'ok'
+    def __init__(self, *errors):
+        self.errors = list(errors)
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return 'ok'
+
+
+def http_error(status):
+    response = requests.Response()
+    response.status_code = status
+    return requests.HTTPError(f"{status}", response=response)
+
+
+@override_settings(STORAGE_HTTP_RETRIES=2, STORAGE_HTTP_BACKOFF=0)
+class StorageResilienceTests(SimpleTestCase):
+    def breaker(self, threshold=3):
+        return CircuitBreaker('teste', failure_threshold=threshold, reset_timeout=30)
+
+    def expire(self, breaker):
+        breaker.opened_at -= breaker.reset_timeout
+
+    def test_breaker_opens_after_threshold(self):
+        breaker = self.breaker()
+        for _ in range(2):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.record_success()
+        for _ in range(3):
+            breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+
+    def test_half_open_allows_one_trial(self):
+        breaker = self.breaker(threshold=1)
+        breaker.record_failure()
+        self.expire(breaker)
+        self.assertEqual(breaker.state, 'half-open')
+        breaker.before_call()
+        # Enquanto a chamada de teste não termina, as outras falham rápido
+        with self.assertRaises(CircuitOpenError):
+            breaker.before_call()
+        breaker.record_failure()
+        self.assertEqual(breaker.state, 'open')
+
+        self.expire(breaker)
+        breaker.before_call()
+        breaker.record_success()
+        self.assertEqual(breaker.state, 'closed')
+        breaker.before_call()
+
+    def test_transient_errors(self):
+        wrapped = Exception('Upload failed')
+        wrapped.__cause__ = requests.ConnectionError('reset')
+        for exc in [requests.Timeout(), httpx.ConnectError('dns'), http_error(503), http_error(429), wrapped]:
+            self.assertTrue(is_transient_error(exc), exc)
+        for exc in [http_error(404), http_error(400), ValueError('x'), Exception('Object not found')]:
+            self.assertFalse(is_transient_error(exc), exc)
+
+    def test_retries_transient_errors(self):
+        breaker = self.breaker()
+        func = Flaky(requests.ConnectionError(), http_error(502))
+        self.assertEqual(call_with_retry(breaker, 'download', func), 'ok')
+        self.assertEqual(func.calls, 3)
+        self.assertEqual(breaker.state, 'closed')
+        self.assertEqual(breaker.failures, 0)
+
+    def test_gives_up_after_retries(self):
+        func = Flaky(*[requests.Timeout()] * 5)
+        with self.assertRaises(requests.Timeout):
+            call_with_retry(self.breaker(threshold=10), 'download', func)
+        self.assertEqual(func.calls, 3)
+
+    def test_no_retry_for_permanent_or_unsafe_calls(self):
+        breaker = self.breaker()
+        func = Flaky(http_error(404))
+        with self.assertRaises(requests.HTTPError):
+            call_with_retry(breaker, 'download', func)
+        self.assertEqual(func.calls, 1)
+        # Erro do cliente não conta contra o storage
+        self.assertEqual(breaker.failures, 0)
+        func = Flaky(requests.ConnectionError())
+        with self.assertRaises(requests.ConnectionError):
+            call_with_retry(breaker, 'upload', func, idempotent=False)
+        self.assertEqual(func.calls, 1)
+
+    def test_open_circuit_fails_fast(self):
+        breaker = self.breaker(threshold=2)
+        failing = Flaky(*[requests.ConnectionError()] * 5)
+        # O circuito abre no meio das tentativas: a terceira nem chega ao storage
+        with self.assertRaises(CircuitOpenError):
+            call_with_retry(breaker, 'download', failing)
+        self.assertEqual(failing.calls, 2)
+        func = Flaky()
+        with self.assertRaises(CircuitOpenError):
+            call_with_retry(breaker, 'download', func)
+        self.assertEqual(func.calls, 0)
+
+    def test_async_retry(self):
+        func = Flaky(httpx.ReadTimeout('lento'))
+
+        async def call():
+            return func()
+
+        self.assertEqual(async_to_sync(acall_with_retry)(self.breaker(), 'download', call), 'ok')
+        self.assertEqual(func.calls, 2)
+
+
+class FakeTusServer:
+    # Servidor TUS em memória: guarda os blocos por offset e pode perder a resposta de um PATCH
+    def __init__(self, lose_response_at=(), fail_at=()):
+        self.data = bytearray()
+        self.fail_at = set(fail_at)
+        self.length = None
+        self.headers = None
+        self.patches = []
+        self.lose_response_at = set(lose_response_at)
+
+    def response(self, status, headers=None):
+        response = requests.Response()
+        response.status_code = status
+        response.headers.update(headers or {})
+        return response
+
+    def post(self, url, headers):
+        self.length = int(headers['Upload-Length'])
+        self.headers = headers
+        return self.response(201, {'Location': 'https://tus.local/upload/1'})
+
+    def patch(self, url, data, headers):
+        offset = int(headers['Upload-Offset'])
+        self.patches.append((offset, len(data)))
+        if offset != len(self.data):
+            return self.response(409)
+        if offset in self.fail_at:
+            self.fail_at.discard(offset)
+            return self.response(502)
+        self.data.extend(data)
+        if offset in self.lose_response_at:
+            self.lose_response_at.discard(offset)
+            raise requests.ConnectionError('conexão perdida')
+        return self.response(204, {'Upload-Offset': str(len(self.data))})
+
+    def head(self, url, headers):
+        return self.response(200, {'Upload-Offset': str(len(self.data))})
+
+
+@override_settings(FILES_UPLOAD_CHUNK_SIZE=4)
+class ResumableUploadTests(SimpleTestCase):
+    content = b'0123456789abcdefghijklm'
+
+    def upload(self, server):
+        service = SupabaseStorageService()
+        service.http = server
+        return service.upload_file(io.BytesIO(self.content), 'blobs/ab/abc', content_type='application/pdf')
+
+    def test_buffered_chunks(self):
+        chunks = list(buffered_chunks([b'01', b'234567', b'', b'8', b'9ab'], 4))
+        self.assertEqual(chunks, [b'0123', b'4567', b'89ab'])
+        self.assertEqual(list(buffered_chunks([b'012345'], 4)), [b'0123', b'45'])
+
+    def test_chunks_assembled_in_order(self):
+        server = FakeTusServer()
+        self.assertEqual(self.upload(server), 'blobs/ab/abc')
+        self.assertEqual(bytes(server.data), self.content)
+        self.assertEqual(server.length, len(self.content))
+        self.assertEqual(server.patches, [(offset, min(4, len(self.content) - offset)) for offset in range(0, 23, 4)])
+        self.assertIn('Tus-Resumable', server.headers)
+
+    def test_lost_response_not_resent(self):
+        # O bloco do offset 8 chegou, mas a resposta se perdeu: o HEAD confirma e o envio continua
+        server = FakeTusServer(lose_response_at=[8])
+        self.upload(server)
+        self.assertEqual(bytes(server.data), self.content)
+        self.assertEqual([offset for offset, _ in server.patches].count(8), 1)
+
+    def test_failed_chunk_resent(self):
+        server = FakeTusServer(fail_at=[4])
+        self.upload(server)
+        self.assertEqual(bytes(server.data), self.content)
+        self.assertEqual([offset for offset, _ in server.patches].count(4), 2)
+
+    def test_rejected_chunk_fails_upload(self):
+        server = FakeTusServer()
+        server.data.extend(b'xx')
+        with self.assertRaises(Exception):
+            self.upload(server)
+
+
+@override_settings(SUPABASE_URL='', SUPABASE_KEY='')
+class SupabaseClientTests(SimpleTestCase):
+    def test_client_created_on_first_use(self):
+        with mock.patch('supabase.create_client') as create_client:
+            service = SupabaseStorageService()
+            self.assertIsNone(service._client)
+            create_client.assert_not_called()
+            # Sem credenciais, o primeiro acesso falha com a configuração que falta, não com um erro do SDK
+            with self.assertRaisesMessage(ImproperlyConfigured, 'SUPABASE_URL e SUPABASE_KEY'):
+                service.supabase
+            with self.assertRaisesMessage(Exception, 'Supabase não configurado'):
+                service.get_signed_url('blobs/ab/abc')
+            create_client.assert_not_called()
+        self.assertEqual(service.breaker.failures, 0)
+
+
+class LRUCacheTests(SimpleTestCase):
+    def test_least_recently_used_evicted(self):
+        cache = LRUCache(maxsize=2)
+        cache.set('a', 1)
+        cache.set('b', 2)
+        self.assertEqual(cache.get('a'), 1)
+        cache.set('c', 3)
+        self.assertIsNone(cache.get('b'))
+        self.assertEqual((cache.get('a'), cache.get('c')), (1, 3))
+        # Regravar uma chave também a torna a mais recente
+        cache.set('a', 10)
+        cache.set('d', 4)
+        self.assertEqual((cache.get('a'), cache.get('c', 'sem')), (10, 'sem'))
+        self.assertEqual(cache.stats(), {'hits': 4, 'misses': 2, 'size': 2, 'maxsize': 2})
+
+    def test_discard_pop_and_clear(self):
+        cache = LRUCache(maxsize=10)
+        for key in [(1, 'v1'), (1, 'v2'), (2, 'v1')]:
+            cache.set(key, key)
+        self.assertEqual(cache.discard_where(lambda key: key[0] == 1), 2)
+        self.assertEqual(len(cache), 1)
+        self.assertEqual(cache.pop((2, 'v1')), (2, 'v1'))
+        self.assertIsNone(cache.pop((2, 'v1')))
+        cache.set('x', 1)
+        cache.get('x')
+        cache.clear()
+        self.assertEqual(cache.stats(), {'hits': 0, 'misses': 0, 'size': 0, 'maxsize': 10})
+
+
+class CompiledTemplateCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='compilado@easydocs.local', password='secret')
+
+    def setUp(self):
+        compiled_templates.clear()
+        self.template = PDFTemplate.objects.create(user=self.user, template_name='carta', html_content=HTML_CONTENT)
+
+    def cached(self, template_obj, key=None):
+        return compiled_templates.get(key or (template_obj.pk, template_obj.updated_at))
+
+    def test_compiled_once_per_version(self):
+        compiled = get_compiled_template(self.template)
+        self.assertIs(get_compiled_template(PDFTemplate.objects.get(id=self.template.id)), compiled)
+        self.assertEqual(compiled_templates.stats()['hits'], 1)
+        self.assertEqual(get_cache_stats()['compiled_templates'], compiled_templates.stats())
+
+    def test_save_invalidates(self):
+        compiled = get_compiled_template(self.template)
+        old_key = (self.template.pk, self.template.updated_at)
+        self.template.html_content = '<p>{{ outro }}</p>'
+        self.template.save()
+        self.assertIsNone(self.cached(self.template, old_key))
+        updated = get_compiled_template(self.template)
+        self.assertIsNot(updated, compiled)
+        self.assertIn('<p>B</p>', updated.render(Context({'outro': 'B'})))
+
+    def test_delete_invalidates(self):
+        other = PDFTemplate.objects.create(user=self.user, template_name='outro', html_content=HTML_CONTENT)
+        get_compiled_template(self.template)
+        get_compiled_template(other)
+        deleted_key = (self.template.pk, self.template.updated_at)
+        self.template.delete()
+        self.assertIsNone(self.cached(self.template, deleted_key))
+        self.assertIsNotNone(self.cached(other))
+
+
+class StylesheetCacheTests(TestCase):
+    css = 'p { color: red; }'
+
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='estilo@easydocs.local', password='secret')
+
+    def setUp(self):
+        # Sem WeasyPrint de verdade: cada CSS() devolve um objeto novo que guarda a folha interpretada
+        self.CSS = self.patch('weasyprint.CSS', side_effect=lambda string, **kwargs: mock.Mock(string=string))
+        self.HTML = self.patch('weasyprint.HTML')
+        self.patch('weasyprint.text.fonts.FontConfiguration')
+        self.patch('files.rendering._renderer', None)
+        self.template = PDFTemplate.objects.create(
+            user=self.user, template_name='carta', html_content=HTML_CONTENT, css_content=self.css,
+        )
+
+    def patch(self, target, *args, **kwargs):
+        patcher = mock.patch(target, *args, **kwargs)
+        self.addCleanup(patcher.stop)
+        return patcher.start()
+
+    def render(self, template_obj):
+        render_pdf(template_obj, {'nome': 'A', 'itens': []}, self.user.id, target=io.BytesIO())
+        return self.HTML.return_value.write_pdf.call_args.kwargs['stylesheets'][-1]
+
+    def parsed(self):
+        return [call.kwargs['string'] for call in self.CSS.call_args_list if call.kwargs['string'] != SHARED_CSS]
+
+    def test_same_css_reuses_stylesheet(self):
+        stylesheet = self.render(self.template)
+        self.assertEqual(stylesheet.string, self.css)
+        self.assertIs(self.render(PDFTemplate.objects.get(id=self.template.id)), stylesheet)
+        # Outro template com a mesma folha compartilha o objeto
+        other = PDFTemplate.objects.create(
+            user=self.user, template_name='outra', html_content=HTML_CONTENT, css_content=self.css,
+        )
+        self.assertIs(self.render(other), stylesheet)
+        self.assertEqual(self.parsed(), [self.css])
+
+        changed = get_renderer().get_stylesheet('p { color: blue; }')
+        self.assertIsNot(changed, stylesheet)
+        self.assertEqual(self.parsed(), [self.css, 'p { color: blue; }'])
+
+    def test_save_with_new_css_invalidates(self):
+        stylesheet = self.render(self.template)
+        renderer = get_renderer()
+        old_key = (self.template.pk, self.template.updated_at)
+        self.assertIs(renderer.template_stylesheets.get(old_key), stylesheet)
+
+        self.template.css_content = 'p { color: green; }'
+        self.template.save()
+        self.assertIsNone(renderer.template_stylesheets.get(old_key))
+        updated = self.render(PDFTemplate.objects.get(id=self.template.id))
+        self.assertIsNot(updated, stylesheet)
+        self.assertEqual(updated.string, 'p { color: green; }')
+        self.assertEqual(self.parsed(), [self.css, 'p { color: green; }'])
+
+
+class TemplateSchemaTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.user = get_user_model().objects.create_user(email='schema@easydocs.local', password='secret')
+
+    def setUp(self):
+        template_form_classes.clear()
+        self.template = PDFTemplate.objects.create(user=self.user, template_name='ficha', html_content=HTML_CONTENT)
+
+    def test_schema_persisted_on_save(self):
+        self.assertEqual(PDFTemplate.objects.get(id=self.template.id).field_schema, {'fields': [
+            {'name': 'nome', 'label': 'Nome', 'is_list': False},
+            {'name': 'itens', 'label': 'Itens', 'is_list': True},
+        ]})
+        # update_fields com html_content também grava o schema
+        self.template.html_content = '<p>{{ cidade }} {{ header_image_url }}</p>'
+        self.template.save(update_fields=['html_content'])
+        schema = PDFTemplate.objects.get(id=self.template.id).field_schema
+        self.assertEqual([field['name'] for field in schema['fields']], ['cidade'])
+
+    def test_legacy_template_without_schema(self):
+        PDFTemplate.objects.filter(id=self.template.id).update(field_schema={})
+        template = PDFTemplate.objects.get(id=self.template.id)
+        self.assertEqual([field['name'] for field in template.get_field_schema()['fields']], ['nome', 'itens'])
+
+    def test_form_class_reused_until_template_changes(self):
+        form_class = get_template_form_class(self.template)
+        self.assertIs(get_template_form_class(PDFTemplate.objects.get(id=self.template.id)), form_class)
+        self.assertEqual(list(form_class.base_fields), ['nome', 'itens'])
+        self.assertIsInstance(form_class.base_fields['itens'].widget, forms.Textarea)
+
+        old_key = (self.template.pk, self.template.updated_at)
+        self.template.html_content = '<p>{{ cidade }}</p>'
+        self.template.save()
+        self.assertIsNone(template_form_classes.get(old_key))
+        self.assertEqual(list(get_template_form_class(self.template).base_fields), ['cidade'])
+
+
+class FakeBucket:
+    # Bucket do SDK com URLs numeradas: cada assinatura gera uma URL nova
+    tokens = itertools.count(1)
+
+    def __init__(self):
+        self.signed = []
+
+    def create_signed_url(self, path, expires_in):
+        self.signed.append((path, expires_in))
+        return {'signedUrl': f"https://x.supabase.co/sign/{path}?token={next(self.tokens)}"}
+
+    def create_signed_urls(self, paths, expires_in):
+        return [{'path': path, 'error': None, 'signedUrl': self.create_signed_url(path, expires_in)['signedUrl']}
+                for path in paths]
+
+
+@override_settings(
+    SUPABASE_SIGNED_URL_CACHE='',
+    SUPABASE_SIGNED_URL_MARGIN=60,
+    CACHES={
+        'default': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'padrao'},
+        'signed-urls': {'BACKEND': 'django.core.cache.backends.locmem.LocMemCache', 'LOCATION': 'assinadas'},
+    },
+)
+class SignedUrlCacheTests(SimpleTestCase):
+    def service(self):
+        service = SupabaseStorageService()
+        bucket = FakeBucket()
+        service._client = mock.Mock()
+        service._client.storage.from_.return_value = bucket
+        return service, bucket
+
+    def test_memory_hit_and_miss(self):
+        service, bucket = self.service()
+        url = service.get_signed_url('a.pdf', expires_in=3600)
+        self.assertEqual(service.get_signed_url('a.pdf', expires_in=3600), url)
+        self.assertEqual(service.get_signed_url('a.pdf', expires_in=300), url)
+        self.assertNotEqual(service.get_signed_url('b.pdf', expires_in=3600), url)
+        self.assertEqual(len(bucket.signed), 2)
+        service._forget_signed_url('a.pdf')
+        self.assertNotEqual(service.get_signed_url('a.pdf', expires_in=3600), url)
+
+    def test_cached_url_must_cover_requested_lifetime(self):
+        service, bucket = self.service()
+        short = service.get_signed_url('a.pdf', expires_in=300)
+        # Um link de 300s não serve para quem pediu 3600s
+        long = service.get_signed_url('a.pdf', expires_in=3600)
+        self.assertNotEqual(long, short)
+        self.assertEqual(bucket.signed, [('a.pdf', 300), ('a.pdf', 3600)])
+        # Com o tempo passando, o link deixa de valer o prazo pedido e é assinado de novo
+        with mock.patch('files.supabase_storage.time.time', return_value=time.time() + 3000):
+            self.assertEqual(service.get_signed_url('a.pdf', expires_in=300), long)
+            self.assertNotEqual(service.get_signed_url('a.pdf', expires_in=3600), long)
+
+    @override_settings(SUPABASE_SIGNED_URL_CACHE='signed-urls')
+    def test_shared_cache_tier(self):
+        first, first_bucket = self.service()
+        url = first.get_signed_url('a.pdf', expires_in=3600)
+        # Outro processo (outra instância) encontra a URL no cache compartilhado
+        second, second_bucket = self.service()
+        self.assertEqual(second.get_signed_url('a.pdf', expires_in=3600), url)
+        self.assertEqual(second_bucket.signed, [])
+        first._forget_signed_url('a.pdf')
+        third, third_bucket = self.service()
+        self.assertNotEqual(third.get_signed_url('a.pdf', expires_in=3600), url)
+        self.assertEqual(len(third_bucket.signed), 1)
+
+    def test_batch_signs_only_missing(self):
+        service, bucket = self.service()
+        cached = service.get_signed_url('a.pdf', expires_in=3600)
+        bucket.signed.clear()
+        urls = service.get_signed_urls(['a.pdf', 'b.pdf', 'c.pdf', 'b.pdf'], expires_in=3600)
+        self.assertEqual(set(urls), {'a.pdf', 'b.pdf', 'c.pdf'})
+        self.assertEqual(urls['a.pdf'], cached)
+        self.assertEqual(bucket.signed, [('b.pdf', 3600), ('c.pdf', 3600)])
+        self.assertEqual(service.get_signed_urls(['b.pdf', 'c.pdf'], expires_in=3600), {
+            'b.pdf': urls['b.pdf'], 'c.pdf': urls['c.pdf'],
+        })
+        self.assertEqual(len(bucket.signed), 2)
+
+
+class RetryLayerTests(SimpleTestCase):
+    @override_settings(STORAGE_HTTP_RETRIES=2, STORAGE_HTTP_BACKOFF=0)
+    def test_one_connection_attempt_per_retry(self):
+        # Porta fechada: cada tentativa de call_with_retry abre exatamente uma conexão
+        with socket.socket() as probe:
+            probe.bind(('127.0.0.1', 0))
+            port = probe.getsockname()[1]
+        connect = httpcore._backends.sync.SyncBackend.connect_tcp
+        breaker = CircuitBreaker('teste', failure_threshold=10, reset_timeout=30)
+        with mock.patch.object(
+            httpcore._backends.sync.SyncBackend, 'connect_tcp', autospec=True, side_effect=connect,
+        ) as attempts, create_httpx_client() as client:
+            with self.assertRaises(httpx.ConnectError):
+                call_with_retry(breaker, 'download', client.get, f"http://127.0.0.1:{port}/")
+        self.assertEqual(attempts.call_count, 3)
+        self.assertEqual(breaker.failures, 3)
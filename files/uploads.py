@@ -0,0 +1,25 @@
+from django.core.files.uploadhandler import FileUploadHandler
+
+import hashlib
+
+
+class HashingUploadHandler(FileUploadHandler):
+    # Calcula o SHA-256 enquanto o corpo da requisição é lido; os próximos handlers guardam o conteúdo
+    def new_file(self, *args, **kwargs):
+        super().new_file(*args, **kwargs)
+        self.hasher = hashlib.sha256()
+
+    def receive_data_chunk(self, raw_data, start):
+        self.hasher.update(raw_data)
+        return raw_data
+
+    def file_complete(self, file_size):
+        if self.request is not None:
+            if not hasattr(self.request, 'upload_digests'):
+                self.request.upload_digests = {}
+            self.request.upload_digests[self.field_name] = self.hasher.hexdigest()
+        return None
+
+
+def get_upload_digest(request, field_name):
+    return getattr(request, 'upload_digests', {}).get(field_name)
@@ -1,16 +1,33 @@
-from django.urls import path
-from . import views
+from django.conf import settings
+from django.urls import include, path
+from rest_framework.authtoken.views import obtain_auth_token
+from rest_framework.routers import DefaultRouter
+from . import api, async_views, views
+
+# Sob ASGI, as views que esperam pelo storage usam as versões assíncronas
+storage_views = async_views if settings.FILES_ASYNC_VIEWS else views
 
 app_name = 'files'
 
+router = DefaultRouter()
+router.register('templates', api.PDFTemplateViewSet, basename='api-template')
+router.register('files', api.FileCreatedViewSet, basename='api-file')
+router.register('folders', api.DocumentFolderViewSet, basename='api-folder')
+
 urlpatterns = [
-    path('download/<int:file_id>/', views.download_file, name='download_file'),
+    path('download/<int:file_id>/', storage_views.download_file, name='download_file'),
+    path('storage/<str:token>/', storage_views.local_storage_file, name='local_storage_file'),
     path('pdf-generator/', views.pdf_generator_view, name='pdf_generator'),
     path('create-template/', views.create_template_view, name='create_template'),
     path('fill/<int:template_id>/', views.fill_template_view, name='fill_template'),
+    path('batch/<int:template_id>/', views.batch_generate_view, name='batch_generate'),
+    path('status/<int:file_id>/', storage_views.file_status_view, name='file_status'),
     path('files/', views.file_management_view, name='file_management'),
     path('files/create-folder/', views.create_folder_view, name='create_folder'),
-    path('files/upload/', views.upload_file_view, name='upload_file'),
+    path('files/upload/', storage_views.upload_file_view, name='upload_file'),
     path('files/delete/<int:file_id>/', views.delete_file_view, name='delete_file'),
-    path('files/delete-folder/<int:folder_id>/', views.delete_folder_view, name='delete_folder'),
+    path('files/delete-folder/<int:folder_id>/', storage_views.delete_folder_view, name='delete_folder'),
+    path('files/delete-folder/<int:folder_id>/status/', views.delete_folder_status_view, name='delete_folder_status'),
+    path('api/auth/token/', obtain_auth_token, name='api_token'),
+    path('api/', include(router.urls)),
 ]
@@ -1,55 +1,36 @@
-from django.http import FileResponse, HttpResponseNotFound, HttpResponse
+from django.http import (
+    HttpResponseNotFound, HttpResponseForbidden, HttpResponseNotModified, HttpResponse,
+    Http404, JsonResponse, StreamingHttpResponse,
+)
+from django.core import signing
 from django.contrib.auth.decorators import login_required
-from django.template import Template, Context
+from django.db import transaction
 from django.shortcuts import render, redirect, get_object_or_404
 from django.conf import settings
-from django.core.paginator import Paginator
-from django import forms
+from django.utils.http import content_disposition_header
 
 from .models import FileCreated, PDFTemplate, DocumentFolder
-from .forms import PDFTemplateForm, FileCreatedForm
-from .supabase_storage import supabase_storage
+from .forms import PDFTemplateForm, FileCreatedForm, get_template_form_class
+from .placeholders import list_field_names
+from .storage import storage, unsign_local_path
+from .batch import BatchInputError, create_batch_files, load_rows
+from .blobs import collect_released_blobs, delete_file_rows, store_blob
+from .uploads import get_upload_digest
+from .pagination import keyset_paginate
+from .search import search_files
+from .assets import invalidate_branding_file, invalidate_branding_path
+from .jobs import enqueue_folder_delete, enqueue_render_batch, enqueue_text_extraction, submit_render
+from .folders import (
+    build_folder_tree, count_subtree_files, delete_folder_tree, get_delete_progress, get_folder_path,
+)
 
-from weasyprint import HTML
-
-import requests
 import logging
 import mimetypes
 import os
-import io
-import re
 
 logger = logging.getLogger(__name__)
 
-def extract_html_fields(html_content):
-    fields = re.findall(r'{{\s*([^\s}]+)\s*}}', html_content)
-    ignore_vars = {'item', 'line', 'row'}
-    unique_fields = []
-    for field in fields:
-        if field not in unique_fields and field not in ignore_vars:
-            unique_fields.append(field)
-    return unique_fields
-
-def extract_html_lists_fields(html_content):
-    return re.findall(r'\{%\s*for\s+\w+\s+in\s+([\w\-_à-ÿÀ-ßçÇ]+)\s*%\}', html_content, flags=re.UNICODE)
-
-def extract_html_all_fields(html_content):
-    pattern = re.compile(
-        r'{{\s*([^\s}]+)\s*}}|\{%\s*for\s+\w+\s+in\s+([^\s%}]+)\s*%\}',
-        re.UNICODE
-    )
-    found = []
-    for match in pattern.finditer(html_content):
-        field_var = match.group(1)
-        field_list = match.group(2)
-        if field_var and field_var not in found and field_var not in {'item', 'line', 'row'}:
-            found .append(field_var)
-        if field_list and field_list not in found and field_list not in {'item', 'line', 'row'}:
-            found .append(field_list)
-    return found 
-
-def extract_html_lists_fields(html_content):
-    return re.findall(r'\{%\s*for\s+\w+\s+in\s+([^\s%}]+)\s*%\}', html_content, flags=re.UNICODE)
+PDF_LIST_PAGE_SIZE = 10
 
 @login_required
 def download_file(request, file_id):
@@ -58,30 +39,21 @@ def download_file(request, file_id):
         if not file_obj.file_path:
             logger.error(f"File path not found for file_id: {file_id}")
             return HttpResponseNotFound("Arquivo não encontrado no Supabase")
-        signed_url = supabase_storage.get_signed_url(file_obj.file_path, expires_in=300)
-        logger.info(f"Downloading file from URL: {signed_url}")
-        response = requests.get(signed_url, stream=True, timeout=30)
-        if response.status_code != 200:
-            logger.error(f"Failed to download file: Status {response.status_code}")
-            return HttpResponseNotFound("Erro ao baixar arquivo do Supabase")
-        content_type, _ = mimetypes.guess_type(file_obj.file_name)
-        if not content_type:
-            content_type = 'application/octet-stream'
-        original_name = file_obj.file_name
-        if '.' not in original_name:
-            possible_ext = file_obj.file_path.split('.')[-1]
-            if possible_ext and possible_ext != original_name:
-                original_name = f"{original_name}.{possible_ext}"
-        visible = ['pdf', 'jpg', 'jpeg', 'png', 'gif']
-        ext = original_name.split('.')[-1].lower()
-        if ext in visible:
-            return redirect(signed_url)
+        content_type, original_name, viewable = get_download_info(file_obj)
+        if viewable:
+            return redirect(storage.get_signed_url(file_obj.file_path, expires_in=300, filename=original_name))
         else:
             disposition = f'attachment; filename="{original_name}"'
-        response_file = FileResponse(
-            response.raw,
-            content_type=content_type,
-        )
+        try:
+            stream = storage.download_stream(
+                file_obj.file_path,
+                chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE,
+                request_headers=request.headers,
+            )
+        except Exception as e:
+            logger.error(f"Failed to download file: {str(e)}")
+            return HttpResponseNotFound("Erro ao baixar arquivo do Supabase")
+        response_file = stream_response(stream, content_type)
         response_file['Content-Disposition'] = disposition
         logger.info(f"File downloaded successfully: {original_name}")
         return response_file
@@ -95,13 +67,22 @@ def download_file(request, file_id):
 @login_required
 def pdf_generator_view(request):
     templates = PDFTemplate.objects.filter(user=request.user, is_active=True)
-    all_pdfs = FileCreated.objects.filter(user=request.user, is_generated=True).order_by('-created_at')
-    paginator = Paginator(all_pdfs, 10)
-    page_number = request.GET.get('page')
-    page_obj = paginator.get_page(page_number)
+    generated_pdfs = FileCreated.objects.filter(user=request.user, is_generated=True).only('id', 'file_name', 'created_at')
+    query = request.GET.get('q', '').strip()
+    if query:
+        # Busca: resultados por relevância, sem paginação
+        page_obj = search_files(generated_pdfs, query)[:settings.FILES_SEARCH_LIMIT]
+    else:
+        page_obj = keyset_paginate(
+            generated_pdfs,
+            PDF_LIST_PAGE_SIZE,
+            after=request.GET.get('after'),
+            before=request.GET.get('before'),
+        )
     return render(request, 'pdf_generator.html', {
         'templates': templates,
         'page_obj': page_obj,
+        'query': query,
     })
 
 @login_required
@@ -120,60 +101,9 @@ def create_template_view(request):
 @login_required
 def fill_template_view(request, template_id):
     template_obj = get_object_or_404(PDFTemplate, id=template_id, user=request.user)
-    html_content = template_obj.html_content
-    
-    html_design = '''
-    <style>
-    @page {
-            size: A4;
-            margin: 110px 70px 70px 70px;
-
-            @top-left {
-                content: url('{{ header_image_url }}');
-                margin-left: -110px;
-                margin-top: -25px;
-            }
-
-            @bottom-center {
-                content: url('{{ footer_image_url }}');
-            }
-        }
-    .watermark {
-            position: fixed;
-            top: -400px;
-            left: -227px;
-            width: 25.4cm;
-            height: 39.7cm;
-            opacity: 0.9;
-            z-index: -1;
-            background-size: contain;
-            background-repeat: no-repeat;
-            background-position: center;
-            pointer-events: none;
-        }
-    </style>
-    <div class="watermark" style="background-image: url('{{ watermark_url }}');"></div>
-    '''
-    
-    ignore_fields = ['header_image_url', 'footer_image_url', 'watermark_url']
-    fields = [field for field in extract_html_all_fields(html_content) if field not in ignore_fields]
-    field_list = extract_html_lists_fields(html_content)
-
-    class DynamicTemplateForm(forms.Form):
-        pass
-    for field in fields:
-        if field in field_list:
-            DynamicTemplateForm.base_fields[field] = forms.CharField(
-                label=field.replace('_', ' ').capitalize(),
-                required=False,
-                widget=forms.Textarea(attrs={'rows': 4, 'placeholder': 'Digite um item por line'})
-            )
-        else:
-            DynamicTemplateForm.base_fields[field] = forms.CharField(
-                label=field.replace('_', ' ').capitalize(),
-                required=False
-            )
-    
+    DynamicTemplateForm = get_template_form_class(template_obj)
+    field_list = list_field_names(template_obj.get_field_schema())
+
     folders = DocumentFolder.objects.filter(user=request.user)
 
     if request.method == 'POST':
@@ -183,12 +113,16 @@ def fill_template_view(request, template_id):
             file_id = request.POST.get('file_id')
             if file_id:
                 file = get_object_or_404(FileCreated, id=file_id, user=request.user)
-                try:
-                    if file.file_path:
-                        supabase_storage.delete_file(file.file_path)
-                except Exception:
-                    pass 
-                file.delete()
+                if file.blob_id:
+                    # Blob pode estar compartilhado (cache de renderização): só libera a referência
+                    collect_released_blobs(delete_file_rows(FileCreated.objects.filter(id=file.id)))
+                else:
+                    try:
+                        if file.file_path:
+                            storage.delete_file(file.file_path)
+                    except Exception:
+                        pass 
+                    file.delete()
             form = DynamicTemplateForm(request.POST)
             return render(request, 'fill_template.html', {
                 "form": form,
@@ -202,51 +136,16 @@ def fill_template_view(request, template_id):
             for field_list in field_list:
                 if field_list in context and isinstance(context[field_list], str):
                     context[field_list] = [line.strip() for line in context[field_list].splitlines() if line.strip()]
-            user_folder = f"{request.user.id}"
-            header_path = f"{user_folder}/header.png"
-            footer_path = f"{user_folder}/footer.png"
-            watermark_path = f"{user_folder}/watermark.png"
-            context['header_image_url'] = supabase_storage.get_signed_url(header_path, expires_in=600)
-            context['footer_image_url'] = supabase_storage.get_signed_url(footer_path, expires_in=600)
-            context['watermark_url'] = supabase_storage.get_signed_url(watermark_path, expires_in=600)
-            html_content_final = html_design + html_content
-            html_render = Template(html_content_final).render(Context(context))
-            template_dir = os.path.join(os.getcwd(), 'static')
-            pdf_bytes = HTML(
-                string=html_render,
-                base_url=template_dir
-            ).write_pdf()
-
-            name_func = f"nome_pdf_{template_obj.template_name.lower()}"
-            file_name = globals()[name_func](context, template_obj)
-
             folder_id = request.POST.get('folder_id')
             folder = DocumentFolder.objects.get(id=folder_id, user=request.user)
-            pdf_storage_path = f"{folder.folder_name}/{file_name}"
-            pdf_file = io.BytesIO(pdf_bytes)
-            pdf_file.name = file_name
-            supabase_storage.upload_file(pdf_file, pdf_storage_path)
-            file_size = pdf_file.getbuffer().nbytes
-            file_obj = FileCreated.objects.create(
-                user=request.user,
-                template=template_obj,
-                file_name=file_name,
-                file_path=pdf_storage_path,
-                status='completed',
-                file_size=file_size,
-                data_used=context,
-                is_generated=True,
-                folder=folder,
-            )
-
-            pdf_url = supabase_storage.get_signed_url(pdf_storage_path, expires_in=600)
+            file_obj = submit_render(request.user, template_obj, folder, context)
+            file_name = file_obj.file_name
             file_id = file_obj.id
 
             return render(request, 'fill_template.html', {
                 "form": form,
                 "template_obj": template_obj,
                 "folders": folders,
-                "pdf_url": pdf_url,
                 "file_id": file_id,
                 'file_name': file_name,
             })
@@ -266,13 +165,102 @@ def fill_template_view(request, template_id):
         })
 
 
+@login_required
+def batch_generate_view(request, template_id):
+    template_obj = get_object_or_404(PDFTemplate, id=template_id, user=request.user)
+    folders = DocumentFolder.objects.filter(user=request.user)
+    context = {'template_obj': template_obj, 'folders': folders}
+
+    if request.method == 'POST':
+        rows_file = request.FILES.get('rows')
+        folder = get_object_or_404(DocumentFolder, id=request.POST.get('folder_id'), user=request.user)
+        try:
+            rows = load_rows(rows_file, rows_file.name) if rows_file else []
+            files = create_batch_files(request.user, template_obj, folder, rows)
+        except BatchInputError as e:
+            context['error'] = str(e)
+            return render(request, 'batch_generate.html', context)
+        file_ids = [file_obj.id for file_obj in files]
+        transaction.on_commit(lambda: enqueue_render_batch(file_ids))
+        context['created'] = len(file_ids)
+
+    return render(request, 'batch_generate.html', context)
+
+@login_required
+def file_status_view(request, file_id):
+    file_obj = get_object_or_404(
+        FileCreated.objects.only('id', 'user_id', 'status', 'file_path'),
+        id=file_id,
+        user=request.user,
+    )
+    data = {'id': file_obj.id, 'status': file_obj.status}
+    if file_obj.status == 'completed':
+        data['url'] = storage.get_signed_url(file_obj.file_path, expires_in=600)
+    return JsonResponse(data)
+
+def get_download_info(file_obj):
+    content_type, _ = mimetypes.guess_type(file_obj.file_name)
+    if not content_type:
+        content_type = 'application/octet-stream'
+    original_name = file_obj.file_name
+    if '.' not in original_name:
+        possible_ext = os.path.splitext(file_obj.file_path)[1]
+        if possible_ext:
+            original_name = f"{original_name}{possible_ext}"
+    visible = ['pdf', 'jpg', 'jpeg', 'png', 'gif']
+    ext = original_name.split('.')[-1].lower()
+    return content_type, original_name, ext in visible
+
+def set_upload_metadata(instance, uploaded_file):
+    instance.file_name = uploaded_file.name
+    instance.file_size = uploaded_file.size
+
+    ext = os.path.splitext(instance.file_name)[1].lower()
+    if ext == ".pdf":
+        instance.file_type = "pdf"
+    elif ext in [".doc", ".docx"]:
+        instance.file_type = "docx"
+    elif ext == ".txt":
+        instance.file_type = "txt"
+    elif ext in [".xls", ".xlsx"]:
+        instance.file_type = "xlsx"
+    elif ext in [".jpg", ".jpeg", ".png", ".gif", ".bmp"]:
+        instance.file_type = "image"
+    else:
+        instance.file_type = "txt"
+
+def stream_response(stream, content_type):
+    if stream.status == 304:
+        stream.close()
+        response = HttpResponseNotModified()
+    else:
+        response = StreamingHttpResponse(stream, status=stream.status, content_type=content_type)
+    for name, value in stream.headers.items():
+        response[name] = value
+    return response
+
+def local_storage_file(request, token):
+    try:
+        file_path, name, attachment = unsign_local_path(token)
+        stream = storage.download_stream(
+            file_path,
+            chunk_size=settings.FILES_DOWNLOAD_CHUNK_SIZE,
+            request_headers=request.headers,
+        )
+    except signing.BadSignature:
+        return HttpResponseForbidden("Link inválido ou expirado")
+    except Exception:
+        return HttpResponseNotFound("Arquivo não encontrado")
+    content_type, _ = mimetypes.guess_type(name or file_path)
+    response = stream_response(stream, content_type or 'application/octet-stream')
+    if name:
+        response['Content-Disposition'] = content_disposition_header(attachment, name)
+    return response
+
 @login_required
 def file_management_view(request):
-    root_folders = DocumentFolder.objects.filter(user=request.user, parent_folder__isnull=True)
-    files = FileCreated.objects.filter(user=request.user)
     return render(request, 'management.html', {
-        'folders': root_folders,
-        'files': files,
+        'tree': build_folder_tree(request.user),
     })
 
 @login_required
@@ -309,34 +297,26 @@ def upload_file_view(request):
         if form.is_valid():
             instance = form.save(commit=False)
             instance.user = request.user
-            instance.file_name = form.cleaned_data['file'].name
-            instance.file_size = form.cleaned_data['file'].size
-
-            ext = os.path.splitext(instance.file_name)[1].lower()
-            if ext == ".pdf":
-                instance.file_type = "pdf"
-            elif ext in [".doc", ".docx"]:
-                instance.file_type = "docx"
-            elif ext == ".txt":
-                instance.file_type = "txt"
-            elif ext in [".xls", ".xlsx"]:
-                instance.file_type = "xlsx"
-            elif ext in [".jpg", ".jpeg", ".png", ".gif", ".bmp"]:
-                instance.file_type = "image"
-            else:
-                instance.file_type = "txt"
-            
-            folder_path = get_folder_path(instance.folder)
+            set_upload_metadata(instance, form.cleaned_data['file'])
+
+            uploaded = form.cleaned_data['file']
             try:
-                instance.file_path = supabase_storage.upload_file(
-                    form.cleaned_data['file'],
-                    f"{folder_path}/{form.cleaned_data['file'].name}"
+                blob = store_blob(
+                    uploaded,
+                    digest=get_upload_digest(request, 'file'),
+                    size=uploaded.size,
+                    content_type=mimetypes.guess_type(uploaded.name)[0],
                 )
             except Exception as e:
                 return HttpResponse(f"Erro no upload: {str(e)}")
+            instance.blob = blob
+            instance.file_path = blob.storage_key
+            invalidate_branding_path(f"{get_folder_path(instance.folder)}/{uploaded.name}")
 
             instance.is_generated = False
             instance.save()
+            # Extração de texto em segundo plano, depois do commit
+            transaction.on_commit(lambda: enqueue_text_extraction(blob))
             return redirect('files:file_management')
         else:
             return HttpResponse(f"Erro: {form.errors}")
@@ -350,36 +330,27 @@ def upload_file_view(request):
 @login_required
 def delete_file_view(request, file_id):
     file = get_object_or_404(FileCreated, id=file_id, user=request.user)
-    file.delete() 
+    invalidate_branding_file(file)
+    collect_released_blobs(delete_file_rows(FileCreated.objects.filter(id=file.id)))
     return redirect('files:file_management')
 
 @login_required
 def delete_folder_view(request, folder_id):
     folder = get_object_or_404(DocumentFolder, id=folder_id, user=request.user)
-    files = FileCreated.objects.filter(folder=folder)
-    for file in files:
-        try:
-            if file.file_path:
-                supabase_storage.delete_file(file.file_path)
-        except Exception as e:
-            logger.error(f"Erro ao apagar do storage: {file.file_path} - {str(e)}")
-        file.delete()  
-
-    supabase_storage.delete_folder_from_storage(folder.folder_name + '/')
-    subfolders = DocumentFolder.objects.filter(parent_folder=folder)
-    for subfolder in subfolders:
-        delete_folder_view(request, subfolder.id)
-    folder.delete()
+    progress = get_delete_progress(folder.id)
+    if progress and progress['status'] in ('pending', 'running'):
+        return render(request, 'delete_folder.html', {'folder': folder, 'progress': progress})
 
-    return redirect('files:file_management')
+    if count_subtree_files(folder) <= settings.FILES_DELETE_ASYNC_THRESHOLD:
+        delete_folder_tree(folder.id)
+        return redirect('files:file_management')
 
-def get_folder_path(folder):
-    parts = []
-    while folder:
-        parts.insert(0, str(folder.folder_name))
-        folder = folder.parent_folder
-    return '/'.join(parts)
+    enqueue_folder_delete(folder.id)
+    return render(request, 'delete_folder.html', {'folder': folder, 'progress': get_delete_progress(folder.id)})
 
-def nome_pdf_proposta(context, template_obj):
-    number = context.get('número_da_proposta', 'novo').replace('/', '-').replace('\\', '-').replace(' ', '_')
-    return f"{template_obj.template_name}_{number}.pdf"
+@login_required
+def delete_folder_status_view(request, folder_id):
+    if DocumentFolder.objects.filter(id=folder_id).exclude(user=request.user).exists():
+        raise Http404
+    progress = get_delete_progress(folder_id, user=request.user) or {'status': 'unknown', 'deleted': 0, 'total': 0}
+    return JsonResponse(progress)
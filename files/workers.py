@@ -0,0 +1,19 @@
+import django
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def init_extraction_worker():
+    django.setup()
+
+
+def init_render_worker():
+    # Processo novo (spawn): configura o Django e já registra fontes e o CSS compartilhado antes do primeiro job
+    django.setup()
+    from .rendering import get_renderer
+
+    try:
+        get_renderer()
+    except Exception as e:
+        logger.error(f"Renderer warm-up failed: {str(e)}")